@@ -93,7 +93,10 @@ def split_fractures(bucket, **kwargs):
 
     # Remove zeros from cell_faces
 
-    [g.cell_faces.eliminate_zeros() for g, _ in bucket]
+    # The grids are modified in place, clear maps cached on the grids
+    for g, _ in bucket:
+        g.cell_faces.eliminate_zeros()
+        g.clear_cache()
     return bucket
 
 
@@ -220,6 +223,7 @@ def duplicate_faces(gh, face_cells):
     gh.face_nodes._shape = (
         gh.num_nodes, gh.face_nodes.shape[1] + frac_id.size)
     assert(gh.face_nodes.indices.size == gh.face_nodes.indptr[-1])
+    gh.clear_cache()
 
     node_start = gh.face_nodes.indptr[frac_id]
     node_end = gh.face_nodes.indptr[frac_id + 1]
@@ -469,6 +473,7 @@ def duplicate_nodes(g, nodes, offset):
                                         t_node + 1, face_pos[1:-1])
         g.face_nodes._shape = (g.face_nodes.shape[0] + colors.size - 1,
                                g.face_nodes._shape[1])
+        g.clear_cache()
         # We delete the old node because of the offset. If we do not
         # have an offset we could keep it and add one less node.
         g.nodes = np.delete(g.nodes, t_node, axis=1)
@@ -478,6 +483,7 @@ def duplicate_nodes(g, nodes, offset):
     # Transform back to csc format and fix node ordering.
     g.face_nodes = g.face_nodes.tocsc()
     g.face_nodes.indices = g.face_nodes.indices[iv]  # For fast row operation
+    g.clear_cache()
 
     return node_count
 
@@ -12,9 +12,9 @@ Acknowledgements:
 """
 from __future__ import division
 import numpy as np
-import itertools
 from enum import Enum
 from scipy import sparse as sps
+from scipy.spatial import cKDTree
 
 from porepy.utils import matrix_compression, mcolon
 
@@ -94,8 +94,20 @@ class Grid(object):
             num_cells
         cell_volumes (np.ndarray): Volumes of all cells
 
+        ---
+        Maps derived from the topology (cell_nodes(), num_cell_nodes(),
+        cell_connection_map(), cell_face_as_dense() and get_boundary_faces())
+        are computed on the first call, and cached. So is the spatial index of
+        the cells used by closest_cell() and locate_points(). The cache is
+        cleared when nodes, face_nodes, cell_faces, face_tags or cell_centers
+        are assigned, and when the face tags are changed by the tag methods.
+        If these fields are modified in place, clear_cache() must be called.
+
     """
 
+    # Fields the cached maps depend on, see _cached()
+    _TOPOLOGY = ('nodes', 'face_nodes', 'cell_faces')
+
     def __init__(self, dim, nodes, face_nodes, cell_faces, name):
         """Initialize the grid
 
@@ -153,6 +165,51 @@ class Grid(object):
             h.face_tags = self.face_tags.copy()
         return h
 
+    def __setattr__(self, name, value):
+        # Assignment of a field clears the cached maps that depend on it
+        if name in Grid._TOPOLOGY or name in ('face_tags', 'cell_centers'):
+            self._clear_cached(name)
+        object.__setattr__(self, name, value)
+
+    def clear_cache(self):
+        """ Clear the cached maps derived from the grid topology and face tags,
+        and the spatial index of the cells.
+
+        Should be called if nodes, face_nodes, cell_faces, face_tags or
+        cell_centers are modified in place.
+
+        """
+        self.__dict__.pop('_cache', None)
+
+    def _cached(self, key, compute, depends, copy=True):
+        """ Get a cached map, compute and store it if not available.
+
+        Parameters:
+            key (str): Name of the map.
+            compute (function): Computes the map.
+            depends (tuple of str): Fields the map depends on.
+            copy (boolean, optional): If True (default), a copy of the map is
+                returned.
+
+        Returns:
+            The map. By default a copy, so that the cached version is not
+                modified by the caller.
+
+        """
+        cache = self.__dict__.setdefault('_cache', {})
+        if key not in cache:
+            cache[key] = (compute(), depends)
+        if copy:
+            return cache[key][0].copy()
+        return cache[key][0]
+
+    def _clear_cached(self, name):
+        # Remove cached maps depending on the field name
+        cache = self.__dict__.get('_cache')
+        if cache:
+            for key in [k for k, v in cache.items() if name in v[1]]:
+                del cache[key]
+
     def __repr__(self):
         """
         Implementation of __repr__
@@ -536,6 +593,9 @@ class Grid(object):
                 connection between cell and node.
 
         """
+        return self._cached('cell_nodes', self.__cell_nodes, Grid._TOPOLOGY)
+
+    def __cell_nodes(self):
         # Local version of cell-face map, using absolute value to avoid
         # artifacts from +- in the original version.
         cf_loc = sps.csc_matrix((np.abs(self.cell_faces.data),
@@ -551,7 +611,9 @@ class Grid(object):
             np.ndarray, size num_cells: Number of nodes per cell.
 
         """
-        return self.cell_nodes().sum(axis=0).A.ravel('F')
+        def num_nodes():
+            return self.cell_nodes().sum(axis=0).A.ravel('F')
+        return self._cached('num_cell_nodes', num_nodes, Grid._TOPOLOGY)
 
     def get_internal_nodes(self):
         """
@@ -582,7 +644,9 @@ class Grid(object):
             np.ndarray (1d), index of boundary faces
 
         """
-        return self.__indices(self.has_face_tag(FaceTag.BOUNDARY))
+        def boundary_faces():
+            return self.__indices(self.has_face_tag(FaceTag.BOUNDARY))
+        return self._cached('boundary_faces', boundary_faces, ('face_tags',))
 
     def get_domain_boundary_faces(self):
         """
@@ -627,19 +691,29 @@ class Grid(object):
             np.array, num_cells: values of the cell diameter for each cell
 
         """
-
-        def comb(n): return np.fromiter(itertools.chain.from_iterable(
-            itertools.combinations(n, 2)), n.dtype).reshape((2, -1),
-                                                            order='F')
-
-        def diam(n): return np.amax(np.linalg.norm(self.nodes[:, n[0, :]] -
-                                                   self.nodes[:, n[1, :]],
-                                                   axis=0))
-
         if cn is None:
             cn = self.cell_nodes()
-        return np.array([diam(comb(cn.indices[cn.indptr[c]:cn.indptr[c + 1]]))
-                         for c in np.arange(self.num_cells)])
+        cn = sps.csc_matrix(cn)
+        num_nodes = np.diff(cn.indptr)
+
+        # The cells are grouped by their number of nodes. Within a group, the
+        # distances between all pairs of nodes are computed as one array
+        # operation, in chunks of cells to limit memory use.
+        diam = np.zeros(num_nodes.size)
+        for n in np.unique(num_nodes):
+            first, second = np.triu_indices(n, 1)
+            if first.size == 0:
+                continue
+            cells = np.where(num_nodes == n)[0]
+            chunk = max(2**20 // first.size, 1)
+            for start in range(0, cells.size, chunk):
+                c = cells[start:start + chunk]
+                nodes = cn.indices[cn.indptr[c, np.newaxis] + np.arange(n)]
+                dist = np.sum(np.power(self.nodes[:, nodes[:, first]] -
+                                       self.nodes[:, nodes[:, second]], 2),
+                              axis=0)
+                diam[c] = np.sqrt(np.amax(dist, axis=1))
+        return diam
 
     def cell_face_as_dense(self):
         """
@@ -654,6 +728,10 @@ class Grid(object):
             np.ndarray, 2 x num_faces: Array representation of face-cell
                 relations
         """
+        return self._cached('cell_face_as_dense', self.__cell_face_as_dense,
+                            Grid._TOPOLOGY)
+
+    def __cell_face_as_dense(self):
         n = self.cell_faces.tocsr()
         d = np.diff(n.indptr)
         rows = matrix_compression.rldecode(np.arange(d.size), d)
@@ -679,7 +757,10 @@ class Grid(object):
                 matrix, element (i,j) is true if cells i and j share a face.
                 The matrix is thus symmetric.
         """
+        return self._cached('cell_connection_map',
+                            self.__cell_connection_map, Grid._TOPOLOGY)
 
+    def __cell_connection_map(self):
         # Create a copy of the cell-face relation, so that we can modify it at
         # will
         cell_faces = self.cell_faces.copy()
@@ -703,6 +784,9 @@ class Grid(object):
     def closest_cell(self, p):
         """ For a set of points, find closest cell by cell center.
 
+        The search is done in a KD-tree of the cell centers, which is built on
+        the first call and cached.
+
         Parameters:
             p (np.ndarray, 3xn): Point coordinates. If p.shape[0] < 3,
                 additional points will be treated as zeros.
@@ -711,37 +795,162 @@ class Grid(object):
             np.ndarray of ints: For each point, index of the cell with center
                 closest to the point.
     """
-        dim_p = p.shape[0]
+        p = self.__pad_points(p)
+        tree, _ = self.__spatial_index()
+        return tree.query(p.T)[1]
+
+    def locate_points(self, p, tol=1e-10):
+        """ For a set of points, find the cells containing them.
+
+        Candidate cells are found by a search in the KD-tree of the cell
+        centers (see closest_cell()); the center of a cell containing a point
+        is no further from the point than the largest distance between a cell
+        center and the nodes of the cell. The candidates are checked exactly,
+        in order of increasing distance: The point should be on the inner
+        side of all faces of the cell. For grids of dimension less than 3, the
+        point should in addition be within the distance tol of the plane (2d)
+        or line (1d) of the cell, or of the cell center (0d).
+
+        The cells are assumed to be convex, with planar faces. The geometry
+        must be computed.
+
+        Parameters:
+            p (np.ndarray, 3xn): Point coordinates. If p.shape[0] < 3,
+                additional points will be treated as zeros.
+            tol (double, optional): Geometric tolerance. Defaults to 1e-10.
+
+        Returns:
+            np.ndarray of ints, size n: For each point, index of the cell
+                containing the point, or -1 if the point is outside the grid.
+                A point on a face shared by several cells is assigned to the
+                cell with center closest to the point.
+
+        """
+        p = self.__pad_points(p)
+        tree, radius = self.__spatial_index()
+        num_pts = p.shape[1]
+        ci = -np.ones(num_pts, dtype=int)
+        if self.num_cells == 0:
+            return ci
+
+        # Points are processed in chunks, to limit the memory of the
+        # candidate arrays
+        chunk = 2**16
+        for start in range(0, num_pts, chunk):
+            pts = np.arange(start, min(start + chunk, num_pts))
+            k_old = 0
+            k = 1
+            while pts.size > 0:
+                dist, cand = tree.query(p[:, pts].T, k=k)
+                dist = dist.reshape((pts.size, -1))[:, k_old:]
+                cand = cand.reshape((pts.size, -1))[:, k_old:]
+                inside = dist <= radius + tol
+                inside[inside] = self.__in_cells(p[:, pts], cand, inside, tol)
+                found = np.any(inside, axis=1)
+                first = np.argmax(inside[found], axis=1)
+                ci[pts[found]] = cand[found, first]
+                # Look further for points with more candidates within range
+                if k == self.num_cells:
+                    break
+                pts = pts[np.logical_and(~found, dist[:, -1] <= radius + tol)]
+                k_old = k
+                k = min(2 * k, self.num_cells)
+        return ci
+
+    def __pad_points(self, p):
         if p.shape[0] < 3:
             z = np.zeros((3 - p.shape[0], p.shape[1]))
             p = np.vstack((p, z))
+        return p
+
+    def __spatial_index(self):
+        # KD-tree of the cell centers, and the largest distance between a
+        # cell center and the nodes of the cell
+        def spatial_index():
+            tree = cKDTree(self.cell_centers.T, balanced_tree=False,
+                           compact_nodes=False)
+            cn = self.cell_nodes()
+            cells = matrix_compression.rldecode(np.arange(self.num_cells),
+                                                np.diff(cn.indptr))
+            dist = np.linalg.norm(self.nodes[:, cn.indices] -
+                                  self.cell_centers[:, cells], axis=0)
+            return tree, (dist.max() if dist.size > 0 else 0)
+        return self._cached('spatial_index', spatial_index,
+                            Grid._TOPOLOGY + ('cell_centers',), copy=False)
 
-        def min_dist(pts):
-            c = self.cell_centers
-            d = np.sum(np.power(c - pts, 2), axis=0)
-            return np.argmin(d)
+    def __in_cells(self, p, cand, active, tol):
+        """ Check if points are inside candidate cells.
 
-        ci = np.empty(p.shape[1], dtype=np.int)
-        for i in range(p.shape[1]):
-            ci[i] = min_dist(p[:, i].reshape((3, -1)))
-        return ci
+        Parameters:
+            p (np.ndarray, 3 x n): Points.
+            cand (np.ndarray, n x k): Candidate cells of each point.
+            active (np.ndarray, n x k, bool): Candidates to be checked.
+            tol (double): Geometric tolerance.
+
+        Returns:
+            np.ndarray, bool: For each active candidate, in row-major order,
+                True if the point is inside the cell.
+
+        """
+        pi = np.where(active)[0]
+        c = cand[active]
+        v = p[:, pi] - self.cell_centers[:, c]
+        if c.size == 0:
+            return np.zeros(0, dtype=bool)
+        if self.dim == 0:
+            return np.sqrt(np.sum(v**2, axis=0)) <= tol
+
+        # Signed distance from the faces, positive outside the cell
+        indptr = self.cell_faces.indptr
+        num_faces = indptr[c + 1] - indptr[c]
+        pos = mcolon.mcolon(indptr[c], indptr[c + 1])
+        faces = self.cell_faces.indices[pos]
+        n = self.face_normals[:, faces]
+        rep = matrix_compression.rldecode(pi, num_faces)
+        d = np.einsum('ij,ij->j', p[:, rep] - self.face_centers[:, faces], n)
+        d *= self.cell_faces.data[pos] / np.sqrt(np.einsum('ij,ij->j', n, n))
+        start = np.hstack((0, np.cumsum(num_faces)[:-1]))
+        inside = np.maximum.reduceat(d, start) <= tol
+
+        # Distance from the plane or line of the cells, computed from the
+        # first face of each cell
+        if self.dim < 3:
+            first = start
+            f = faces[first]
+            if self.dim == 2:
+                fn = self.face_nodes.indices.reshape((2, -1), order='F')
+                t = self.nodes[:, fn[1, f]] - self.nodes[:, fn[0, f]]
+                m = np.cross(t, self.face_normals[:, f], axis=0)
+                m /= np.sqrt(np.sum(m**2, axis=0))
+                off = np.abs(np.sum(v * m, axis=0))
+            else:
+                t = self.face_normals[:, f]
+                t = t / np.sqrt(np.sum(t**2, axis=0))
+                off = np.sqrt(np.sum((v - np.sum(v * t, axis=0) * t)**2,
+                                     axis=0))
+            inside = np.logical_and(inside, off <= tol)
+        return inside
 
     def add_face_tag(self, f, tag):
         self.face_tags[f] = np.bitwise_or(self.face_tags[f], tag)
+        self._clear_cached('face_tags')
 
     def remove_face_tag(self, f, tag):
         self.face_tags[f] = np.bitwise_and(
             self.face_tags[f], np.bitwise_not(tag))
+        self._clear_cached('face_tags')
 
     def remove_face_tag_if_tag(self, tag, if_tag):
         f = self.has_face_tag(if_tag)
         self.face_tags[f] = np.bitwise_and(
             self.face_tags[f], np.bitwise_not(tag))
+        self._clear_cached('face_tags')
 
     def remove_face_tag_if_not_tag(self, tag, if_tag):
         f = self.has_not_face_tag(if_tag)
         self.face_tags[f] = np.bitwise_and(
             self.face_tags[f], np.bitwise_not(tag))
+        self._clear_cached('face_tags')
 
     def has_face_tag(self, tag):
         return np.bitwise_and(self.face_tags, tag).astype(np.bool)
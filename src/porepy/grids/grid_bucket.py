@@ -4,38 +4,64 @@ intersections in the form of a GridBucket.
 
 """
 
+import copy
 import warnings
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    # Python 2
+    from collections import MutableMapping
 from scipy import sparse as sps
 import numpy as np
-import networkx
 
 from porepy.utils import setmembership
 from porepy.numerics.mixed_dim import condensation
 from porepy.params.data import Parameters
 
+# Marker for properties not set on a node or an edge
+_MISSING = object()
+
+
 class GridBucket(object):
     """
     Container for the hiererchy of grids formed by fractures and their
     intersection.
 
-    The information is stored in a graph borrowed from networkx, and the
-    GridBucket is to a large degree a wrapper around the graph. Each grid
-    defines a node in the graph, while edges are defined by grid pairs that
-    have a connection.
+    The GridBucket is a graph: Each grid defines a node in the graph, while
+    edges are defined by grid pairs that have a connection.
 
-    To all nodes and vertexes, there is associated a dictionary (courtesy
-    networkx) that can store any type of data. Thus the GridBucket can double
-    as a data storage and management tool.
+    The nodes are stored in a list, and are identified with their position in
+    the list (node index). The edges are stored in a list of grid pairs, with
+    a map from grid pairs (in both orientations) to the position of the edge
+    in the list. The adjacency of the nodes is represented by a sparse matrix
+    in csr format, which is computed when needed. Thus look-up of nodes,
+    edges and neighbors does not depend on the size of the bucket.
+
+    To all nodes and vertexes, there is associated a dictionary that can store
+    any type of data. Thus the GridBucket can double as a data storage and
+    management tool. The properties are stored per key, in lists over the
+    nodes and edges (column stores); the dictionaries are views of the
+    columns.
 
     Attributes:
-        graph (networkx.Graph): The of the grid. See above for further
-            description.
+        name (str): Name of the grid bucket.
 
     """
 
     def __init__(self):
-        self.graph = networkx.Graph(directed=False)
         self.name = "grid bucket"
+        # The grids, and the map from grid to node index
+        self._grids = []
+        self._index = {}
+        # Grid pairs of the edges, and the map from grid pairs to edge index
+        self._edges = []
+        self._edge_index = {}
+        # Properties of the nodes and edges
+        self._node_data = _PropertyStore()
+        self._edge_data = _PropertyStore()
+        # Node dimensions and adjacency matrix, computed when needed
+        self._dims = None
+        self._adjacency = None
 
 #------------------------------------------------------------------------------#
 
@@ -48,9 +74,7 @@ class GridBucket(object):
             data: The dictionary storing all information in this node.
 
         """
-        for g in self.graph:
-            data = self.graph.node[g]
-            yield g, data
+        return zip(list(self._grids), list(self._node_data.views))
 
 #------------------------------------------------------------------------------#
 
@@ -60,7 +84,7 @@ class GridBucket(object):
             int: Number of nodes in the grid.
 
         """
-        return self.graph.number_of_nodes()
+        return len(self._grids)
 
 #------------------------------------------------------------------------------#
 
@@ -70,7 +94,7 @@ class GridBucket(object):
             int: Maximum dimension of the grids present in the hierarchy.
 
         """
-        return np.amax([g.dim for g, _ in self])
+        return np.amax(self._node_dims())
 
 #------------------------------------------------------------------------------#
 
@@ -80,7 +104,7 @@ class GridBucket(object):
             int: Minimum dimension of the grids present in the hierarchy.
 
         """
-        return np.amin([g.dim for g, _ in self])
+        return np.amin(self._node_dims())
 
 #------------------------------------------------------------------------------#
 
@@ -90,7 +114,7 @@ class GridBucket(object):
             An iterator over the graph nodes.
 
         """
-        return self.graph.nodes_iter()
+        return iter(list(self._grids))
 
 #------------------------------------------------------------------------------#
 
@@ -100,7 +124,7 @@ class GridBucket(object):
             An iterator over the graph edges.
 
         """
-        return self.graph.edges_iter()
+        return iter(list(self._edges))
 
 #------------------------------------------------------------------------------#
 
@@ -116,8 +140,11 @@ class GridBucket(object):
             data: The dictionary storing all information in this edge.
 
         """
-        for e in self.graph.edges([n]):
-            yield e, self.edge_props(e)
+        adj = self._adjacency_matrix()
+        i = self._index[n]
+        for pos in range(adj.indptr[i], adj.indptr[i + 1]):
+            yield (n, self._grids[adj.indices[pos]]), \
+                self._edge_data.views[adj.data[pos] - 1]
 
 #------------------------------------------------------------------------------#
 
@@ -138,11 +165,12 @@ class GridBucket(object):
         """
 
         if e[0].dim == e[1].dim:
-            if not self.has_nodes_prop(e, 'node_number'):
+            if not all(self.has_nodes_prop(e, 'node_number')):
                 self.assign_node_ordering()
 
-            node_indexes = self.nodes_prop(e, 'node_number')
-            if node_indexes[0] < node_indexes[1]:
+            node_number = self._node_data.columns['node_number']
+            if node_number[self._index[e[0]]] < \
+                    node_number[self._index[e[1]]]:
                 return e[0], e[1]
             return e[1], e[0]
 
@@ -214,17 +242,28 @@ class GridBucket(object):
         old = np.atleast_1d(old)
         assert new.size == old.size
 
-        networkx.relabel_nodes(self.graph, dict(zip(new, old)), False)
+        for g_from, g_to in zip(new, old):
+            i = self._index.pop(g_from)
+            self._grids[i] = g_to
+            self._index[g_to] = i
+        mapping = dict(zip(new, old))
+        self._edges = [(mapping.get(e[0], e[0]), mapping.get(e[1], e[1]))
+                       for e in self._edges]
+        self._update_edge_index()
+        self._dims = None
 
 #------------------------------------------------------------------------------#
 
     def node_neighbors(self, n):
         """
         Return:
-            list of networkx.node: Neighbors of node n
+            list of grids: Neighbors of node n
 
         """
-        return self.graph.neighbors(n)
+        adj = self._adjacency_matrix()
+        i = self._index[n]
+        return [self._grids[j] for j in
+                adj.indices[adj.indptr[i]:adj.indptr[i + 1]]]
 
 #------------------------------------------------------------------------------#
 
@@ -266,15 +305,14 @@ class GridBucket(object):
             assert len(g) == len(prop)
 
         # Set default value.
-        networkx.set_node_attributes(self.graph, key, None)
+        self._node_data.set_all(key, None)
 
         if prop is not None:
             if g is None:
-                for _, n in self:
-                    n[key] = prop
+                self._node_data.set_all(key, prop)
             else:
                 for v, p in zip(g, prop):
-                    self.graph.node[v][key] = p
+                    self.node_props(v)[key] = p
 
 #------------------------------------------------------------------------------#
 
@@ -332,17 +370,13 @@ class GridBucket(object):
         else:
             assert len(grid_pairs) == len(prop)
 
-        # networkx.set_edge_attributes(self.graph, key, None)
-
         if prop is not None:
             for gp, p in zip(grid_pairs, prop):
-                if tuple(gp) in self.graph.edges():
-                    self.graph.edge[gp[0]][gp[1]][key] = p
-                elif tuple(gp[::-1]) in self.graph.edges():
-                    self.graph.edge[gp[1]][gp[0]][key] = p
-                else:
+                k = self._edge_index.get(tuple(gp))
+                if k is None:
                     raise KeyError('Cannot assign property to undefined\
                                      edge')
+                self._edge_data.views[k][key] = p
 
 #------------------------------------------------------------------------------#
 
@@ -377,7 +411,7 @@ class GridBucket(object):
         Returns:
             object: The property.
         """
-        return self.graph.node[g][key]
+        return self.node_props(g)[key]
 
 #------------------------------------------------------------------------------#
 
@@ -395,7 +429,7 @@ class GridBucket(object):
             object: The tested property.
 
         """
-        return tuple([key in self.graph.node[g] for g in gs])
+        return tuple([key in self.node_props(g) for g in gs])
 
 
 #------------------------------------------------------------------------------#
@@ -412,7 +446,12 @@ class GridBucket(object):
             object: The property.
 
         """
-        return tuple([self.graph.node[g][key] for g in gs])
+        column = self._node_data.columns.get(key)
+        values = tuple([_MISSING if column is None else
+                        column[self._index[g]] for g in gs])
+        if any(v is _MISSING for v in values):
+            raise KeyError(key)
+        return values
 
 #------------------------------------------------------------------------------#
 
@@ -427,7 +466,7 @@ class GridBucket(object):
             object: A dictionary with keys and properties.
 
         """
-        return self.graph.node[g]
+        return self._node_data.views[self._index[g]]
 
 #------------------------------------------------------------------------------#
 
@@ -443,7 +482,8 @@ class GridBucket(object):
             object: A dictionary with key and property.
 
         """
-        return {key: self.graph.node[g][key] for key in keys}
+        data = self.node_props(g)
+        return {key: data[key] for key in keys}
 
 #------------------------------------------------------------------------------#
 
@@ -465,12 +505,7 @@ class GridBucket(object):
         """
         prop_list = []
         for gp in np.atleast_2d(grid_pairs):
-            if tuple(gp) in self.graph.edges():
-                prop_list.append(self.graph.edge[gp[0]][gp[1]][key])
-            elif tuple(gp[::-1]) in self.graph.edges():
-                prop_list.append(self.graph.edge[gp[1]][gp[0]][key])
-            else:
-                raise KeyError('Unknown edge')
+            prop_list.append(self.edge_props(gp)[key])
         return np.array(prop_list)
 
 #------------------------------------------------------------------------------#
@@ -491,12 +526,10 @@ class GridBucket(object):
             KeyError if the two grids do not form an edge.
 
         """
-        if tuple(gp) in self.graph.edges():
-            return self.graph.edge[gp[0]][gp[1]]
-        elif tuple(gp[::-1]) in self.graph.edges():
-            return self.graph.edge[gp[1]][gp[0]]
-        else:
+        k = self._edge_index.get(tuple(gp))
+        if k is None:
             raise KeyError('Unknown edge')
+        return self._edge_data.views[k]
 
 #------------------------------------------------------------------------------#
 
@@ -509,8 +542,7 @@ class GridBucket(object):
             data: The dictionary storing all information in this edge.
 
         """
-        for e in self.graph.edges():
-            yield e, self.edge_props(e)
+        return zip(list(self._edges), list(self._edge_data.views))
 
 #------------------------------------------------------------------------------#
 
@@ -530,8 +562,13 @@ class GridBucket(object):
 
         """
         new_grids = np.atleast_1d(new_grids)
-        assert not np.any([i is j for i in new_grids for j in self.graph])
-        [self.graph.add_node(g) for g in new_grids]
+        assert not np.any([g in self._index for g in new_grids])
+        for g in new_grids:
+            self._index[g] = len(self._grids)
+            self._grids.append(g)
+            self._node_data.append()
+        self._dims = None
+        self._adjacency = None
 
 #------------------------------------------------------------------------------#
 
@@ -543,7 +580,9 @@ class GridBucket(object):
 
         """
 
-        self.graph.remove_node(node)
+        if node not in self._index:
+            raise KeyError('Unknown node')
+        self._remove_nodes([node])
 
 #------------------------------------------------------------------------------#
 
@@ -557,7 +596,7 @@ class GridBucket(object):
 
         """
 
-        self.graph.remove_nodes_from([g for g in self.graph if cond(g)])
+        self._remove_nodes([g for g in self._grids if cond(g)])
 
 #------------------------------------------------------------------------------#
 
@@ -583,19 +622,29 @@ class GridBucket(object):
         """
         assert np.asarray(grids).size == 2
         # Check that the connection does not already exist
-        assert not (tuple(grids) in self.graph.edges()
-                    or tuple(grids[::-1]) in self.graph.edges())
+        assert tuple(grids) not in self._edge_index
 
         # The higher-dimensional grid is the first node of the edge.
         if grids[0].dim - 1 == grids[1].dim:
-            self.graph.add_edge(*grids, face_cells=face_cells)
+            e = (grids[0], grids[1])
         elif grids[0].dim == grids[1].dim - 1:
-            self.graph.add_edge(*grids[::-1], face_cells=face_cells)
+            e = (grids[1], grids[0])
         elif grids[0].dim == grids[1].dim:
-            self.graph.add_edge(*grids, face_cells=face_cells)
+            e = (grids[0], grids[1])
         else:
             raise ValueError('Grid dimension mismatch')
 
+        # Grids that are not in the bucket are added as nodes
+        for g in e:
+            if g not in self._index:
+                self.add_nodes(g)
+        k = len(self._edges)
+        self._edges.append(e)
+        self._edge_index[e] = k
+        self._edge_index[e[::-1]] = k
+        self._edge_data.append()['face_cells'] = face_cells
+        self._adjacency = None
+
 #------------------------------------------------------------------------------#
 
     def grids_of_dimension(self, dim):
@@ -606,7 +655,7 @@ class GridBucket(object):
             list: Of grids of the specified dimension
 
         """
-        return [g for g in self.graph.nodes() if g.dim == dim]
+        return [self._grids[i] for i in np.where(self._node_dims() == dim)[0]]
 
 #------------------------------------------------------------------------------#
 
@@ -640,7 +689,7 @@ class GridBucket(object):
         # Loop over grids in decreasing dimensions
         for dim in range(self.dim_max(), self.dim_min() - 1, -1):
             for g in self.grids_of_dimension(dim):
-                n = self.graph.node[g]
+                n = self.node_props(g)
                 # Get old value, issue warning if not equal to the new one.
                 num = n.get('node_number', -1)
                 if ordering_exists and num != counter:
@@ -676,7 +725,7 @@ class GridBucket(object):
                     continue
 
                 # Obtain the old node number
-                n = self.graph.node[g]
+                n = self.node_props(g)
                 old_number = n.get('node_number', -1)
                 # And replace it if it is higher than the removed one
                 if old_number > removed_number:
@@ -714,13 +763,11 @@ class GridBucket(object):
 #------------------------------------------------------------------------------#
 
     def copy(self):
-        """Make a copy of the grid bucket utilizing the built-in copy function
-        of networkx.
+        """Make a copy of the grid bucket. The copy is deep, that is, grids and
+        properties are copied as well.
 
         """
-        gb_copy = GridBucket()
-        gb_copy.graph = self.graph.copy()
-        return gb_copy
+        return copy.deepcopy(self)
 
 #------------------------------------------------------------------------------#
 
@@ -880,7 +927,7 @@ class GridBucket(object):
                 relative 'node_number'.
 
         """
-        i = np.zeros(self.graph.number_of_edges(), dtype=int)
+        i = np.zeros(len(self._edges), dtype=int)
         j = np.zeros(i.size, dtype=int)
         values = np.zeros(i.size)
 
@@ -938,7 +985,7 @@ class GridBucket(object):
         """
         if cond is None:
             cond = lambda _: True
-        diam = [np.amax(g.cell_diameters()) for g in self.graph if cond(g)]
+        diam = [np.amax(g.cell_diameters()) for g in self._grids if cond(g)]
         return np.amax(diam)
 
 #------------------------------------------------------------------------------#
@@ -950,7 +997,7 @@ class GridBucket(object):
         c_0s = np.empty((3, self.size()))
         c_1s = np.empty((3, self.size()))
 
-        for i, g in enumerate(self.graph):
+        for i, g in enumerate(self._grids):
             c_0s[:, i], c_1s[:, i] = g.bounding_box()
 
         min_vals = np.amin(c_0s, axis=1)
@@ -979,7 +1026,7 @@ class GridBucket(object):
         """
         if cond is None:
             cond = lambda _: True
-        return np.sum([g.num_cells for g in self.graph if cond(g)])
+        return np.sum([g.num_cells for g in self._grids if cond(g)])
 
 #------------------------------------------------------------------------------#
 
@@ -997,7 +1044,7 @@ class GridBucket(object):
         """
         if cond is None:
             cond = lambda _: True
-        return np.sum([g.num_faces for g in self.graph if cond(g)])
+        return np.sum([g.num_faces for g in self._grids if cond(g)])
 
 #------------------------------------------------------------------------------#
 
@@ -1015,7 +1062,7 @@ class GridBucket(object):
         """
         if cond is None:
             cond = lambda _: True
-        return np.sum([g.num_nodes for g in self.graph if cond(g)])
+        return np.sum([g.num_nodes for g in self._grids if cond(g)])
 
 #------------------------------------------------------------------------------#
 
@@ -1046,3 +1093,174 @@ class GridBucket(object):
             gl = self.grids_of_dimension(dim)
             s += str(len(gl)) + ' grids of dimension ' + str(dim) + '\n'
         return s
+
+#------------------------------------------------------------------------------#
+
+    def adjacency(self):
+        """
+        Adjacency matrix of the graph.
+
+        Returns:
+            sps.csr_matrix, size x size: Element (i, j) is nonzero if the grids
+                with node index i and j (position in the iteration over the
+                bucket) form an edge. The value is the index of the edge
+                (position in the iteration over the edges) plus one.
+
+        """
+        return self._adjacency_matrix().copy()
+
+#------------------------------------------------------------------------------#
+
+    def _node_dims(self):
+        # Dimension of the grids, by node index
+        if self._dims is None:
+            self._dims = np.array([g.dim for g in self._grids], dtype=np.int)
+        return self._dims
+
+    def _adjacency_matrix(self):
+        if self._adjacency is None:
+            num_edges = len(self._edges)
+            if num_edges > 0:
+                ind = np.array([[self._index[e[0]], self._index[e[1]]]
+                                for e in self._edges]).T
+            else:
+                ind = np.zeros((2, 0), dtype=np.int)
+            # Both orientations of the edges, but self-connections only once
+            vals = np.arange(1, num_edges + 1)
+            mirror = ind[0] != ind[1]
+            rows = np.hstack((ind[0], ind[1, mirror]))
+            cols = np.hstack((ind[1], ind[0, mirror]))
+            vals = np.hstack((vals, vals[mirror]))
+            self._adjacency = sps.csr_matrix((vals, (rows, cols)),
+                                             shape=(self.size(), self.size()))
+        return self._adjacency
+
+    def _update_edge_index(self):
+        self._edge_index = {}
+        for k, e in enumerate(self._edges):
+            self._edge_index[e] = k
+            self._edge_index[e[::-1]] = k
+        self._adjacency = None
+
+    def _remove_nodes(self, grids):
+        # Remove nodes, and the edges they partake in
+        removed = set(grids)
+        if len(removed) == 0:
+            return
+        keep = np.array([g not in removed for g in self._grids], dtype=np.bool)
+        self._grids = [g for g in self._grids if g not in removed]
+        self._index = {g: i for i, g in enumerate(self._grids)}
+        self._node_data.remove(keep)
+
+        keep = np.array([e[0] not in removed and e[1] not in removed
+                         for e in self._edges], dtype=np.bool)
+        self._edges = [e for e, k in zip(self._edges, keep) if k]
+        self._edge_data.remove(keep)
+        self._update_edge_index()
+        self._dims = None
+
+#------------------------------------------------------------------------------#
+
+
+class _PropertyStore(object):
+    """
+    Properties of a set of items (the nodes or the edges of a grid bucket),
+    stored as one list over the items per key. Items without a value for a key
+    have the value _MISSING. The properties of a single item are accessed
+    through a dictionary-like view.
+
+    Attributes:
+        columns (dictionary): Lists of property values, by key.
+        views (list of _Properties): Views of the properties of the items.
+
+    """
+
+    def __init__(self):
+        self.columns = {}
+        self.views = []
+
+    def append(self):
+        """ Add an item without properties, return its view.
+        """
+        for column in self.columns.values():
+            column.append(_MISSING)
+        view = _Properties(self, len(self.views))
+        self.views.append(view)
+        return view
+
+    def set_all(self, key, value):
+        """ Assign a property to all items.
+        """
+        self.columns[key] = [value] * len(self.views)
+
+    def remove(self, keep):
+        """ Remove items.
+
+        The views of removed items are detached: they keep their properties,
+        but are no longer part of the store.
+
+        Parameters:
+            keep (np.ndarray of bool): True for the items to keep.
+
+        """
+        for view, k in zip(self.views, keep):
+            if not k:
+                view._detach()
+        for key, column in self.columns.items():
+            self.columns[key] = [v for v, k in zip(column, keep) if k]
+        self.views = [v for v, k in zip(self.views, keep) if k]
+        for i, view in enumerate(self.views):
+            view._ind = i
+
+
+class _Properties(MutableMapping):
+    """
+    Dictionary-like view of the properties of an item in a _PropertyStore.
+    """
+
+    def __init__(self, store, ind):
+        self._store = store
+        self._ind = ind
+
+    def __getitem__(self, key):
+        column = self._store.columns.get(key)
+        if column is None or column[self._ind] is _MISSING:
+            raise KeyError(key)
+        return column[self._ind]
+
+    def __setitem__(self, key, value):
+        column = self._store.columns.get(key)
+        if column is None:
+            column = [_MISSING] * len(self._store.views)
+            self._store.columns[key] = column
+        column[self._ind] = value
+
+    def __delitem__(self, key):
+        self[key]
+        self._store.columns[key][self._ind] = _MISSING
+
+    def __iter__(self):
+        ind = self._ind
+        return iter([key for key, column in self._store.columns.items()
+                     if column[ind] is not _MISSING])
+
+    def __len__(self):
+        ind = self._ind
+        return sum(1 for column in self._store.columns.values()
+                   if column[ind] is not _MISSING)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def copy(self):
+        """ Shallow copy of the properties, as a dictionary.
+        """
+        return dict(self)
+
+    def _detach(self):
+        # Move the properties to a store of their own
+        store = _PropertyStore()
+        store.columns = {key: [value] for key, value in self.items()}
+        store.views = [self]
+        self._store = store
+        self._ind = 0
@@ -0,0 +1,251 @@
+"""
+Binary storage of grids and grid buckets.
+
+Construction of grids, in particular of fractured grid buckets in 3d, may be
+far more expensive than the simulations run on them. This module stores grids
+and grid buckets on disk, so that runs sharing a geometry can start from a
+stored bucket instead of meshing again.
+
+A grid is stored in a directory, with one binary numpy file (.npy) per array,
+and a file grid.json with the class of the grid and a description of its
+attributes. Sparse matrices (face_nodes, cell_faces) are stored by their
+data, indices and indptr arrays. All attributes that are numpy arrays, sparse
+matrices, scalars, strings or lists of these are stored; this covers the
+topology, geometry, face_tags, and fields such as frac_pairs,
+parent_cell_ind, global_point_ind and cart_dims. Other attributes are
+skipped with a warning.
+
+A grid bucket is stored in a directory with one subdirectory per grid, and a
+file bucket.json with the graph: the order of the nodes and, for each edge,
+the indices of the two nodes. Node and edge properties that can be stored as
+grid attributes (e.g. node_number and face_cells) are stored as well, other
+properties (e.g. parameter objects) are skipped.
+
+By default, arrays are loaded as memory-maps (copy-on-write), thus opening a
+stored grid is almost instantaneous, and data is read from disk only when
+accessed. Modifications of the loaded arrays are not written back to disk.
+
+Example:
+    gb = meshing.simplex_grid(fracs, domain)
+    save_grid_bucket(gb, '/path/to/bucket')
+    ...
+    gb = load_grid_bucket('/path/to/bucket')
+
+"""
+import importlib
+import json
+import logging
+import os
+
+import numpy as np
+import scipy.sparse as sps
+
+from porepy.grids.grid_bucket import GridBucket
+
+# Module-wide logger
+logger = logging.getLogger(__name__)
+
+# Version of the storage format
+_FORMAT_VERSION = 1
+
+
+def save_grid(g, path):
+    """ Store a grid on disk.
+
+    Parameters:
+        g (grid): The grid to be stored.
+        path (str): Directory for the grid. Created if it does not exist;
+            stored files in an existing directory are overwritten.
+
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    attributes = {}
+    for key, value in vars(g).items():
+        if key == '_cache':
+            # Maps derived from the topology are recomputed when needed
+            continue
+        desc = _save_value(path, key, value)
+        if desc is None:
+            logger.warning('Attribute ' + key + ' of grid is not stored')
+        else:
+            attributes[key] = desc
+    header = {'version': _FORMAT_VERSION,
+              'module': type(g).__module__,
+              'class': type(g).__name__,
+              'attributes': attributes}
+    with open(os.path.join(path, 'grid.json'), 'w') as f:
+        json.dump(header, f, indent=1)
+
+
+def load_grid(path, mmap=True):
+    """ Load a grid stored by save_grid().
+
+    The grid is an instance of the same class as the stored one; the
+    constructor is not called, and the geometry need not be computed.
+
+    Parameters:
+        path (str): Directory of the stored grid.
+        mmap (boolean, optional): If True, arrays are memory-mapped
+            (copy-on-write) rather than read into memory. Defaults to True.
+
+    Returns:
+        grid: The loaded grid.
+
+    Raises:
+        ValueError: If the format of the stored grid is not known.
+
+    """
+    header = _read_header(os.path.join(path, 'grid.json'))
+    cls = getattr(importlib.import_module(header['module']), header['class'])
+    g = cls.__new__(cls)
+    mmap_mode = 'c' if mmap else None
+    for key, desc in header['attributes'].items():
+        setattr(g, key, _load_value(path, desc, mmap_mode))
+    return g
+
+
+def save_grid_bucket(gb, path):
+    """ Store a grid bucket on disk.
+
+    Parameters:
+        gb (GridBucket): The grid bucket to be stored.
+        path (str): Directory for the grid bucket. Created if it does not
+            exist.
+
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    index = {}
+    nodes = []
+    for i, (g, d) in enumerate(gb):
+        index[g] = i
+        name = 'grid_' + str(i)
+        save_grid(g, os.path.join(path, name))
+        props = _save_props(path, name + '_node', d, 'node')
+        nodes.append({'grid': name, 'props': props})
+
+    edges = []
+    for j, (e, d) in enumerate(gb.edges_props()):
+        props = _save_props(path, 'edge_' + str(j), d, 'edge')
+        edges.append({'nodes': [index[e[0]], index[e[1]]], 'props': props})
+
+    header = {'version': _FORMAT_VERSION, 'nodes': nodes, 'edges': edges}
+    with open(os.path.join(path, 'bucket.json'), 'w') as f:
+        json.dump(header, f, indent=1)
+
+
+def load_grid_bucket(path, mmap=True):
+    """ Load a grid bucket stored by save_grid_bucket().
+
+    Parameters:
+        path (str): Directory of the stored grid bucket.
+        mmap (boolean, optional): If True, arrays are memory-mapped
+            (copy-on-write) rather than read into memory. Defaults to True.
+
+    Returns:
+        GridBucket: The loaded grid bucket, with nodes and edges in the same
+            order as the stored one.
+
+    Raises:
+        ValueError: If the format of the stored grid bucket is not known.
+
+    """
+    header = _read_header(os.path.join(path, 'bucket.json'))
+    mmap_mode = 'c' if mmap else None
+    grids = [load_grid(os.path.join(path, n['grid']), mmap)
+             for n in header['nodes']]
+
+    gb = GridBucket()
+    gb.add_nodes(grids)
+    for g, n in zip(grids, header['nodes']):
+        gb.node_props(g).update(_load_props(path, n['props'], mmap_mode))
+    for e in header['edges']:
+        grid_pair = [grids[e['nodes'][0]], grids[e['nodes'][1]]]
+        props = _load_props(path, e['props'], mmap_mode)
+        gb.add_edge(grid_pair, props.pop('face_cells', None))
+        gb.edge_props(grid_pair).update(props)
+    return gb
+
+
+def _read_header(fn):
+    with open(fn) as f:
+        header = json.load(f)
+    if header.get('version') != _FORMAT_VERSION:
+        raise ValueError('Unknown storage format in ' + fn)
+    return header
+
+
+def _save_props(path, prefix, props, kind):
+    stored = {}
+    for key, value in props.items():
+        desc = None
+        if isinstance(key, str):
+            desc = _save_value(path, prefix + '_' + key, value)
+        if desc is None:
+            logger.info('Property ' + str(key) + ' of grid bucket ' + kind +
+                        ' is not stored')
+        else:
+            stored[key] = desc
+    return stored
+
+
+def _load_props(path, stored, mmap_mode):
+    return {key: _load_value(path, desc, mmap_mode)
+            for key, desc in stored.items()}
+
+
+def _save_value(path, name, value):
+    """ Store a value, return a json description, or None if the type of the
+    value is not supported.
+    """
+    if sps.issparse(value):
+        fmt = value.format if value.format in ['csc', 'csr'] else 'csr'
+        value = value.asformat(fmt)
+        files = {}
+        for field in ['data', 'indices', 'indptr']:
+            files[field] = name + '_' + field + '.npy'
+            np.save(os.path.join(path, files[field]), getattr(value, field))
+        return {'type': 'sparse', 'format': fmt, 'shape': list(value.shape),
+                'files': files}
+    elif isinstance(value, np.ndarray):
+        if value.dtype.hasobject:
+            return None
+        fn = name + '.npy'
+        np.save(os.path.join(path, fn), value)
+        return {'type': 'array', 'file': fn}
+    elif isinstance(value, (list, tuple)):
+        if not all(_is_scalar(v) for v in value):
+            return None
+        return {'type': type(value).__name__,
+                'value': [_to_python(v) for v in value]}
+    elif _is_scalar(value):
+        return {'type': 'scalar', 'value': _to_python(value)}
+    return None
+
+
+def _load_value(path, desc, mmap_mode):
+    if desc['type'] == 'sparse':
+        files = desc['files']
+        data, indices, indptr = [np.load(os.path.join(path, files[f]),
+                                         mmap_mode=mmap_mode)
+                                 for f in ['data', 'indices', 'indptr']]
+        cls = sps.csc_matrix if desc['format'] == 'csc' else sps.csr_matrix
+        return cls((data, indices, indptr), shape=tuple(desc['shape']),
+                   copy=False)
+    elif desc['type'] == 'array':
+        return np.load(os.path.join(path, desc['file']), mmap_mode=mmap_mode)
+    elif desc['type'] == 'tuple':
+        return tuple(desc['value'])
+    return desc['value']
+
+
+def _is_scalar(value):
+    return value is None or isinstance(value, (bool, int, float, str,
+                                               np.generic))
+
+
+def _to_python(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
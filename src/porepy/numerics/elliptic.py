@@ -13,9 +13,14 @@ import logging
 from porepy.numerics.fv import tpfa, source, fvutils
 from porepy.numerics.vem import vem_dual, vem_source
 from porepy.numerics.linalg.linsolve import Factory as LSFactory
+from porepy.numerics.linalg.linsolve import IterCounter, FactorizationCache
+from porepy.numerics.linalg import schwarz
+from porepy.numerics.linalg.solver_policy import ThresholdPolicy
+from porepy.numerics.linalg.saddle_point import SaddlePointSolver
 from porepy.grids.grid_bucket import GridBucket
 from porepy.params import bc, tensor
 from porepy.params.data import Parameters
+from porepy.utils import sparse_mat
 from porepy.viz.exporter import Exporter
 
 
@@ -37,6 +42,11 @@ class EllipticModel():
     data: (dictionary) Defaults to None. Only used if gb is a Grid. Should
           contain a Parameter class with the keyword 'Param'
     physics: (string): defaults to 'flow'
+    solver_policy: (keyword argument, optional) Policy for the choice of
+        linear solver, see porepy.numerics.linalg.solver_policy. Defaults to
+        ThresholdPolicy(40000). Pass a SolverPolicy to use the cost model
+        calibrated on the host machine; note that the calibration runs a
+        micro-benchmark.
 
     Functions:
     solve(): Calls reassemble and solves the linear system.
@@ -85,34 +95,89 @@ class EllipticModel():
         self._flux_disc = self.flux_disc()
         self._source_disc = self.source_disc()
 
-    def solve(self, max_direct=40000, callback=False, **kwargs):
+        # Choice of linear solver, see solve()
+        self.solver_policy = kwargs.get('solver_policy', None)
+        if self.solver_policy is None:
+            self.solver_policy = ThresholdPolicy(40000)
+
+        # Solver information kept between calls to solve()
+        self._factorization = FactorizationCache()
+        self._precond = None
+        self._precond_lhs = None
+        self._krylov_space = None
+        # Number of iterations of each iterative solve (outer iterations for
+        # gcrotmk)
+        self.iterations = []
+
+    def solve(self, max_direct=None, callback=False, **kwargs):
         """ Reassemble and solve linear system.
 
         After the funtion has been called, the attributes lhs and rhs are
         updated according to the parameter states. Also, the attribute x
         gives the pressure given the current state.
 
-        TODO: Provide an option to save solver information if multiple
-        systems are to be solved with the same left hand side.
-
-        The function attempts to set up the best linear solver based on the
-        system size. The setup and parameter choices here are still
-        experimental.
+        The model keeps solver information between calls, for sequences of
+        systems where only the right hand side, or the matrix values, change
+        slightly (e.g. in optimization loops):
+            The factorization of the direct solver is reused as long as the
+                left hand side is unchanged.
+            The preconditioner of the iterative solver is reused as long as
+                the left hand side is unchanged, and updated (with reuse of
+                its block structure) if only the values change.
+            The previous solution is used as initial guess for the iterative
+                solver.
+            With krylov='gcrotmk', a Krylov subspace is recycled between the
+                solves.
+        Use clear_solver() to discard the stored information.
+
+        The choice between a direct and an iterative solver is made by the
+        solver policy of the model (attribute solver_policy, see
+        porepy.numerics.linalg.solver_policy), by default a direct solver for
+        systems with fewer than 40000 unknowns. With a SolverPolicy, the
+        choice is based on a cost model calibrated on the host machine, which
+        also sets up the solvers of the blocks of the preconditioner. The
+        policy records the solver used and the time spent.
 
         Parameters:
-            max_direct (int): Maximum number of unknowns where a direct solver
-                is applied. If a direct solver can be applied this is usually
+            max_direct (int, optional): If given, a direct solver is applied
+                for systems with fewer unknowns, instead of using the solver
+                policy. If a direct solver can be applied this is usually
                 the most efficient option. However, if the system size is
                 too large compared to available memory, a direct solver becomes
                 extremely slow.
             callback (boolean, optional): If True iteration information will be
                 output when an iterative solver is applied (system size larger
                 than max_direct)
+            precond_mode (str, optional): Type of the block preconditioner
+                for the iterative solver, 'additive' or 'multiplicative'
+                Schwarz over the grids. Defaults to 'additive'.
+            overlap (int, optional): Layers of algebraic overlap between the
+                blocks of the preconditioner. Defaults to 0.
+            precision (str, optional): Precision of the direct solver,
+                'double' or 'mixed' (single precision factorization with
+                iterative refinement). Defaults to 'double'.
+            krylov (str, optional): Iterative solver, 'gmres' or 'gcrotmk'.
+                Defaults to 'gmres'. gcrotmk is not available in older
+                versions of scipy.
+            recycle (int, optional): Number of vectors in the recycled Krylov
+                subspace of gcrotmk. Defaults to 10.
+            warm_start (boolean, optional): If True, the previous solution is
+                used as initial guess. Defaults to True.
+            tol (double, optional): Relative residual tolerance of the
+                iterative solver. Defaults to 1e-8.
 
         Returns:
             np.array: Pressure state.
 
+        Raises:
+            ValueError: If krylov is 'gcrotmk', and the installed version of
+                scipy does not provide it.
+
         """
+        krylov = kwargs.get('krylov', 'gmres')
+        if krylov == 'gcrotmk' and not hasattr(spl, 'gcrotmk'):
+            raise ValueError('krylov=\'gcrotmk\' needs a version of scipy '
+                             'with scipy.sparse.linalg.gcrotmk')
 
         # Discretize
         tic = time.time()
@@ -121,26 +186,78 @@ class EllipticModel():
         logger.info('Done. Elapsed time ' + str(time.time() - tic))
 
         # Solve
+        if max_direct is None:
+            policy = self.solver_policy
+        else:
+            policy = ThresholdPolicy(max_direct)
+        dim = self._gb.dim_max() if self.is_GridBucket else self._gb.dim
+        solver = policy.choose(self.lhs, dim)
+
         tic = time.time()
         ls = LSFactory()
-        if self.rhs.size <  max_direct:
+        iterations = None
+        if solver == 'direct':
             logger.info('Solve linear system using direct solver')
-            self.x = ls.direct(self.lhs,self.rhs)
+            if kwargs.get('precision', 'double') == 'double':
+                self.x = self._factorization.solver(self.lhs)(self.rhs)
+            else:
+                self.x = ls.direct(self.lhs, self.rhs,
+                                   precision=kwargs['precision'])
         else:
-            logger.info('Solve linear system using GMRES')
-            precond = self._setup_preconditioner()
-#            precond = ls.ilu(self.lhs)
-            slv = ls.gmres(self.lhs)
-            self.x, info = slv(self.rhs, M=precond, callback=callback,
-                               maxiter=10000, restart=1500, tol=1e-8)
+            precond = self._setup_preconditioner(
+                kwargs.get('precond_mode', 'additive'),
+                kwargs.get('overlap', 0),
+                getattr(policy, 'block_solver', None))
+            x0 = None
+            if kwargs.get('warm_start', True) and \
+                    np.size(self.x) == self.rhs.size:
+                x0 = self.x
+            counter = IterCounter(disp=callback)
+            tol = kwargs.get('tol', 1e-8)
+
+            if krylov == 'gmres':
+                logger.info('Solve linear system using GMRES')
+                slv = ls.gmres(self.lhs)
+                self.x, info = slv(self.rhs, M=precond, callback=counter,
+                                   x0=x0, maxiter=10000, restart=1500,
+                                   tol=tol)
+            elif krylov == 'gcrotmk':
+                logger.info('Solve linear system using GCROT(m, k)')
+                if self._krylov_space is None:
+                    self._krylov_space = []
+                self.x, info = spl.gcrotmk(self.lhs, self.rhs, x0=x0,
+                                           M=precond, callback=counter,
+                                           tol=tol, maxiter=10000,
+                                           k=kwargs.get('recycle', 10),
+                                           CU=self._krylov_space)
+            else:
+                raise ValueError('Unknown Krylov method ' + krylov)
+            self.iterations.append(counter.niter)
+            iterations = counter.niter
             if info == 0:
-                logger.info('GMRES succeeded.')
+                logger.info(krylov + ' succeeded in ' + str(counter.niter) +
+                            ' iterations.')
             else:
-                logger.error('GMRES failed with status ' + str(info))
+                logger.error(krylov + ' failed with status ' + str(info))
 
-        logger.info('Done. Elapsed time ' + str(time.time() - tic))
+        elapsed = time.time() - tic
+        policy.record(solver, elapsed, self.lhs, dim, iterations)
+        logger.info('Done. Elapsed time ' + str(elapsed))
         return self.x
 
+    def clear_solver(self):
+        """ Discard the solver information kept between calls to solve():
+        Factorization, preconditioner, initial guess and recycled Krylov
+        subspace.
+        """
+        self._factorization.clear()
+        if self._precond is not None:
+            self._precond.close()
+        self._precond = None
+        self._precond_lhs = None
+        self._krylov_space = None
+        self.x = []
+
     def step(self):
         return self.solve()
 
@@ -249,63 +366,37 @@ class EllipticModel():
             self.exporter.write_vtk(variables)
 
     ### Helper functions for linear solve below
-    def _setup_preconditioner(self):
-        solvers, ind, not_ind = self._assign_solvers()
-
-        def precond(r):
-            x = np.zeros_like(r)
-            for s, i, ni in zip(solvers, ind, not_ind):
-                x[i] += s(r[i])
-            return x
-        def precond_mult(r):
-            x = np.zeros_like(r)
-            A = self.lhs
-            for s, i, ni in zip(solvers, ind, not_ind):
-                r_i = r[i] - A[i, :][:, ni] * x[ni]
-                x[i] += s(r_i)
-            return x
-
-        M = lambda r: precond(r)
-        return spl.LinearOperator(self.lhs.shape, M)
-
-
-    def _assign_solvers(self):
-        mat, ind = self._obtain_submatrix()
-        all_ind = np.arange(self.rhs.size)
-        not_ind = [np.setdiff1d(all_ind, i) for i in ind]
-
-        factory = LSFactory()
-        num_mat = len(mat)
-        solvers = np.empty(num_mat, dtype=np.object)
-        for i, A in enumerate(mat):
-            sz = A.shape[0]
-            if sz < 5000:
-                solvers[i] = factory.direct(A)
-            else:
-                # amg solver is pyamg is installed, if not ilu
-                try:
-                    solvers[i] = factory.amg(A, as_precond=True)
-                except ImportError:
-                    solvers[i] = factory.ilu(A)
-
-        return solvers, ind, not_ind
-
-
-    def _obtain_submatrix(self):
-
-        if isinstance(self.grid(), GridBucket):
-            gb = self.grid()
-            fd = self.flux_disc()
-            mat = []
-            sub_ind = []
-            for g, _ in self.grid():
-                ind = fd.solver.dof_of_grid(gb, g)
-                A = self.lhs[ind, :][:, ind]
-                mat.append(A)
-                sub_ind.append(ind)
-            return mat, sub_ind
+    def _setup_preconditioner(self, mode='additive', overlap=0,
+                              block_solver=None):
+        lhs = sps.csr_matrix(self.lhs)
+        lhs.sum_duplicates()
+        M = self._precond
+        if M is not None and M.mode == mode and M.overlap == overlap \
+                and M.shape == lhs.shape:
+            # Reuse the preconditioner, update it if the matrix has changed
+            if not sparse_mat.csr_equal(lhs, self._precond_lhs):
+                logger.info('Update preconditioner')
+                M.update(lhs)
         else:
-            return [self.lhs], [np.arange(self.grid().num_cells)]
+            logger.info('Set up preconditioner')
+            if isinstance(self.grid(), GridBucket):
+                blocks, levels = schwarz.grid_bucket_blocks(
+                    self.grid(), self._flux_disc.solver)
+            else:
+                blocks, levels = [np.arange(self.rhs.size)], None
+            if M is not None:
+                M.close()
+            M = schwarz.Schwarz(lhs, blocks, levels, mode=mode,
+                                overlap=overlap, block_solver=block_solver)
+            self._precond = M
+            # The recycled subspace belongs to the previous matrix
+            self._krylov_space = None
+        if self._krylov_space and \
+                not sparse_mat.csr_equal(lhs, self._precond_lhs):
+            # The vectors C = A U must be recomputed for a new matrix
+            self._krylov_space[:] = [(None, u) for _, u in self._krylov_space]
+        self._precond_lhs = lhs.copy()
+        return M.as_linear_operator()
 
 #------------------------------------------------------------------------------#
 
@@ -329,15 +420,55 @@ class DualEllipticModel(EllipticModel):
         else:
             return vem_dual.DualVEM(physics=self.physics)
 
-    def solve(self):
-        """ Discretize and solve linear system by a direct solver.
+    def solve(self, max_direct=40000, **kwargs):
+        """ Discretize and solve linear system.
+
+        Small systems are solved by a direct solver. For larger systems, the
+        saddle point structure of the dual discretization is exploited by an
+        iterative solver (GMRES or MINRES) with a block preconditioner, based
+        on a diagonal approximation of the mass matrix and an amg solved
+        approximation of the Schur complement. See
+        porepy.numerics.linalg.saddle_point for details.
+
+        Parameters:
+            max_direct (int): Maximum number of unknowns where a direct solver
+                is applied.
+            method (str, optional): Iterative method, 'gmres' or 'minres'.
+                Defaults to 'gmres'.
+            mass_approx (str, optional): Approximation of the mass matrix,
+                'diagonal' or 'lumped'. Defaults to 'diagonal'.
+            tol (double, optional): Relative residual tolerance of the
+                iterative solver. Defaults to 1e-8.
 
-        The saddle point structure of the dual discretization implies that
-        other block solvers are needed. TODO.
+        Returns:
+            np.array: Solution, velocity and pressure.
 
         """
-        ls = LSFactory()
-        self.x = ls.direct(*self.reassemble())
+        tic = time.time()
+        logger.info('Discretize')
+        self.lhs, self.rhs = self.reassemble()
+        logger.info('Done. Elapsed time ' + str(time.time() - tic))
+
+        tic = time.time()
+        if self.rhs.size < max_direct:
+            logger.info('Solve linear system using direct solver')
+            self.x = LSFactory().direct(self.lhs, self.rhs)
+        else:
+            logger.info('Solve linear system using block preconditioned '
+                        'iterative solver')
+            opts = {k: kwargs[k] for k in ['method', 'mass_approx', 'tol',
+                                           'maxiter', 'schur_solver']
+                    if k in kwargs}
+            if self.is_GridBucket:
+                slv = self._flux_disc.saddle_point_solver(self.grid(),
+                                                          self.lhs, **opts)
+            else:
+                is_u = np.zeros(self.rhs.size, dtype=np.bool)
+                is_u[:self.grid().num_faces] = True
+                slv = SaddlePointSolver.from_matrix(self.lhs, is_u, **opts)
+            self.x = slv(self.rhs)
+            logger.info('Number of iterations: ' + str(slv.iterations[-1]))
+        logger.info('Done. Elapsed time ' + str(time.time() - tic))
         return self.x
 
     def pressure(self, pressure_name='pressure'):
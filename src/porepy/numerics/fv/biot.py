@@ -1,12 +1,18 @@
 import scipy.sparse as sps
 import scipy.sparse.linalg as la
 import time
+import logging
 import numpy as np
 
-from porepy.numerics.fv import mpfa, mpsa, fvutils
+from porepy.numerics.fv import mpfa, mpsa, fvutils, discretization_cache
+from porepy.numerics.linalg.linsolve import Factory, AmgSolver, relative_gmres
 from porepy.params import tensor, bc
+from porepy.utils import sparse_mat
 from porepy.numerics.mixed_dim.solver import Solver
 
+# Module-wide logger
+logger = logging.getLogger(__name__)
+
 
 class Biot(Solver):
 
@@ -147,6 +153,9 @@ class Biot(Solver):
                     options.
                 eta (double): Location of continuity point in MPSA and MPFA.
                     Defaults to 1/3 for simplex grids, 0 otherwise.
+                discretization_cache (DiscretizationCache): If given, the
+                    discretization matrices are loaded from, or stored in, an
+                    on-disk cache. See fv.discretization_cache for details.
 
         The discretization is stored in the data dictionary, in the form of
         several matrices representing different coupling terms. For details,
@@ -178,6 +187,15 @@ class Biot(Solver):
             scipy.sparse.bmat: Block matrix with the combined MPSA/MPFA
                 discretization.
 
+        """
+        A_static, A_flow = self._assemble_blocks(g, data)
+        # Time step size
+        dt = data['dt']
+        return (A_static + dt * A_flow).tocsr()
+
+    def _assemble_blocks(self, g, data):
+        """ Split the system matrix into a part independent of the time step,
+        and the flow term, which is scaled by the time step size.
         """
         div_flow = fvutils.scalar_divergence(g)
         div_mech = fvutils.vector_divergence(g)
@@ -190,18 +208,90 @@ class Biot(Solver):
         A_flow = div_flow * data['flux'] / fluid_viscosity
         A_mech = div_mech * data['stress']
 
-        # Time step size
-        dt = data['dt']
-
         d_scaling = data.get('displacement_scaling', 1)
-        # Matrix for left hand side
-        A_biot = sps.bmat([[A_mech,
-                            data['grad_p'] * biot_alpha],
-                            [data['div_d'] * biot_alpha * d_scaling,
-                             data['compr_discr'] \
-                             + dt * A_flow + data['stabilization']]]).tocsr()
+        # Matrix for left hand side, without the flow term
+        A_static = sps.bmat([[A_mech,
+                              data['grad_p'] * biot_alpha],
+                             [data['div_d'] * biot_alpha * d_scaling,
+                              data['compr_discr'] \
+                              + data['stabilization']]]).tocsr()
+        num_mech = g.dim * g.num_cells
+        A_flow = sps.block_diag([sps.csr_matrix((num_mech, num_mech)),
+                                 A_flow]).tocsr()
+        return A_static, A_flow
+
+    def time_loop(self, g, data, time_steps, solver='factorized',
+                  callback=None, discretize=True, **kwargs):
+        """ Solve a sequence of time steps.
+
+        The problem is discretized once, and the solver for the system matrix
+        is set up (factorized or preconditioned) anew only when the time step
+        size changes; only the solver for the current step size is kept. In
+        each step, only the time dependent part of the right hand side (see
+        rhs_time()) is updated from the previous state. A change of time step
+        size only rescales the flow term of the system matrix; for the
+        iterative solvers, only the flow block solver is set up anew.
+
+        The initial state is taken from data['state'], default zero. During
+        the time loop, data['state'] and data['dt'] are updated; data['state']
+        holds the new state when the callback is invoked.
+
+        Parameters:
+            g (grid): Grid of the problem.
+            data (dictionary): Data of the problem, see discretize().
+            time_steps (np.ndarray): Time step sizes, one per step.
+            solver (str, optional): Linear solver, see solve(). Defaults to
+                'factorized'.
+            callback (function, optional): Called after each time step as
+                callback(t, state, data), e.g. to write output.
+            discretize (boolean, optional): If False, the discretization
+                stored in data is used. Defaults to True.
+            **kwargs: Passed on to solve() for the iterative solvers.
+
+        Returns:
+            np.ndarray: The state after the last time step.
+
+        """
+        if discretize:
+            self.discretize(g, data)
+        A_static, A_flow = self._assemble_blocks(g, data)
+        rhs_bound = self.rhs_bound(g, data)
 
-        return A_biot
+        state = data.get('state', None)
+        if state is None:
+            state = np.zeros(self.ndof(g))
+        solver = solver.strip().lower()
+        iterative = solver in ['fixed_stress', 'gmres']
+
+        slv = None
+        prev_dt = None
+        t = 0
+        for dt in time_steps:
+            data['dt'] = dt
+            data['state'] = state
+            b = rhs_bound + self.rhs_time(g, data)
+            if iterative:
+                if slv is None:
+                    slv = self.solve(A_static + dt * A_flow, solver, g=g,
+                                     **kwargs)
+                elif dt != prev_dt:
+                    slv.update(A_static + dt * A_flow)
+                # Use the previous state as initial guess
+                state = slv.solve(b, x0=state)
+            else:
+                # Only the factorization for the current time step size is
+                # kept, the previous one is released before refactorizing.
+                if dt != prev_dt:
+                    slv = None
+                    slv = self.solve(A_static + dt * A_flow, solver)
+                state = slv(b)
+            prev_dt = dt
+            t += dt
+            data['state'] = state
+            if callback is not None:
+                callback(t, state, data)
+
+        return state
 
 
     def _discretize_flow(self, g, data):
@@ -312,6 +402,12 @@ class Biot(Solver):
         eta = data.get('eta', 0)
         inverter = data.get('inverter', None)
 
+        cache, key, cached = discretization_cache.cached_discretization(
+            data, 'biot_mech', g, constit, bound_mech, bound_flow, eta)
+        if cached is not None:
+            data.update(cached)
+            return
+
         # The grid coordinates are always three-dimensional, even if the grid
         # is really 2D. This means that there is not a 1-1 relation between the
         # number of coordinates of a point / vector and the real dimension.
@@ -328,6 +424,9 @@ class Biot(Solver):
             g.face_normals = np.delete(g.face_normals, (2), axis=0)
             g.nodes = np.delete(g.nodes, (2), axis=0)
 
+            # Copy the tensor, so that the parameters of the caller, and thus
+            # the key of the discretization cache, are not modified.
+            constit = constit.copy()
             constit.c = np.delete(constit.c, (2, 5, 6, 7, 8), axis=0)
             constit.c = np.delete(constit.c, (2, 5, 6, 7, 8), axis=1)
         nd = g.dim
@@ -423,6 +522,12 @@ class Biot(Solver):
 
         stabilization = div * igrad * rhs_normals
 
+        if cache is not None:
+            cache.store(key, {'stress': stress, 'bound_stress': bound_stress,
+                              'grad_p': grad_p, 'div_d': div_d,
+                              'stabilization': stabilization,
+                              'bound_div_d': bound_div_d})
+
         data['stress'] = stress
         data['bound_stress'] = bound_stress
         data['grad_p'] = grad_p
@@ -489,14 +594,41 @@ class Biot(Solver):
 #----------------------- Linear solvers -------------------------------------
 
     def solve(self, A, solver='direct', **kwargs):
+        """ Get a solver for the Biot system.
+
+        Parameters:
+            A (sps.matrix): System matrix.
+            solver (str, optional): 'direct' solves from scratch in each call,
+                'factorized' factorizes A once, and reuses the factorization
+                in all calls. 'fixed_stress' and 'gmres' are iterative
+                solvers based on separate solvers for the mechanics and flow
+                blocks, see FixedStress. Defaults to 'direct'.
+            **kwargs: For the iterative solvers, the grid must be given by
+                the keyword g. Other keywords are passed on to FixedStress.
 
+        Returns:
+            function: Takes a right hand side, or a block of right hand sides
+                (one per column), and returns the solution. For the iterative
+                solvers, a FixedStress object.
+
+        """
         solver = solver.strip().lower()
         if solver == 'direct':
             def slv(b):
                 x = la.spsolve(A, b)
                 return x
         elif solver == 'factorized':
-            slv = la.factorized(A.tocsc())
+            iA = la.splu(A.tocsc())
+
+            def slv(b):
+                if sps.issparse(b):
+                    b = b.toarray()
+                return iA.solve(np.asfortranarray(b))
+
+        elif solver in ['fixed_stress', 'gmres']:
+            opts = dict(kwargs)
+            g = opts.pop('g')
+            slv = FixedStress(A, g.dim * g.num_cells, method=solver, **opts)
 
         else:
             raise ValueError('Unknown solver ' + solver)
@@ -595,3 +727,233 @@ class Biot(Solver):
         stress = np.squeeze(stress_discr * d) + (bound_stress * bound_val)
         return stress
 
+
+
+#------------------------------------------------------------------------------#
+
+
+class FixedStress(object):
+    """ Iterative solver for the Biot system, based on separate solvers for
+    the mechanics and flow blocks.
+
+    The system is split as
+        [A_uu A_up] [u]   [b_u]
+        [A_pu A_pp] [p] = [b_p],
+    where u is displacement and p pressure. The flow block is stabilized by
+    an approximation of the Schur complement,
+        S = A_pp - diag(A_pu diag(A_uu)^-1 A_up),
+    which is the algebraic analogue of the fixed-stress split. Alternatively,
+    a stabilization can be given (e.g. alpha^2 / K_dr times the cell volumes
+    for the classical fixed-stress split), in which case S = A_pp + diag(L).
+
+    Two methods are available:
+        fixed_stress: Iterate by solving the stabilized flow equation, and
+            then the mechanics equation with the updated pressure. The
+            iterations converge if S is a good approximation of the Schur
+            complement A_pp - A_pu A_uu^-1 A_up; this may fail for small
+            time steps.
+        gmres: GMRES, preconditioned by the block upper triangular matrix
+            [A_uu A_up; 0 S]. This is more robust.
+
+    The mechanics and flow solvers are set up once, in the constructor, and
+    reused in all solves. For a new system matrix (e.g. a new time step
+    size), use update(), which sets up only the solvers of blocks that have
+    changed.
+
+    Attributes:
+        method (str): 'fixed_stress' or 'gmres'.
+        num_mech (int): Number of mechanics (displacement) dofs. These come
+            first in the system.
+        tol (double): Relative residual tolerance.
+        maxiter (int): Maximum number of iterations (for gmres, of restart
+            cycles).
+        residuals (list of list of double): Relative residual norms of the
+            iterations, one list per solve. For gmres, these are the
+            preconditioned residual norms reported by the Krylov solver.
+        iterations (list of int): Number of iterations, one per solve.
+        setup_time (double): Accumulated time spent in setup of the
+            sub-solvers, in seconds.
+        solve_time (double): Accumulated time spent in solves, in seconds.
+
+    """
+
+    def __init__(self, A, num_mech, method='fixed_stress',
+                 mech_solver='direct', flow_solver='direct',
+                 stabilization=None, tol=1e-8, maxiter=100):
+        """
+        Parameters:
+            A (sps.matrix): System matrix.
+            num_mech (int): Number of mechanics dofs.
+            method (str, optional): 'fixed_stress' or 'gmres'. Defaults to
+                'fixed_stress'.
+            mech_solver, flow_solver (str, optional): Solvers for the
+                mechanics and flow blocks, either 'direct' (factorized once)
+                or 'amg'. Defaults to 'direct'.
+            stabilization (np.ndarray, optional): Stabilization of the flow
+                block, see class documentation. Defaults to the algebraic
+                approximation of the Schur complement.
+            tol (double, optional): Relative residual tolerance. Defaults to
+                1e-8.
+            maxiter (int, optional): Maximum number of iterations (for gmres,
+                of restart cycles). Defaults to 100.
+
+        Raises:
+            ValueError: If the method or a sub-solver is unknown.
+
+        """
+        method = method.strip().lower()
+        if method not in ['fixed_stress', 'gmres']:
+            raise ValueError('Unknown method ' + method)
+        for s in [mech_solver, flow_solver]:
+            if s not in ['direct', 'amg']:
+                raise ValueError('Unknown sub-solver ' + s)
+        self.method = method
+        self.num_mech = num_mech
+        self.mech_solver = mech_solver
+        self.flow_solver = flow_solver
+        self.stabilization = stabilization
+        self.tol = tol
+        self.maxiter = maxiter
+
+        self.residuals = []
+        self.iterations = []
+        self.setup_time = 0
+        self.solve_time = 0
+
+        self._A_uu = None
+        self._S = None
+        self._mech_amg = None
+        if mech_solver == 'amg':
+            # The near null space of elasticity contains the translations
+            num_cells = A.shape[0] - num_mech
+            nd = num_mech // num_cells
+            self._mech_amg = AmgSolver(np.tile(np.eye(nd), (num_cells, 1)))
+        self._flow_amg = AmgSolver() if flow_solver == 'amg' else None
+        self.update(A)
+
+    def update(self, A):
+        """ Set a new system matrix. Solvers are set up anew only for blocks
+        that have changed.
+
+        Parameters:
+            A (sps.matrix): System matrix.
+
+        """
+        tic = time.time()
+        A = sps.csr_matrix(A)
+        A.sum_duplicates()
+        nm = self.num_mech
+        self.A = A
+        A_uu = A[:nm][:, :nm]
+        self.A_up = A[:nm][:, nm:]
+        self.A_pu = A[nm:][:, :nm]
+        A_pp = A[nm:][:, nm:]
+        self.A_pp = A_pp
+
+        if self.stabilization is None:
+            diag_inv = sps.dia_matrix((1. / A_uu.diagonal(), 0),
+                                      shape=A_uu.shape)
+            L = -(self.A_pu * diag_inv * self.A_up).diagonal()
+        else:
+            L = self.stabilization
+        S = sps.csr_matrix(A_pp + sps.dia_matrix((L, 0), shape=A_pp.shape))
+        S.sum_duplicates()
+
+        if not sparse_mat.csr_equal(A_uu, self._A_uu):
+            self._mech_solve = self._sub_solver(A_uu, self._mech_amg)
+            self._A_uu = A_uu
+        if not sparse_mat.csr_equal(S, self._S):
+            self._flow_solve = self._sub_solver(S, self._flow_amg)
+            self._S = S
+        self.setup_time += time.time() - tic
+
+    def solve(self, b, x0=None):
+        """ Solve the system.
+
+        Parameters:
+            b (np.ndarray): Right hand side.
+            x0 (np.ndarray, optional): Initial guess. Defaults to zero.
+
+        Returns:
+            np.ndarray: Solution.
+
+        """
+        tic = time.time()
+        b = np.asarray(b).ravel()
+        if x0 is None:
+            x = np.zeros(b.size)
+        else:
+            x = np.asarray(x0, dtype=np.float).ravel().copy()
+        norm_b = np.linalg.norm(b)
+        if norm_b == 0:
+            norm_b = 1
+        res = []
+        if self.method == 'fixed_stress':
+            x = self._fixed_stress(b, x, norm_b, res)
+        else:
+            x = self._gmres(b, x, res)
+        self.residuals.append(res)
+        self.iterations.append(len(res))
+        self.solve_time += time.time() - tic
+        return x
+
+    def __call__(self, b):
+        return self.solve(b)
+
+    def precondition(self, r):
+        """ Apply the block upper triangular preconditioner.
+        """
+        nm = self.num_mech
+        p = self._flow_solve(r[nm:])
+        u = self._mech_solve(r[:nm] - self.A_up * p)
+        return np.hstack((u, p))
+
+    def statistics(self):
+        """ Timings and iteration counts.
+
+        Returns:
+            dictionary: With keys setup_time, solve_time, iterations and
+                residuals.
+
+        """
+        return {'setup_time': self.setup_time,
+                'solve_time': self.solve_time,
+                'iterations': self.iterations,
+                'residuals': self.residuals}
+
+    def _fixed_stress(self, b, x, norm_b, res):
+        nm = self.num_mech
+        b_u, b_p = b[:nm], b[nm:]
+        u, p = x[:nm], x[nm:]
+        for _ in range(self.maxiter):
+            # Flow equation with fixed volumetric stress, then mechanics with
+            # the updated pressure
+            p = p + self._flow_solve(b_p - self.A_pu * u - self.A_pp * p)
+            u = self._mech_solve(b_u - self.A_up * p)
+            x = np.hstack((u, p))
+            res.append(np.linalg.norm(b - self.A * x) / norm_b)
+            if res[-1] < self.tol:
+                break
+        else:
+            logger.warning('Fixed-stress iterations did not converge')
+        return x
+
+    def _gmres(self, b, x, res):
+        M = la.LinearOperator(self.A.shape, self.precondition)
+
+        # The callback receives the preconditioned residual norm, already
+        # relative to the (preconditioned) right hand side, in each inner
+        # iteration.
+        def callback(rk):
+            res.append(float(rk))
+        x, info = relative_gmres(self.A, b, x0=x, M=M, tol=self.tol,
+                                 maxiter=self.maxiter, callback=callback)
+        if info != 0:
+            logger.warning('GMRES failed with status ' + str(info))
+        return x
+
+    def _sub_solver(self, A, amg):
+        if amg is None:
+            return Factory().direct(A)
+        amg.setup(A)
+        return lambda b: amg.solve(b, tol=1e-3 * self.tol)
@@ -0,0 +1,269 @@
+"""
+On-disk cache for finite volume discretization matrices.
+
+Discretization by mpfa, and in particular mpsa, is expensive. In workflows
+where the same grid and parameters are discretized repeatedly (e.g. to vary
+sources or boundary values), the discretization matrices can be stored on
+disk and reused.
+
+Each cache entry is identified by a hash of the data the discretization
+depends on: grid topology and geometry, the constitutive tensor, the types of
+boundary conditions, and numerical parameters such as eta and apertures.
+The matrices are stored in csr format in a binary numpy file (.npz), one
+file per entry. The total size of the cache is bounded; when it is exceeded,
+the least recently used entries are removed.
+
+The cache is opt-in. To activate it for a discretization, put a cache object
+in the data dictionary under the keyword 'discretization_cache':
+
+    cache = DiscretizationCache('/path/to/cache', max_size=2**30)
+    data['discretization_cache'] = cache
+    Mpsa().matrix_rhs(g, data)
+
+"""
+import hashlib
+import logging
+import os
+
+import numpy as np
+import scipy.sparse as sps
+
+# Module-wide logger
+logger = logging.getLogger(__name__)
+
+
+class DiscretizationCache(object):
+    """ Size-bounded, content-addressed on-disk storage of sparse matrices.
+
+    Attributes:
+        path (str): Directory where the cache entries are stored.
+        max_size (int): Maximum size of the cache, in bytes.
+
+    """
+
+    def __init__(self, path, max_size=2**30):
+        """
+        Parameters:
+            path (str): Directory for the cache entries. Created if it does
+                not exist.
+            max_size (int, optional): Maximum total size of the cache entries
+                in bytes. Defaults to 1 GB.
+
+        """
+        self.path = path
+        self.max_size = max_size
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def key(self, method, g, *args):
+        """ Compute the key of a discretization.
+
+        Parameters:
+            method (str): Name of the discretization method.
+            g (grid): Grid to be discretized, with geometry computed.
+            *args: Additional data the discretization depends on. Can be
+                np.ndarrays, scipy sparse matrices, tensors, boundary
+                conditions, scalars or None.
+
+        Returns:
+            str: Hexadecimal hash of the input.
+
+        """
+        h = hashlib.sha1()
+        h.update(str(method).encode())
+        _update_hash(h, _grid_arrays(g))
+        for a in args:
+            _update_hash(h, a)
+        return h.hexdigest()
+
+    def load(self, key):
+        """ Load matrices from the cache.
+
+        Parameters:
+            key (str): Key of the entry, see key().
+
+        Returns:
+            dictionary: Matrices (sps.csr_matrix) of the entry, by name. None
+                if the key is not in the cache.
+
+        """
+        fn = self._file_name(key)
+        if not os.path.isfile(fn):
+            return None
+        try:
+            with np.load(fn) as f:
+                names = [str(n) for n in f['names']]
+                mats = {}
+                for n in names:
+                    mats[n] = sps.csr_matrix((f[n + '_data'],
+                                              f[n + '_indices'],
+                                              f[n + '_indptr']),
+                                             shape=tuple(f[n + '_shape']))
+        except (IOError, OSError, KeyError, ValueError):
+            logger.warning('Could not read cache entry ' + key)
+            return None
+        # Mark the entry as recently used
+        os.utime(fn, None)
+        logger.info('Loaded discretization from cache entry ' + key)
+        return mats
+
+    def store(self, key, mats):
+        """ Store matrices in the cache, and evict the least recently used
+        entries if the cache has grown too large.
+
+        Parameters:
+            key (str): Key of the entry, see key().
+            mats (dictionary): Sparse matrices to be stored, by name.
+
+        """
+        arrays = {'names': np.array(sorted(mats.keys()))}
+        for n, m in mats.items():
+            m = sps.csr_matrix(m)
+            arrays[n + '_data'] = m.data
+            arrays[n + '_indices'] = m.indices
+            arrays[n + '_indptr'] = m.indptr
+            arrays[n + '_shape'] = np.array(m.shape)
+
+        # Write to a temporary file first, so that no incomplete entries are
+        # seen by other processes using the same cache.
+        fn = self._file_name(key)
+        tmp = fn + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        _replace(tmp, fn)
+        self._evict()
+
+    def clear(self):
+        """ Remove all entries from the cache.
+        """
+        for fn, _, _ in self._entries():
+            os.remove(fn)
+
+    def size(self):
+        """ Total size of the cache entries, in bytes.
+        """
+        return sum(e[2] for e in self._entries())
+
+    def _file_name(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    def _entries(self):
+        # File name, time of last use and size of all entries
+        entries = []
+        for fn in os.listdir(self.path):
+            if not fn.endswith('.npz'):
+                continue
+            fn = os.path.join(self.path, fn)
+            try:
+                st = os.stat(fn)
+            except OSError:
+                # Removed by another process
+                continue
+            entries.append((fn, st.st_mtime, st.st_size))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(e[2] for e in entries)
+        for fn, _, sz in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(fn)
+            except OSError:
+                pass
+            total -= sz
+            logger.info('Evicted discretization cache entry ' + fn)
+
+#------------------------------------------------------------------------------#
+
+
+def cached_discretization(data, method, g, *args):
+    """ Get the cache and key of a discretization, if caching is activated.
+
+    Parameters:
+        data (dictionary): Data dictionary of the discretization. Caching is
+            activated by the keyword 'discretization_cache'.
+        method, g, *args: See DiscretizationCache.key().
+
+    Returns:
+        DiscretizationCache: The cache, or None if caching is not active.
+        str: Key of the discretization, None if caching is not active.
+        dictionary: Cached matrices, or None if not available.
+
+    """
+    cache = data.get('discretization_cache', None)
+    if cache is None:
+        return None, None, None
+    key = cache.key(method, g, *args)
+    return cache, key, cache.load(key)
+
+
+def grid_hash(g):
+    """ Compute a hash of the topology and geometry of a grid.
+
+    Parameters:
+        g (grid): Grid, with geometry computed.
+
+    Returns:
+        str: Hexadecimal hash of the grid.
+
+    """
+    h = hashlib.sha1()
+    _update_hash(h, _grid_arrays(g))
+    return h.hexdigest()
+
+
+def _grid_arrays(g):
+    # Topology and geometry of the grid
+    return [g.dim, g.nodes, g.face_nodes, g.cell_faces, g.face_normals,
+            g.face_centers, g.face_areas, g.cell_centers, g.cell_volumes]
+
+
+def _update_hash(h, a):
+    """ Add the content of an object to a hash.
+    """
+    if a is None:
+        h.update(b'None')
+    elif isinstance(a, (list, tuple)):
+        h.update(('list' + str(len(a))).encode())
+        for b in a:
+            _update_hash(h, b)
+    elif sps.issparse(a):
+        a = sps.csr_matrix(a)
+        a.sum_duplicates()
+        a.sort_indices()
+        h.update(('sparse' + str(a.shape)).encode())
+        _update_hash(h, [a.indptr, a.indices, a.data])
+    elif isinstance(a, np.ndarray):
+        h.update((str(a.dtype) + str(a.shape)).encode())
+        h.update(np.ascontiguousarray(a).tobytes())
+    elif hasattr(a, 'perm'):
+        # Second order tensor
+        _update_hash(h, a.perm)
+    elif hasattr(a, 'c'):
+        # Fourth order tensor
+        _update_hash(h, a.c)
+    elif hasattr(a, 'is_dir') and hasattr(a, 'is_neu'):
+        # Boundary condition
+        _update_hash(h, [a.is_dir, a.is_neu])
+    else:
+        h.update(repr(a).encode())
+
+
+def _replace(src, dst):
+    """ Rename src to dst, replace dst if it exists.
+
+    os.replace is not available in python 2, where os.rename is used instead.
+    On Windows, os.rename fails if dst exists; since entries are identified
+    by their content, the existing entry is then kept.
+    """
+    try:
+        os.replace(src, dst)
+    except AttributeError:
+        try:
+            os.rename(src, dst)
+        except OSError:
+            if not os.path.isfile(dst):
+                raise
+            os.remove(src)
@@ -8,7 +8,8 @@ from __future__ import division
 import numpy as np
 import scipy.sparse as sps
 
-from porepy.utils import matrix_compression, mcolon
+from porepy.utils import matrix_compression, mcolon, kernels
+from porepy.numerics.fv import discretization_cache
 from porepy.params.data import Parameters
 from porepy.grids.grid_bucket import GridBucket
 
@@ -233,17 +234,25 @@ def invert_diagonal_blocks(mat, s, method=None):
     """
     Invert block diagonal matrix.
 
-    Three implementations are available, either pure numpy, or a speedup using
-    numba or cython. If none is specified, the function will try to use numba,
-    then cython. The python option will only be invoked if explicitly asked
-    for; it will be very slow for general problems.
+    Four implementations are available: A vectorized numpy version, a pure
+    python loop over the blocks, or a speedup using numba or cython. The
+    vectorized version groups the blocks according to their size, and inverts
+    all blocks of equal size by a single call to np.linalg.inv. Since the
+    number of distinct block sizes is usually small (for mpfa and mpsa they
+    are given by the number of cells sharing a node), this is efficient, and
+    it is used if no method is specified. The numba version inverts the
+    blocks in parallel, using all threads available to numba; the compiled
+    kernel is cached on disk, see porepy.utils.kernels. The python
+    option will only be invoked if explicitly asked for; it will be very slow
+    for general problems.
 
     Parameters
     ----------
     mat: sps.csr matrix to be inverted.
     s: block size. Must be int64 for the numba acceleration to work
-    method: Choice of method. Either numba (default), cython or 'python'.
-        Defaults to None, in which case first numba, then cython is tried.
+    method: Choice of method. Either 'vectorized', 'numba', 'cython' or
+        'python'. Defaults to None, in which case the vectorized method is
+        used. If numba fails, cython is tried.
 
     Returns
     -------
@@ -286,6 +295,56 @@ def invert_diagonal_blocks(mat, s, method=None):
             p2 = p2 + n2
         return v
 
+    def invert_diagonal_blocks_vectorized(a, sz):
+        """
+        Invert block diagonal matrix by stacking blocks of equal size into
+        three-dimensional arrays, and invert each stack with a single call to
+        np.linalg.inv.
+
+        Parameters
+        ----------
+        a sps.csr-matrix, to be inverted
+        sz - size of the individual blocks
+
+        Returns
+        -------
+        inv_a inverse matrix
+        """
+        sz = np.asarray(sz, dtype=np.int64)
+        a = sps.coo_matrix(a)
+        a.sum_duplicates()
+
+        # Row index of the first row, and start of the inverse values, of
+        # each block
+        block_row_start = np.hstack((0, np.cumsum(sz)[:-1]))
+        block_val_start = np.hstack((0, np.cumsum(np.square(sz))[:-1]))
+
+        # Block number, and local row and column numbers, of the matrix
+        # elements
+        block_of_row = matrix_compression.rldecode(np.arange(sz.size), sz)
+        blk = block_of_row[a.row]
+        loc_row = a.row - block_row_start[blk]
+        loc_col = a.col - block_row_start[blk]
+
+        v = np.zeros(np.sum(np.square(sz)))
+        for n in np.unique(sz):
+            if n == 0:
+                continue
+            blocks_of_size = np.where(sz == n)[0]
+            # Position of the blocks in the stack of blocks of this size
+            pos_in_stack = -np.ones(sz.size, dtype=np.int64)
+            pos_in_stack[blocks_of_size] = np.arange(blocks_of_size.size)
+
+            stack = np.zeros((blocks_of_size.size, n, n))
+            elem = sz[blk] == n
+            stack[pos_in_stack[blk[elem]], loc_row[elem],
+                  loc_col[elem]] = a.data[elem]
+
+            ind = block_val_start[blocks_of_size].reshape((-1, 1)) \
+                + np.arange(n * n)
+            v[ind.ravel()] = np.linalg.inv(stack).ravel()
+        return v
+
     def invert_diagonal_blocks_cython(a, size):
         """ Invert block diagonal matrix using code wrapped with cython.
         """
@@ -306,10 +365,9 @@ def invert_diagonal_blocks(mat, s, method=None):
     def invert_diagonal_blocks_numba(a, size):
         """
         Invert block diagonal matrix by invoking numba acceleration of a simple
-        for-loop based algorithm.
+        for-loop based algorithm. The blocks are inverted in parallel.
 
-        This approach should be more efficient than the related method
-        invert_diagonal_blocks_python for larger problems.
+        The compiled kernel is cached on disk, see porepy.utils.kernels.
 
         Parameters
         ----------
@@ -320,95 +378,20 @@ def invert_diagonal_blocks(mat, s, method=None):
         -------
         ia: inverse of a
         """
-        try:
-            import numba
-        except:
-            raise ImportError('Numba not available on the system')
+        inv_python = kernels.get('inv_diagonal_blocks')
 
         # Sort matrix storage before pulling indices and data
-        a.sorted_indices()
+        a = a.sorted_indices()
         ptr = a.indptr
-        indices = a.indices
+        indices = a.indices.astype(ptr.dtype)
         dat = a.data
 
-        # Just in time compilation
-        @numba.jit("f8[:](i4[:],i4[:],f8[:],i8[:])", nopython=True,
-                   nogil=False)
-        def inv_python(indptr, ind, data, sz):
-            """
-            Invert block matrices by explicitly forming local matrices. The code
-            in itself is not efficient, but it is hopefully well suited for
-            speeding up with numba.
-
-            It may be possible to restruct the code to further help numba,
-            this has not been investigated.
-
-            The computation can easily be parallelized, consider this later.
-            """
-
-            # Index of where the rows start for each block.
-            # block_row_starts_ind = np.hstack((np.array([0]),
-            #                                   np.cumsum(sz[:-1])))
-            block_row_starts_ind = np.zeros(sz.size, dtype=np.int32)
-            block_row_starts_ind[1:] = np.cumsum(sz[:-1])
-
-            # Number of columns per row. Will change from one column to the
-            # next
-            num_cols_per_row = indptr[1:] - indptr[0:-1]
-            # Index to where the columns start for each row (NOT blocks)
-            # row_cols_start_ind = np.hstack((np.zeros(1),
-            #                                 np.cumsum(num_cols_per_row)))
-            row_cols_start_ind = np.zeros(num_cols_per_row.size + 1,
-                                          dtype=np.int32)
-            row_cols_start_ind[1:] = np.cumsum(num_cols_per_row)
-
-            # Index to where the (full) data starts. Needed, since the
-            # inverse matrix will generally be full
-            # full_block_starts_ind = np.hstack((np.array([0]),
-            #                                    np.cumsum(np.square(sz))))
-            full_block_starts_ind = np.zeros(sz.size + 1, dtype=np.int32)
-            full_block_starts_ind[1:] = np.cumsum(np.square(sz))
-            # Structure to store the solution
-            inv_vals = np.zeros(np.sum(np.square(sz)))
-
-            # Loop over all blocks
-            for iter1 in range(sz.size):
-                n = sz[iter1]
-                loc_mat = np.zeros((n, n))
-                # Fill in non-zero elements in local matrix
-                for iter2 in range(n):  # Local rows
-                    global_row = block_row_starts_ind[iter1] + iter2
-                    data_counter = row_cols_start_ind[global_row]
-
-                    # Loop over local columns. Getting the number of columns
-                    #  for each row is a bit involved
-                    for _ in range(num_cols_per_row[iter2 +
-                                                    block_row_starts_ind[iter1]]):
-                        loc_col = ind[data_counter] \
-                            - block_row_starts_ind[iter1]
-                        loc_mat[iter2, loc_col] = data[data_counter]
-                        data_counter += 1
-
-                # Compute inverse. np.linalg.inv is supported by numba (May
-                # 2016), it is not clear if this is the best option. To be
-                # revised
-                inv_mat = np.ravel(np.linalg.inv(loc_mat))
-
-                loc_ind = np.arange(full_block_starts_ind[iter1],
-                                    full_block_starts_ind[iter1 + 1])
-                inv_vals[loc_ind] = inv_mat
-                # Update fields
-            return inv_vals
-
-        v = inv_python(ptr, indices, dat, size)
+        v = inv_python(ptr, indices, dat, size.astype(np.int64))
         return v
 
     # Variable to check if we have tried and failed with numba
     try_cython = False
-    # Do not use numba for small systems due to compiling overhead. If the
-    # application is inversion of transmissibility systems in mpfa,
-    # s.shape[0] = number of nodes of the grid.
-    if method == 'numba' or (method is None and s.shape[0] > 4000):
+    if method == 'numba':
         try:
             inv_vals = invert_diagonal_blocks_numba(mat, s)
         except:
@@ -420,8 +403,10 @@ def invert_diagonal_blocks(mat, s, method=None):
             inv_vals = invert_diagonal_blocks_cython(mat, s)
         except ImportError as e:
             raise e
-    elif method == 'python' or (method is None and s.shape[0] <= 4000):
+    elif method == 'python':
         inv_vals = invert_diagonal_blocks_python(mat, s)
+    elif method == 'vectorized' or method is None:
+        inv_vals = invert_diagonal_blocks_vectorized(mat, s)
 
 
     ia = block_diag_matrix(inv_vals, s)
@@ -626,6 +611,29 @@ def zero_out_sparse_rows(A, rows, diag=None):
     return A
 
 
+def replace_rows(A, B, rows):
+    """
+    Replace rows of a sparse matrix by the corresponding rows of another
+    matrix. Intended for inserting a partial update of a discretization into
+    the full discretization.
+
+    Parameters:
+        A: Sparse matrix to be updated. If A is in csr format, its data is
+            modified.
+        B: Sparse matrix of the same shape as A. Only the given rows are used.
+        rows (np.ndarray of int): Indices of rows to be replaced.
+
+    Returns:
+        sps.csr_matrix: A, with rows replaced.
+
+    """
+    A = zero_out_sparse_rows(sps.csr_matrix(A), rows)
+    keep = np.zeros(A.shape[0])
+    keep[rows] = 1
+    A = A + sps.dia_matrix((keep, 0), shape=(A.shape[0], A.shape[0])) * B
+    A.eliminate_zeros()
+    return A.tocsr()
+
 #-----------------------------------------------------------------------------
 
 class ExcludeBoundaries(object):
@@ -904,13 +912,91 @@ def cell_ind_for_partial_update(g, cells=None, faces=None, nodes=None):
 
     face_ind = np.squeeze(np.where(active_faces))
 
-    # Do a sort of the indexes to be returned.
-    cell_ind.sort()
+    # Do a sort of the indexes to be returned. Cells may have been found by
+    # more than one of cells, faces and nodes; remove duplicates.
+    cell_ind = np.unique(cell_ind)
     face_ind.sort()
     # Return, with data type int
     return cell_ind.astype('int'), face_ind.astype('int')
 
 
+class DiscretizationState(object):
+    """ Parameters used in a discretization, stored to identify the cells and
+    faces that need an update when the parameters change.
+
+    Intended for use by discretization classes that support partial updates
+    (Mpfa and Mpsa); the state is kept in the data dictionary of the grid.
+
+    Attributes:
+        num_cells (int): Number of cells in the discretized grid.
+        num_faces (int): Number of faces in the discretized grid.
+        grid_hash (str): Hash of the topology and geometry of the grid, see
+            discretization_cache.grid_hash().
+        tensor (np.ndarray): Copy of the tensor field, either the perm field of
+            a second order tensor, or the c field of a fourth order tensor. The
+            last axis runs over the cells.
+        is_dir (np.ndarray, bool): Copy of Dirichlet faces.
+        is_neu (np.ndarray, bool): Copy of Neumann faces.
+        apertures (np.ndarray): Copy of cell apertures. None if the
+            discretization does not use apertures.
+
+    """
+
+    def __init__(self, g, tensor, bnd, apertures=None):
+        self.num_cells = g.num_cells
+        self.num_faces = g.num_faces
+        self.grid_hash = discretization_cache.grid_hash(g)
+        self.tensor = _tensor_field(tensor).copy()
+        self.is_dir = bnd.is_dir.copy()
+        self.is_neu = bnd.is_neu.copy()
+        if apertures is None:
+            self.apertures = None
+        else:
+            self.apertures = np.array(apertures, dtype=float)
+
+    def changes(self, g, tensor, bnd, apertures=None):
+        """ Find cells and faces where the parameters have changed.
+
+        Parameters:
+            g (grid): Grid to be discretized.
+            tensor (SecondOrder or FourthOrder): New tensor.
+            bnd (BoundaryCondition): New boundary conditions.
+            apertures (np.ndarray, optional): New apertures.
+
+        Returns:
+            np.ndarray (int): Cells where the tensor or the apertures have
+                changed.
+            np.ndarray (int): Faces where the type of boundary condition has
+                changed.
+            Both are None if the grid (topology or geometry), or the shape of
+            the tensor, has changed, in which case the whole grid must be
+            discretized.
+
+        """
+        field = _tensor_field(tensor)
+        if g.num_cells != self.num_cells or g.num_faces != self.num_faces \
+                or field.shape != self.tensor.shape \
+                or (apertures is None) != (self.apertures is None) \
+                or discretization_cache.grid_hash(g) != self.grid_hash:
+            return None, None
+
+        changed_cells = np.any(field != self.tensor,
+                               axis=tuple(range(field.ndim - 1)))
+        if apertures is not None:
+            changed_cells = np.logical_or(changed_cells,
+                                          apertures != self.apertures)
+        changed_faces = np.logical_or(bnd.is_dir != self.is_dir,
+                                      bnd.is_neu != self.is_neu)
+        return np.where(changed_cells)[0], np.where(changed_faces)[0]
+
+
+def _tensor_field(tensor):
+    # Cell-wise values of a second or fourth order tensor
+    if hasattr(tensor, 'perm'):
+        return tensor.perm
+    return tensor.c
+
+
 def map_subgrid_to_grid(g, loc_faces, loc_cells, is_vector):
 
     num_faces_loc = loc_faces.size
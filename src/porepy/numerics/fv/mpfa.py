@@ -4,13 +4,14 @@ Implementation of the multi-point flux approximation O-method.
 """
 from __future__ import division
 import warnings
+import multiprocessing
 import numpy as np
 import scipy.sparse as sps
 
-from porepy.numerics.fv import fvutils, tpfa
+from porepy.numerics.fv import fvutils, tpfa, discretization_cache
 from porepy.grids import partition
 from porepy.params import tensor, bc, data
-from porepy.utils import matrix_compression
+from porepy.utils import matrix_compression, sparse_mat
 from porepy.utils import comp_geom as cg
 from porepy.numerics.mixed_dim.solver import Solver, SolverMixedDim
 from porepy.numerics.mixed_dim.coupler import Coupler
@@ -155,6 +156,24 @@ class Mpfa(Solver):
             following keys: 'dir' and 'neu', for Dirichlet and Neumann boundary
             conditions, respectively.
 
+        In addition, the following optional keywords control the numerics:
+        max_memory : double
+            Threshold for estimated peak memory. If exceeded, the
+            discretization is split into sub-calculations. See mpfa() for
+            details.
+        num_proc : int
+            Number of processes used for the sub-calculations. Defaults to 1.
+        discretization_cache : DiscretizationCache
+            If given, the discretization is loaded from the cache if
+            available, and stored in the cache otherwise. See
+            fv.discretization_cache for details.
+        partial_update : boolean
+            If True, the parameters are stored in data['mpfa_state'], and on
+            the next call, only the stencils of cells where permeability or
+            apertures have changed, and of faces where the type of boundary
+            condition has changed, are recomputed, see mpfa_partial().
+            Defaults to False.
+
         Parameters
         ----------
         g : grid, or a subclass, with geometry fields computed.
@@ -166,15 +185,62 @@ class Mpfa(Solver):
         bnd = param.get_bc(self)
         a = param.aperture
 
-        trm, bound_flux = mpfa(g, k, bnd, apertures=a)
-        data['flux'] = trm
-        data['bound_flux'] = bound_flux
+        max_memory = data.get('max_memory', None)
+        num_proc = data.get('num_proc', 1)
+
+        partial_update = data.get('partial_update', False)
+        if partial_update and g.dim > 1 and 'mpfa_state' in data:
+            cells, faces = data['mpfa_state'].changes(g, k, bnd, a)
+            # If the grid has changed, we need a full discretization
+            if cells is not None:
+                if cells.size > 0 or faces.size > 0:
+                    self._update_partial(g, data, k, bnd, a, cells, faces)
+                data['mpfa_state'] = fvutils.DiscretizationState(g, k, bnd, a)
+                return
+
+        cache, key, cached = discretization_cache.cached_discretization(
+            data, 'mpfa', g, k, bnd, a)
+        if cached is not None:
+            data.update(cached)
+        else:
+            trm, bound_flux = mpfa(g, k, bnd, apertures=a,
+                                   max_memory=max_memory, num_proc=num_proc)
+            if cache is not None:
+                cache.store(key, {'flux': trm, 'bound_flux': bound_flux})
+            data['flux'] = trm
+            data['bound_flux'] = bound_flux
+
+        if partial_update:
+            data['mpfa_state'] = fvutils.DiscretizationState(g, k, bnd, a)
+
+    def _update_partial(self, g, data, k, bnd, a, cells, faces):
+        """ Recompute the discretization on the stencils of the given cells
+        and faces, and replace the corresponding rows of the discretization
+        stored in data.
+        """
+        if cells.size == 0:
+            cells = None
+        if faces.size == 0:
+            faces = None
+        with warnings.catch_warnings():
+            # Partial updates based on cells and faces are not covered by the
+            # tests of mpfa_partial, thus it warns. Do not repeat this for
+            # every update. Other warnings are kept.
+            warnings.filterwarnings('ignore', message='(Cells|Faces) keyword '
+                                    'for partial mpfa has not been tested')
+            flux, bound_flux, active_faces = mpfa_partial(
+                g, k, bnd, eta=fvutils.determine_eta(g), inverter=None,
+                cells=cells, faces=faces, apertures=a)
+
+        data['flux'] = fvutils.replace_rows(data['flux'], flux, active_faces)
+        data['bound_flux'] = fvutils.replace_rows(data['bound_flux'],
+                                                  bound_flux, active_faces)
 
 #------------------------------------------------------------------------------#
 
 
 def mpfa(g, k, bnd, eta=None, inverter=None, apertures=None, max_memory=None,
-         **kwargs):
+         num_proc=1, **kwargs):
     """
     Discretize the scalar elliptic equation by the multi-point flux
     approximation method.
@@ -210,6 +276,12 @@ def mpfa(g, k, bnd, eta=None, inverter=None, apertures=None, max_memory=None,
             If the **estimated** memory need is larger than the provided
             threshold, the discretization will be split into an appropriate
             number of sub-calculations, using mpfa_partial().
+        num_proc (int, optional): Number of processes used for the
+            sub-calculations when max_memory is given. Each process computes
+            the discretization on a subset of the partitions, and the results
+            are merged in partition order, thus the result is independent of
+            the number of processes. Defaults to 1, in which case the
+            sub-calculations are run in serial.
 
     Returns:
         scipy.sparse.csr_matrix (shape num_faces, num_cells): flux
@@ -267,43 +339,35 @@ def mpfa(g, k, bnd, eta=None, inverter=None, apertures=None, max_memory=None,
         # Let partitioning module apply the best available method
         part = partition.partition(g, num_part)
 
-        # Boundary faces on the main grid
-        glob_bound_face = g.get_boundary_faces()
-
-        # Empty fields for flux and bound_flux. Will be expanded as we go.
-        # Implementation note: It should be relatively straightforward to
-        # estimate the memory need of flux (face_nodes -> node_cells ->
-        # unique).
-        flux = sps.csr_matrix(g.num_faces, g.num_cells)
-        bound_flux = sps.csr_matrix(g.num_faces, g.num_faces)
-
         cn = g.cell_nodes()
 
-        face_covered = np.zeros(g.num_faces, dtype=np.bool)
-
-        for p in range(part.max()):
-            # Cells in this partitioning
-            cell_ind = np.argwhere(part == p).ravel('F')
-            # To discretize with as little overlap as possible, we use the
-            # keyword nodes to specify the update stencil. Find nodes of the
-            # local cells.
+        # To discretize with as little overlap as possible, we use the keyword
+        # nodes to specify the update stencil. Find the nodes of the cells in
+        # each partition.
+        part_nodes = []
+        for p in np.unique(part):
             active_cells = np.zeros(g.num_cells, dtype=np.bool)
-            active_cells[cell_ind] = 1
-            active_nodes = np.squeeze(np.where((cn * active_cells) > 0))
-
-            # Perform local discretization.
-            loc_flux, loc_bound_flux, loc_faces \
-                = mpfa_partial(g, k, bnd, eta=eta, inverter=inverter,
-                               nodes=active_nodes)
-
-            # Eliminate contribution from faces already covered
-            loc_flux[face_covered, :] *= 0
-            loc_bound_flux[face_covered, :] *= 0
-
-            face_covered[loc_faces] = 1
+            active_cells[part == p] = 1
+            part_nodes.append(np.where((cn * active_cells) > 0)[0])
+
+        # Perform local discretizations, either in serial or by a pool of
+        # worker processes. In the latter case, the discretization data is
+        # passed to the workers once, on initialization of the pool.
+        discr_data = (g, k, bnd, eta, inverter, apertures)
+        if num_proc > 1 and len(part_nodes) > 1:
+            pool = multiprocessing.Pool(min(num_proc, len(part_nodes)),
+                                        initializer=_init_partition_worker,
+                                        initargs=discr_data)
+            try:
+                loc_discr = pool.map(_partition_worker, part_nodes)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            loc_discr = [_mpfa_partition(*(discr_data + (nodes,)))
+                         for nodes in part_nodes]
 
-            flux += loc_flux
-            bound_flux += loc_bound_flux
+        flux, bound_flux = _merge_partitions(g, loc_discr)
 
     return flux, bound_flux
 
@@ -373,6 +437,8 @@ def mpfa_partial(g, k, bnd, eta=0, inverter='numba', cells=None, faces=None,
     # Copy permeability field, and restrict to local cells
     loc_k = k.copy()
     loc_k.perm = loc_k.perm[::, ::, l2g_cells]
+    if apertures is not None:
+        apertures = apertures[l2g_cells]
 
     glob_bound_face = g.get_boundary_faces()
 
@@ -410,6 +476,73 @@ def mpfa_partial(g, k, bnd, eta=0, inverter='numba', cells=None, faces=None,
     return flux_glob, bound_flux_glob, active_faces
 
 
+def mpfa_ensemble(g, perms, bnd, eta=None, inverter=None, apertures=None,
+                  num_proc=1):
+    """
+    Discretize the scalar elliptic equation by the MPFA method for an
+    ensemble of permeability fields on the same grid.
+
+    The parts of the discretization that depend only on the grid and the
+    boundary conditions (subcell topology, pressure continuity conditions,
+    exclusion of boundary equations, block structure of the local systems)
+    are computed once, and reused for all permeability fields. The intended
+    usage is Monte Carlo type studies, where the same grid is discretized
+    with many realizations of the permeability.
+
+    Parameters:
+        g (core.grids.grid): grid to be discretized
+        perms (list of core.constit.second_order_tensor): Permeability
+            realizations.
+        bnd (core.bc.bc) class for boundary values
+        eta, inverter, apertures: See mpfa().
+        num_proc (int, optional): Number of processes used to discretize the
+            realizations. Defaults to 1, in which case the realizations are
+            discretized in serial.
+
+    Returns:
+        list of scipy.sparse.csr_matrix: flux discretization, one per
+            realization. The matrices share their sparsity pattern.
+        list of scipy.sparse.csr_matrix: boundary flux discretization, one per
+            realization, with a shared sparsity pattern.
+
+    Example:
+        g = structured.CartGrid([5, 5])
+        g.compute_geometry()
+        bnd = bc.BoundaryCondition(g)
+        perms = [tensor.SecondOrder(g.dim, np.exp(np.random.randn(25)))
+                 for _ in range(100)]
+        fluxes, bound_fluxes = mpfa_ensemble(g, perms, bnd)
+
+    """
+    if eta is None:
+        eta = fvutils.determine_eta(g)
+
+    if g.dim < 2:
+        # No expensive geometry computations to reuse
+        discr = [_mpfa_local(g, k, bnd, eta=eta, inverter=inverter,
+                             apertures=apertures) for k in perms]
+    else:
+        geometry = _MpfaGeometry(g, bnd, eta, apertures)
+        if num_proc > 1 and len(perms) > 1:
+            pool = multiprocessing.Pool(min(num_proc, len(perms)),
+                                        initializer=_init_ensemble_worker,
+                                        initargs=(geometry, inverter))
+            try:
+                discr = pool.map(_ensemble_worker, perms)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            discr = [geometry.discretize(k, inverter) for k in perms]
+
+    if g.dim == 0:
+        return [d[0] for d in discr], [d[1] for d in discr]
+
+    flux = _common_sparsity_pattern([d[0] for d in discr])
+    bound_flux = _common_sparsity_pattern([d[1] for d in discr])
+    return flux, bound_flux
+
+
 def _mpfa_local(g, k, bnd, eta=None, inverter='numba', apertures=None):
     """
     Actual implementation of the MPFA O-method. To calculate MPFA on a grid
@@ -464,129 +597,182 @@ def _mpfa_local(g, k, bnd, eta=None, inverter='numba', apertures=None):
     elif g.dim == 0:
         return sps.csr_matrix([0]), 0
 
-    # The grid coordinates are always three-dimensional, even if the grid is
-    # really 2D. This means that there is not a 1-1 relation between the number
-    # of coordinates of a point / vector and the real dimension. This again
-    # violates some assumptions tacitly made in the discretization (in
-    # particular that the number of faces of a cell that meets in a vertex
-    # equals the grid dimension, and that this can be used to construct an
-    # index of local variables in the discretization). These issues should be
-    # possible to overcome, but for the moment, we simply force 2D grids to be
-    # proper 2D.
-
-    if g.dim == 2:
-        # Rotate the grid into the xy plane and delete third dimension. First
-        # make a copy to avoid alterations to the input grid
-        g = g.copy()
-        cell_centers, face_normals, face_centers, R, _, nodes = cg.map_grid(
-            g)
-        g.cell_centers = cell_centers
-        g.face_normals = face_normals
-        g.face_centers = face_centers
-        g.nodes = nodes
-
-        # Rotate the permeability tensor and delete last dimension
-        k = k.copy()
-        k.perm = np.tensordot(R.T, np.tensordot(R, k.perm, (1, 0)), (0, 1))
-        k.perm = np.delete(k.perm, (2), axis=0)
-        k.perm = np.delete(k.perm, (2), axis=1)
-
-    # Define subcell topology, that is, the local numbering of faces, subfaces,
-    # sub-cells and nodes. This numbering is used throughout the
-    # discretization.
-    subcell_topology = fvutils.SubcellTopology(g)
-
-    # Obtain normal_vector * k, pairings of cells and nodes (which together
-    # uniquely define sub-cells, and thus index for gradients.
-    nk_grad, cell_node_blocks, \
-        sub_cell_index = _tensor_vector_prod(g, k, subcell_topology, apertures)
-
-    # Distance from cell centers to face centers, this will be the
-    # contribution from gradient unknown to equations for pressure continuity
-    pr_cont_grad = fvutils.compute_dist_face_cell(g, subcell_topology, eta)
-
-    # Darcy's law
-    darcy = -nk_grad[subcell_topology.unique_subfno]
-
-    # Pair fluxes over subfaces, that is, enforce conservation
-    nk_grad = subcell_topology.pair_over_subfaces(nk_grad)
-
-    # Contribution from cell center potentials to local systems
-    # For pressure continuity, +-1 (Depending on whether the cell is on the
-    # positive or negative side of the face.
-    # The .A suffix is necessary to get a numpy array, instead of a scipy
-    # matrix.
-    sgn = g.cell_faces[subcell_topology.fno, subcell_topology.cno].A
-    pr_cont_cell = sps.coo_matrix((sgn[0], (subcell_topology.subfno,
-                                            subcell_topology.cno))).tocsr()
-    # The cell centers give zero contribution to flux continuity
-    nk_cell = sps.coo_matrix((np.zeros(1), (np.zeros(1), np.zeros(1))),
-                             shape=(subcell_topology.num_subfno,
-                                    subcell_topology.num_cno)).tocsr()
-    del sgn
-
-    # Mapping from sub-faces to faces
-    hf2f = sps.coo_matrix((np.ones(subcell_topology.unique_subfno.size),
-                           (subcell_topology.fno_unique,
-                            subcell_topology.subfno_unique)))
-
-    # Update signs
-    sgn_unique = g.cell_faces[subcell_topology.fno_unique,
-                              subcell_topology.cno_unique].A.ravel('F')
-
-    # The boundary faces will have either a Dirichlet or Neumann condition, but
-    # not both (Robin is not implemented).
-    # Obtain mappings to exclude boundary faces.
-    bound_exclusion = fvutils.ExcludeBoundaries(subcell_topology, bnd, g.dim)
-
-    # No flux conditions for Dirichlet boundary faces
-    nk_grad = bound_exclusion.exclude_dirichlet(nk_grad)
-    nk_cell = bound_exclusion.exclude_dirichlet(nk_cell)
-    # No pressure condition for Neumann boundary faces
-    pr_cont_grad = bound_exclusion.exclude_neumann(pr_cont_grad)
-    pr_cont_cell = bound_exclusion.exclude_neumann(pr_cont_cell)
-
-    # So far, the local numbering has been based on the numbering scheme
-    # implemented in SubcellTopology (which treats one cell at a time). For
-    # efficient inversion (below), it is desirable to get the system over to a
-    # block-diagonal structure, with one block centered around each vertex.
-    # Obtain the necessary mappings.
-    rows2blk_diag, cols2blk_diag, size_of_blocks = _block_diagonal_structure(
-        sub_cell_index, cell_node_blocks, subcell_topology.nno_unique,
-        bound_exclusion)
-
-    del cell_node_blocks, sub_cell_index
-
-    # System of equations for the subcell gradient variables. On block diagonal
-    # form.
-    grad_eqs = sps.vstack([nk_grad, pr_cont_grad])
-
-    num_nk_cell = nk_cell.shape[0]
-    num_pr_cont_grad = pr_cont_grad.shape[0]
-    del nk_grad, pr_cont_grad
-
-    grad = rows2blk_diag * grad_eqs * cols2blk_diag
-
-    del grad_eqs
-    darcy_igrad = darcy * cols2blk_diag * fvutils.invert_diagonal_blocks(grad,
-                                                                         size_of_blocks,
-                                                                         method=inverter) \
-        * rows2blk_diag
-
-    del grad, cols2blk_diag, rows2blk_diag, darcy
-
-    flux = hf2f * darcy_igrad * (-sps.vstack([nk_cell, pr_cont_cell]))
-
-    del nk_cell, pr_cont_cell
-    ####
-    # Boundary conditions
-    rhs_bound = _create_bound_rhs(bnd, bound_exclusion,
-                                  subcell_topology, sgn_unique, g,
-                                  num_nk_cell, num_pr_cont_grad)
-    # Discretization of boundary values
-    bound_flux = hf2f * darcy_igrad * rhs_bound
+    geometry = _MpfaGeometry(g, bnd, eta, apertures)
+    return geometry.discretize(k, inverter)
 
-    return flux, bound_flux
+
+class _MpfaGeometry(object):
+    """
+    The parts of the MPFA discretization that depend on the grid and the
+    boundary conditions, but not on the permeability.
+
+    The discretization for a given permeability is computed by discretize().
+    The class is used to discretize several permeability fields on the same
+    grid (see mpfa_ensemble()) without repeating the computation of the
+    subcell topology, pressure continuity conditions, boundary exclusions
+    and block structure.
+
+    """
+
+    def __init__(self, g, bnd, eta, apertures=None):
+        # The grid coordinates are always three-dimensional, even if the grid
+        # is really 2D. This means that there is not a 1-1 relation between the
+        # number of coordinates of a point / vector and the real dimension.
+        # This again violates some assumptions tacitly made in the
+        # discretization (in particular that the number of faces of a cell
+        # that meets in a vertex equals the grid dimension, and that this can
+        # be used to construct an index of local variables in the
+        # discretization). These issues should be possible to overcome, but
+        # for the moment, we simply force 2D grids to be proper 2D.
+        if g.dim == 2:
+            # Rotate the grid into the xy plane and delete third dimension.
+            # First make a copy to avoid alterations to the input grid
+            g = g.copy()
+            cell_centers, face_normals, face_centers, R, _, nodes = \
+                cg.map_grid(g)
+            g.cell_centers = cell_centers
+            g.face_normals = face_normals
+            g.face_centers = face_centers
+            g.nodes = nodes
+            # The permeability tensors must be rotated accordingly
+            self.R = R
+        else:
+            self.R = None
+        self.g = g
+
+        # Define subcell topology, that is, the local numbering of faces,
+        # subfaces, sub-cells and nodes. This numbering is used throughout the
+        # discretization.
+        subcell_topology = fvutils.SubcellTopology(g)
+        self.subcell_topology = subcell_topology
+
+        # Normal vectors, and the sparsity pattern of the permeability, on
+        # sub-cell level. Pairings of cells and nodes (which together uniquely
+        # define sub-cells, and thus index for gradients.
+        self.normals_mat, self.perm_pattern, cell_node_blocks, \
+            sub_cell_index = _normal_vector_structure(g, subcell_topology,
+                                                      apertures)
+        self.cell_node_blocks = cell_node_blocks
+
+        # Distance from cell centers to face centers, this will be the
+        # contribution from gradient unknown to equations for pressure
+        # continuity
+        pr_cont_grad = fvutils.compute_dist_face_cell(g, subcell_topology,
+                                                      eta)
+
+        # Contribution from cell center potentials to local systems
+        # For pressure continuity, +-1 (Depending on whether the cell is on the
+        # positive or negative side of the face.
+        # The .A suffix is necessary to get a numpy array, instead of a scipy
+        # matrix.
+        sgn = g.cell_faces[subcell_topology.fno, subcell_topology.cno].A
+        pr_cont_cell = sps.coo_matrix((sgn[0], (subcell_topology.subfno,
+                                                subcell_topology.cno))).tocsr()
+        # The cell centers give zero contribution to flux continuity
+        nk_cell = sps.coo_matrix((np.zeros(1), (np.zeros(1), np.zeros(1))),
+                                 shape=(subcell_topology.num_subfno,
+                                        subcell_topology.num_cno)).tocsr()
+        del sgn
+
+        # Mapping from sub-faces to faces
+        self.hf2f = sps.coo_matrix((np.ones(subcell_topology.unique_subfno.size),
+                                    (subcell_topology.fno_unique,
+                                     subcell_topology.subfno_unique)))
+
+        # Update signs
+        sgn_unique = g.cell_faces[subcell_topology.fno_unique,
+                                  subcell_topology.cno_unique].A.ravel('F')
+
+        # The boundary faces will have either a Dirichlet or Neumann condition,
+        # but not both (Robin is not implemented).
+        # Obtain mappings to exclude boundary faces.
+        bound_exclusion = fvutils.ExcludeBoundaries(subcell_topology, bnd,
+                                                    g.dim)
+        self.bound_exclusion = bound_exclusion
+
+        # No flux conditions for Dirichlet boundary faces
+        nk_cell = bound_exclusion.exclude_dirichlet(nk_cell)
+        # No pressure condition for Neumann boundary faces
+        self.pr_cont_grad = bound_exclusion.exclude_neumann(pr_cont_grad)
+        pr_cont_cell = bound_exclusion.exclude_neumann(pr_cont_cell)
+
+        # So far, the local numbering has been based on the numbering scheme
+        # implemented in SubcellTopology (which treats one cell at a time). For
+        # efficient inversion (below), it is desirable to get the system over
+        # to a block-diagonal structure, with one block centered around each
+        # vertex. Obtain the necessary mappings.
+        self.rows2blk_diag, self.cols2blk_diag, self.size_of_blocks = \
+            _block_diagonal_structure(sub_cell_index, cell_node_blocks,
+                                      subcell_topology.nno_unique,
+                                      bound_exclusion)
+
+        # Right hand side for the cell center potentials
+        self.rhs_cells = -sps.vstack([nk_cell, pr_cont_cell])
+
+        # Boundary conditions
+        self.rhs_bound = _create_bound_rhs(bnd, bound_exclusion,
+                                           subcell_topology, sgn_unique, g,
+                                           nk_cell.shape[0],
+                                           self.pr_cont_grad.shape[0])
+
+    def discretize(self, k, inverter=None):
+        """ Discretize for a given permeability.
+
+        Parameters:
+            k (SecondOrder): Permeability tensor, defined on the grid used
+                to construct this object.
+            inverter (str, optional): Block inverter, see
+                fvutils.invert_diagonal_blocks().
+
+        Returns:
+            scipy.sparse.csr_matrix: flux discretization, see mpfa().
+            scipy.sparse.csr_matrix: boundary flux discretization, see mpfa().
+
+        """
+        subcell_topology = self.subcell_topology
+        perm = k.perm
+        if self.R is not None:
+            # Rotate the permeability tensor and delete last dimension
+            R = self.R
+            perm = np.tensordot(R.T, np.tensordot(R, perm, (1, 0)), (0, 1))
+            perm = np.delete(perm, (2), axis=0)
+            perm = np.delete(perm, (2), axis=1)
+
+        # Obtain normal_vector * k
+        k_mat = sps.csr_matrix((perm[::, ::, self.cell_node_blocks[0]]
+                                .ravel('F'),) + self.perm_pattern)
+        nk_grad = self.normals_mat * k_mat
+
+        # Darcy's law
+        darcy = -nk_grad[subcell_topology.unique_subfno]
+
+        # Pair fluxes over subfaces, that is, enforce conservation
+        nk_grad = subcell_topology.pair_over_subfaces(nk_grad)
+
+        # No flux conditions for Dirichlet boundary faces
+        nk_grad = self.bound_exclusion.exclude_dirichlet(nk_grad)
+
+        # System of equations for the subcell gradient variables. On block
+        # diagonal form.
+        grad_eqs = sps.vstack([nk_grad, self.pr_cont_grad])
+        del nk_grad
+
+        grad = self.rows2blk_diag * grad_eqs * self.cols2blk_diag
+
+        del grad_eqs
+        darcy_igrad = darcy * self.cols2blk_diag \
+            * fvutils.invert_diagonal_blocks(grad, self.size_of_blocks,
+                                             method=inverter) \
+            * self.rows2blk_diag
+
+        del grad, darcy
+
+        flux = self.hf2f * darcy_igrad * self.rhs_cells
+
+        # Discretization of boundary values
+        bound_flux = self.hf2f * darcy_igrad * self.rhs_bound
+
+        return flux, bound_flux
 
 
 #----------------------------------------------------------------------------#
@@ -597,6 +783,112 @@ def _mpfa_local(g, k, bnd, eta=None, inverter='numba', apertures=None):
 #
 #----------------------------------------------------------------------------#
 
+# Discretization data shared by the worker processes in a partitioned mpfa.
+# Assigned by _init_partition_worker() on startup of each worker.
+_partition_data = None
+
+
+def _init_partition_worker(*discr_data):
+    global _partition_data
+    _partition_data = discr_data
+
+
+def _partition_worker(nodes):
+    return _mpfa_partition(*(_partition_data + (nodes,)))
+
+
+# Geometry data and block inverter shared by the worker processes in an
+# ensemble discretization. Assigned by _init_ensemble_worker().
+_ensemble_data = None
+
+
+def _init_ensemble_worker(geometry, inverter):
+    global _ensemble_data
+    _ensemble_data = (geometry, inverter)
+
+
+def _ensemble_worker(k):
+    geometry, inverter = _ensemble_data
+    return geometry.discretize(k, inverter)
+
+
+def _common_sparsity_pattern(mats):
+    """
+    Represent a list of sparse matrices of equal shape as csr matrices with a
+    common sparsity pattern (the union of the patterns of the matrices).
+    """
+    mats = [sps.coo_matrix(m) for m in mats]
+    rows = np.hstack([m.row for m in mats])
+    cols = np.hstack([m.col for m in mats])
+    pattern = sparse_mat.CsrPattern(rows, cols, mats[0].shape)
+
+    # Scatter the values of each matrix into the common pattern
+    starts = np.hstack((0, np.cumsum([m.nnz for m in mats])))
+    common = []
+    for i, m in enumerate(mats):
+        pos = pattern.position[starts[i]:starts[i + 1]]
+        vals = np.bincount(pos, weights=m.data,
+                           minlength=pattern.indices.size)
+        common.append(sps.csr_matrix((vals, pattern.indices, pattern.indptr),
+                                     shape=pattern.shape))
+    return common
+
+
+def _mpfa_partition(g, k, bnd, eta, inverter, apertures, nodes):
+    """
+    Discretize on the stencil of a set of nodes, and return the result as
+    COO triplets restricted to the active faces.
+
+    Returns:
+        tuple: row, column and data of flux discretization.
+        tuple: row, column and data of boundary flux discretization.
+        np.ndarray (int): Active faces of the stencil.
+
+    """
+    loc_flux, loc_bound_flux, loc_faces \
+        = mpfa_partial(g, k, bnd, eta=eta, inverter=inverter, nodes=nodes,
+                       apertures=apertures)
+
+    def triplets(mat):
+        mat = mat.tocoo()
+        keep = np.in1d(mat.row, loc_faces)
+        return mat.row[keep], mat.col[keep], mat.data[keep]
+
+    return triplets(loc_flux), triplets(loc_bound_flux), loc_faces
+
+
+def _merge_partitions(g, loc_discr):
+    """
+    Assemble flux and boundary flux discretizations from the output of
+    _mpfa_partition() for a set of partitions.
+
+    Faces shared by several partitions are taken from the first partition
+    that covers them, so the result depends only on the ordering of the
+    partitions.
+    """
+    face_covered = np.zeros(g.num_faces, dtype=np.bool)
+
+    flux_ijv = []
+    bound_ijv = []
+    for loc_flux, loc_bound_flux, loc_faces in loc_discr:
+        for ijv, loc in zip((flux_ijv, bound_ijv),
+                            (loc_flux, loc_bound_flux)):
+            # Eliminate contribution from faces already covered
+            keep = np.logical_not(face_covered[loc[0]])
+            ijv.append([v[keep] for v in loc])
+        face_covered[loc_faces] = 1
+
+    def assemble(ijv, shape):
+        if len(ijv) == 0:
+            return sps.csr_matrix(shape)
+        rows, cols, vals = [np.hstack(v) for v in zip(*ijv)]
+        return sps.coo_matrix((vals, (rows, cols)), shape=shape).tocsr()
+
+    flux = assemble(flux_ijv, (g.num_faces, g.num_cells))
+    bound_flux = assemble(bound_ijv, (g.num_faces, g.num_faces))
+    return flux, bound_flux
+
+
 def _estimate_peak_memory(g):
     """
     Rough estimate of peak memory need
@@ -631,14 +923,16 @@ def _estimate_peak_memory(g):
     return total_size
 
 
-def _tensor_vector_prod(g, k, subcell_topology, apertures=None):
+def _normal_vector_structure(g, subcell_topology, apertures=None):
     """
-    Compute product of normal vectors and tensors on a sub-cell level.
+    Compute normal vectors on a sub-cell level, and the sparsity pattern of
+    the cell-wise permeability tensors on the same level. The product of the
+    two defines Darcy's law for each sub-face in terms of sub-cell gradients.
+    Thus, we also implicitly define the global ordering of sub-cell gradient
+    variables (via the interpretation of the columns in the matrices).
 
-    This is essentially defining Darcy's law for each sub-face in terms of
-    sub-cell gradients. Thus, we also implicitly define the global ordering
-    of sub-cell gradient variables (via the interpretation of the columns in
-    nk).
+    The permeability is not needed here, so that the structure can be reused
+    for several permeability fields, see _MpfaGeometry.
 
     NOTE: In the local numbering below, in particular in the variables i and j,
     it is tacitly assumed that g.dim == g.nodes.shape[0] ==
@@ -646,12 +940,16 @@ def _tensor_vector_prod(g, k, subcell_topology, apertures=None):
 
     Parameters:
         g (core.grids.grid): Discretization grid
-        k (core.constit.second_order_tensor): The permeability tensor
         subcell_topology (fvutils.SubcellTopology): Wrapper class containing
             subcell numbering.
+        apertures (np.ndarray, optional): Cell apertures, used to scale the
+            normal vectors.
 
     Returns:
-        nk: sub-face wise product of normal vector and permeability tensor.
+        normals_mat: sub-face wise normal vectors, as a sparse matrix.
+        perm_pattern: column indices and index pointers of a csr matrix for
+            the permeability tensor of the sub-cells. The values are given by
+            perm[::, ::, cell_node_blocks[0]].ravel('F').
         cell_node_blocks pairings of node and cell indices, which together
             define a sub-cell.
         sub_cell_ind: index of all subcells
@@ -688,18 +986,16 @@ def _tensor_vector_prod(g, k, subcell_topology, apertures=None):
     if apertures is not None:
         normals = normals * apertures[subcell_topology.cno]
 
-    # Represent normals and permeability on matrix form
+    # Represent normals on matrix form. The permeability has the same
+    # sparsity pattern.
     ind_ptr = np.hstack((np.arange(0, j.size, nd), j.size))
     normals_mat = sps.csr_matrix((normals.ravel('F'), j.ravel('F'), ind_ptr))
-    k_mat = sps.csr_matrix((k.perm[::, ::, cell_node_blocks[0]].ravel('F'),
-                            j.ravel('F'), ind_ptr))
-
-    nk = normals_mat * k_mat
+    perm_pattern = (j.ravel('F'), ind_ptr)
 
     # Unique sub-cell indexes are pulled from column indices, we only need
     # every nd column (since nd faces of the cell meet at each vertex)
     sub_cell_ind = j[::, 0::nd]
-    return nk, cell_node_blocks, sub_cell_ind
+    return normals_mat, perm_pattern, cell_node_blocks, sub_cell_ind
 
 
 def _block_diagonal_structure(sub_cell_index, cell_node_blocks, nno,
@@ -8,10 +8,11 @@ equations tend to become slightly more complex thus, it may be useful to confer
 that module as well.
 
 """
+import warnings
 import numpy as np
 import scipy.sparse as sps
 
-from porepy.numerics.fv import fvutils
+from porepy.numerics.fv import fvutils, discretization_cache
 from porepy.utils import matrix_compression, mcolon
 from porepy.grids import structured, partition
 from porepy.params import tensor, bc
@@ -99,6 +100,15 @@ class Mpsa(Solver):
                 conditions, respectively.
             apertures : (np.ndarray) (optional) apertures of the cells for scaling of
                 the face normals.
+        discretization_cache : DiscretizationCache (optional)
+            If given, the discretization is loaded from the cache if
+            available, and stored in the cache otherwise. See
+            fv.discretization_cache for details.
+        partial_update : boolean (optional)
+            If True, the parameters are stored in data['mpsa_state'], and on
+            the next call, only the stencils of cells where the stiffness has
+            changed, and of faces where the type of boundary condition has
+            changed, are recomputed, see mpsa_partial(). Defaults to False.
 
         Parameters
         ----------
@@ -109,10 +119,54 @@ class Mpsa(Solver):
         c = data['param'].get_tensor(self)
         bnd = data['param'].get_bc(self)
 
-        stress, bound_stress = mpsa(g, c, bnd)
-
-        data['stress'] = stress
-        data['bound_stress'] = bound_stress
+        partial_update = data.get('partial_update', False)
+        if partial_update and 'mpsa_state' in data:
+            cells, faces = data['mpsa_state'].changes(g, c, bnd)
+            # If the grid has changed, we need a full discretization
+            if cells is not None:
+                if cells.size > 0 or faces.size > 0:
+                    self._update_partial(g, data, c, bnd, cells, faces)
+                data['mpsa_state'] = fvutils.DiscretizationState(g, c, bnd)
+                return
+
+        cache, key, cached = discretization_cache.cached_discretization(
+            data, 'mpsa', g, c, bnd)
+        if cached is not None:
+            data.update(cached)
+        else:
+            stress, bound_stress = mpsa(g, c, bnd)
+            if cache is not None:
+                cache.store(key, {'stress': stress,
+                                  'bound_stress': bound_stress})
+            data['stress'] = stress
+            data['bound_stress'] = bound_stress
+
+        if partial_update:
+            data['mpsa_state'] = fvutils.DiscretizationState(g, c, bnd)
+
+    def _update_partial(self, g, data, c, bnd, cells, faces):
+        """ Recompute the discretization on the stencils of the given cells
+        and faces, and replace the corresponding rows of the discretization
+        stored in data.
+        """
+        if cells.size == 0:
+            cells = None
+        if faces.size == 0:
+            faces = None
+        with warnings.catch_warnings():
+            # Partial updates based on cells and faces are not covered by the
+            # tests of mpsa_partial, thus it warns. Do not repeat this for
+            # every update. Other warnings are kept.
+            warnings.filterwarnings('ignore', message='(Cells|Faces) keyword '
+                                    'for partial mpfa has not been tested')
+            stress, bound_stress, active_faces = mpsa_partial(
+                g, c, bnd, eta=fvutils.determine_eta(g), inverter=None,
+                cells=cells, faces=faces)
+
+        rows = fvutils.expand_indices_nd(active_faces, g.dim)
+        data['stress'] = fvutils.replace_rows(data['stress'], stress, rows)
+        data['bound_stress'] = fvutils.replace_rows(data['bound_stress'],
+                                                    bound_stress, rows)
 
 #------------------------------------------------------------------------------#
 
@@ -15,7 +15,7 @@ from porepy.numerics.mixed_dim.solver import Solver, SolverMixedDim
 from porepy.numerics.mixed_dim.coupler import Coupler
 from porepy.numerics.mixed_dim.abstract_coupling import AbstractCoupling
 
-from porepy.numerics.fv import fvutils
+from porepy.numerics.fv import fvutils, discretization_cache
 from porepy.grids.grid import Grid
 
 #------------------------------------------------------------------------------
@@ -169,6 +169,11 @@ class Tpfa(Solver):
             folk.uib.no/fciia/elliptisk.pdf. Activated by adding the entry
             Aavatsmark_transmissibilities: True   to the data dictionary.
 
+        The discretization can be stored in an on-disk cache, activated by
+        adding a DiscretizationCache object with the keyword
+        discretization_cache to the data dictionary. See
+        fv.discretization_cache for details.
+
         Parameters
         ----------
         g : grid, or a subclass, with geometry fields computed.
@@ -183,6 +188,14 @@ class Tpfa(Solver):
             data['flux'] = sps.csr_matrix([0])
             data['bound_flux'] = 0
             return None
+
+        cache, key, cached = discretization_cache.cached_discretization(
+            data, 'tpfa', g, k, bnd, aperture, faces,
+            data.get('Aavatsmark_transmissibilities', False))
+        if cached is not None:
+            data.update(cached)
+            return None
+
         if faces is None:
             is_not_active = np.zeros(g.num_faces, dtype=np.bool)
         else:
@@ -242,6 +255,8 @@ class Tpfa(Solver):
         bound_flux = sps.coo_matrix((t_b * bndr_sgn, (bndr_ind, bndr_ind)),
                                     (g.num_faces, g.num_faces))
 
+        if cache is not None:
+            cache.store(key, {'flux': flux, 'bound_flux': bound_flux})
         data['flux'] = flux
         data['bound_flux'] = bound_flux
 
@@ -7,14 +7,22 @@ Created on Thu Nov  2 19:08:28 2017
 
 @author: Eirik Keilegavlen
 """
+from __future__ import division
 import numpy as np
+import scipy.sparse as sps
 import scipy.sparse.linalg as spl
 import logging
+import time
+
+from porepy.utils import sparse_mat
 
 try:
     import pyamg
+    from pyamg.multilevel import coarse_grid_solver
+    from pyamg.relaxation.smoothing import change_smoothers
 except ImportError:
     " Could not import the pyamg package. pyamg solver will not be available."
+    pyamg = None
 logger = logging.getLogger(__name__)
 
 
@@ -32,6 +40,679 @@ class IterCounter(object):
         if self._disp:
             logger.info('iter %3i\trk = %s' % (self.niter, str(rk)))
 
+
+# Arguments to scipy.sparse.linalg.gmres that are not known to older versions
+# of scipy, see relative_gmres(). Arguments found to be unsupported are
+# removed.
+_gmres_options = {'atol': 0, 'callback_type': 'pr_norm'}
+
+
+def relative_gmres(A, b, **kwargs):
+    """ Wrapper around gmres from scipy.sparse.linalg, with a purely relative
+    tolerance (atol=0), and the callback invoked with the relative
+    preconditioned residual norm in each inner iteration
+    (callback_type='pr_norm'). maxiter then counts restart cycles.
+
+    Older versions of scipy do not accept the atol and callback_type
+    arguments. They are then left out; the tolerance is relative also in
+    these versions, and the callback is given the same residual norms, but
+    maxiter counts inner iterations.
+
+    Parameters:
+        A, b: Matrix (or LinearOperator) and right hand side.
+        **kwargs: Passed on to gmres, e.g. x0, M, tol, maxiter and callback.
+
+    Returns:
+        np.ndarray: Solution.
+        int: Convergence information from gmres.
+
+    """
+    opts = dict(_gmres_options)
+    opts.update(kwargs)
+    try:
+        return spl.gmres(A, b, **opts)
+    except TypeError as err:
+        unsupported = [key for key in list(_gmres_options) if key in str(err)
+                       and key not in kwargs]
+        if not unsupported:
+            raise
+        for key in unsupported:
+            del _gmres_options[key]
+        return relative_gmres(A, b, **kwargs)
+
+
+class DirectSolver(object):
+    """ Direct solver that factorizes its matrix once, at construction, and
+    reuses the factorization in all later solves.
+
+    The factorization is computed by SuperLU (scipy.sparse.linalg.splu). If
+    no column ordering is specified, MMD_AT_PLUS_A is used for matrices with a
+    symmetric sparsity pattern (e.g. discretizations of elliptic equations),
+    and COLAMD otherwise.
+
+    A memory budget for the factors can be given. The matrix is then
+    factorized by the incomplete LU factorization of SuperLU
+    (scipy.sparse.linalg.spilu), without dropping of small entries, and with
+    the fill limited according to the budget. Thus the budget also bounds the
+    time and memory spent in the factorization. If the fill limit was
+    reached, the factors are incomplete; this is detected by a test solve.
+    The solves are then done by GMRES, preconditioned by the incomplete
+    factors, to the tolerance tol. The iteration counts are recorded.
+
+    Attributes:
+        shape (tuple): Shape of the factorized matrix.
+        permc_spec (str): Column ordering used in the factorization.
+        is_exact (boolean): False if the factorization is incomplete, and
+            solves are done by preconditioned GMRES.
+        tol (double): Relative residual tolerance of GMRES, used if the
+            factorization is incomplete.
+        iterations (list of int): Number of GMRES iterations, one per solve,
+            if the factorization is incomplete.
+        factorization_time (double): Time spent on the factorization, in
+            seconds.
+        solve_time (double): Accumulated time spent in solves, in seconds.
+        num_solves (int): Number of solves.
+        nnz (int): Number of nonzeros in the factors L and U.
+        fill_factor (double): Ratio between nonzeros in the factors and in
+            the matrix.
+        memory (int): Estimated memory usage of the factors, in bytes.
+
+    """
+
+    def __init__(self, A, permc_spec=None, max_memory=None, tol=1e-10,
+                 **kwargs):
+        """
+        Parameters:
+            A (Matrix): Matrix to be factorized.
+            permc_spec (str, optional): Column ordering, see
+                scipy.sparse.linalg.splu. Defaults to a choice based on the
+                sparsity pattern of A, see class documentation.
+            max_memory (int, optional): Memory budget for the factors, in
+                bytes. Defaults to no limit.
+            tol (double, optional): Relative residual tolerance of GMRES, if
+                the factorization is incomplete. Defaults to 1e-10.
+            **kwargs: Further parameters passed on to splu (or spilu if a
+                memory budget is given).
+
+        """
+        A = sps.csc_matrix(A)
+        A.sum_duplicates()
+        if permc_spec is None:
+            permc_spec = _default_ordering(A)
+        self.shape = A.shape
+        self.permc_spec = permc_spec
+        self.max_memory = max_memory
+        self.tol = tol
+        self.solve_time = 0
+        self.num_solves = 0
+        self.iterations = []
+        # The matrix is kept only for the GMRES iterations
+        self._A = None
+
+        tic = time.time()
+        opts = dict(kwargs)
+        opts['permc_spec'] = permc_spec
+        if max_memory is None:
+            self._lu = spl.splu(A, **opts)
+            self.is_exact = True
+        else:
+            # Limit the fill of the factorization so that the factors fit
+            # within the budget. No entries are dropped by size, thus the
+            # factors are complete if the limit is not reached.
+            bytes_per_nnz = A.data.itemsize + A.indices.itemsize
+            opts['fill_factor'] = max(1., max_memory /
+                                      (bytes_per_nnz * max(A.nnz, 1)))
+            opts['drop_tol'] = 0
+            self._lu = spl.spilu(A, **opts)
+            self.is_exact = self._solves_exactly(A)
+            if not self.is_exact:
+                self._A = A
+                logger.warning('LU factorization exceeded memory budget, '
+                               'solve by GMRES preconditioned by incomplete '
+                               'LU instead')
+        self.factorization_time = time.time() - tic
+
+        self.nnz = self._lu.L.nnz + self._lu.U.nnz
+        self.fill_factor = self.nnz / max(A.nnz, 1)
+        self.memory = self._memory(self._lu)
+        logger.debug('Factorized matrix of size ' + str(A.shape[0]) +
+                     ' in ' + str(self.factorization_time) + ' seconds. '
+                     'Fill factor ' + str(self.fill_factor))
+
+    def solve(self, b):
+        """ Solve the system for a right hand side.
+
+        Parameters:
+            b (np.ndarray): Right hand side, or a block of right hand sides
+                (one per column).
+
+        Returns:
+            np.ndarray: Solution, same shape as b.
+
+        """
+        if self.is_exact:
+            return self._apply(b)
+        tic = time.time()
+        b = np.asarray(b)
+        if b.ndim > 1:
+            x = np.column_stack([self._gmres(b[:, i])
+                                 for i in range(b.shape[1])])
+        else:
+            x = self._gmres(b)
+        self.solve_time += time.time() - tic
+        self.num_solves += 1
+        return x
+
+    def __call__(self, b):
+        return self.solve(b)
+
+    def as_linear_operator(self):
+        """ Wrap the factorization as a LinearOperator, e.g. for use as a
+        preconditioner. If the factorization is incomplete, the operator
+        applies the incomplete factors, without GMRES iterations.
+        """
+        return spl.LinearOperator(self.shape, self._apply)
+
+    def _apply(self, b):
+        tic = time.time()
+        x = self._lu.solve(b)
+        self.solve_time += time.time() - tic
+        self.num_solves += 1
+        return x
+
+    def _gmres(self, b):
+        M = spl.LinearOperator(self.shape, self._lu.solve)
+        counter = IterCounter(disp=False)
+        x, info = relative_gmres(self._A, b, M=M, tol=self.tol,
+                                 callback=counter)
+        self.iterations.append(counter.niter)
+        if info != 0:
+            logger.error('GMRES preconditioned by incomplete LU failed with '
+                         'status ' + str(info))
+        return x
+
+    def _solves_exactly(self, A):
+        # Test solve with a random solution. A complete factorization gives a
+        # residual at the level of the machine precision, an incomplete one
+        # (as a rule) a much larger residual.
+        x = np.random.RandomState(0).rand(A.shape[0]).astype(A.dtype)
+        b = A * x
+        r = b - A * self._lu.solve(b)
+        tol = np.sqrt(np.finfo(A.dtype).eps)
+        return np.linalg.norm(r) <= tol * np.linalg.norm(b)
+
+    def statistics(self):
+        """ Timing and fill information of the solver.
+
+        Returns:
+            dictionary: With keys factorization_time, solve_time, num_solves,
+                nnz, fill_factor, memory, is_exact, iterations and
+                permc_spec.
+
+        """
+        return {'factorization_time': self.factorization_time,
+                'solve_time': self.solve_time,
+                'num_solves': self.num_solves,
+                'nnz': self.nnz,
+                'fill_factor': self.fill_factor,
+                'memory': self.memory,
+                'is_exact': self.is_exact,
+                'iterations': self.iterations,
+                'permc_spec': self.permc_spec}
+
+    def _memory(self, lu):
+        m = 0
+        for f in [lu.L, lu.U]:
+            m += f.data.nbytes + f.indices.nbytes + f.indptr.nbytes
+        return m + lu.perm_r.nbytes + lu.perm_c.nbytes
+
+
+class MixedPrecisionSolver(object):
+    """ Direct solver with a single precision factorization, and double
+    precision accuracy recovered by iterative refinement.
+
+    A float32 copy of the matrix is factorized (see DirectSolver), which
+    roughly halves the memory of the factors, and speeds up the forward and
+    backward substitutions. Solutions are computed in double precision by
+    one of the methods:
+        refinement: Classical iterative refinement. Residuals are computed in
+            double precision, corrections by the single precision factors.
+        gmres: GMRES, preconditioned by the single precision factors
+            (GMRES-IR). More robust for ill-conditioned matrices.
+
+    If the iterations do not converge, or stagnate, the system is solved by a
+    double precision factorization instead (if fallback is True). The double
+    precision factorization is computed on first need, and kept for later
+    solves. A matrix with values outside the range of float32 is factorized
+    in double precision directly.
+
+    Attributes:
+        shape (tuple): Shape of the matrix.
+        method (str): 'refinement' or 'gmres'.
+        tol (double): Relative residual tolerance.
+        maxiter (int): Maximum number of iterations.
+        residuals (list of list of double): Relative residual norms of the
+            iterations, one list per solve.
+        iterations (list of int): Number of iterations, one per solve.
+        converged (list of boolean): Whether the iterations converged, one per
+            solve.
+        num_fallbacks (int): Number of solves done in double precision.
+        factorization (DirectSolver): The single precision factorization, None
+            if the matrix could not be represented in float32.
+        fallback_factorization (DirectSolver): The double precision
+            factorization, if it has been computed.
+
+    """
+
+    def __init__(self, A, method='refinement', tol=1e-12, maxiter=20,
+                 fallback=True, **kwargs):
+        """
+        Parameters:
+            A (Matrix): Matrix to be factorized.
+            method (str, optional): 'refinement' or 'gmres'. Defaults to
+                'refinement'.
+            tol (double, optional): Relative residual tolerance. Defaults to
+                1e-12.
+            maxiter (int, optional): Maximum number of iterations. Defaults to
+                20.
+            fallback (boolean, optional): If True, fall back to a double
+                precision factorization if the iterations fail. Defaults to
+                True.
+            **kwargs: Passed on to DirectSolver, e.g. permc_spec.
+
+        Raises:
+            ValueError: If the method is unknown.
+
+        """
+        method = method.strip().lower()
+        if method not in ['refinement', 'gmres']:
+            raise ValueError('Unknown refinement method ' + method)
+        A = sps.csc_matrix(A, dtype=np.float64)
+        A.sum_duplicates()
+        self._A = A
+        self.shape = A.shape
+        self.method = method
+        self.tol = tol
+        self.maxiter = maxiter
+        self.fallback = fallback
+        self._kwargs = kwargs
+
+        self.residuals = []
+        self.iterations = []
+        self.converged = []
+        self.num_fallbacks = 0
+        self.fallback_factorization = None
+
+        A_single = A.astype(np.float32)
+        if np.all(np.isfinite(A_single.data)):
+            self.factorization = DirectSolver(A_single, **kwargs)
+        else:
+            logger.warning('Matrix values out of single precision range, '
+                           'factorize in double precision')
+            self.factorization = None
+            self.fallback_factorization = DirectSolver(A, **kwargs)
+
+    def solve(self, b):
+        """ Solve the system for a right hand side.
+
+        Parameters:
+            b (np.ndarray): Right hand side, or a block of right hand sides
+                (one per column).
+
+        Returns:
+            np.ndarray: Solution, same shape as b.
+
+        """
+        b = np.asarray(b, dtype=np.float64)
+        if b.ndim > 1:
+            return np.column_stack([self.solve(b[:, i])
+                                    for i in range(b.shape[1])])
+        if self.factorization is None:
+            return self.fallback_factorization(b)
+
+        norm_b = np.linalg.norm(b)
+        if norm_b == 0:
+            return np.zeros(self.shape[1])
+        res = []
+        if self.method == 'refinement':
+            x = self._refinement(b, norm_b, res)
+        else:
+            x = self._gmres(b, norm_b, res)
+        converged = len(res) > 0 and res[-1] < self.tol
+
+        self.residuals.append(res)
+        self.iterations.append(len(res))
+        self.converged.append(converged)
+        if not converged:
+            logger.warning('Mixed precision ' + self.method + ' did not '
+                           'converge, relative residual ' +
+                           str(res[-1] if len(res) > 0 else None))
+            if self.fallback:
+                x = self._double_solve(b)
+        return x
+
+    def __call__(self, b):
+        return self.solve(b)
+
+    def as_linear_operator(self):
+        """ Wrap the solver as a LinearOperator.
+        """
+        return spl.LinearOperator(self.shape, self.solve)
+
+    def statistics(self):
+        """ Convergence and factorization information.
+
+        Returns:
+            dictionary: With keys iterations, residuals, converged,
+                num_fallbacks, and the statistics of the single precision
+                factorization, see DirectSolver.statistics.
+
+        """
+        stats = {}
+        if self.factorization is not None:
+            stats.update(self.factorization.statistics())
+        stats.update({'iterations': self.iterations,
+                      'residuals': self.residuals,
+                      'converged': self.converged,
+                      'num_fallbacks': self.num_fallbacks})
+        return stats
+
+    def _precondition(self, r):
+        # Scale the residual to avoid underflow in single precision
+        norm_r = np.linalg.norm(r)
+        if norm_r == 0:
+            return np.zeros_like(r)
+        d = self.factorization((r / norm_r).astype(np.float32))
+        return d.astype(np.float64) * norm_r
+
+    def _refinement(self, b, norm_b, res):
+        x = np.zeros(self.shape[1])
+        r = b
+        for _ in range(self.maxiter):
+            x = x + self._precondition(r)
+            r = b - self._A * x
+            res.append(np.linalg.norm(r) / norm_b)
+            if res[-1] < self.tol:
+                break
+            # Stop if the refinement stagnates or diverges
+            if len(res) > 1 and res[-1] > 0.5 * res[-2]:
+                break
+        return x
+
+    def _gmres(self, b, norm_b, res):
+        M = spl.LinearOperator(self.shape, self._precondition)
+
+        # rk is the preconditioned residual norm, already relative to the
+        # right hand side.
+        def callback(rk):
+            res.append(float(rk))
+        x, _ = relative_gmres(self._A, b, M=M, tol=self.tol,
+                              maxiter=self.maxiter, callback=callback)
+        # The residual of the final iterate, in double precision
+        res.append(np.linalg.norm(b - self._A * x) / norm_b)
+        return x
+
+    def _double_solve(self, b):
+        if self.fallback_factorization is None:
+            logger.warning('Factorize in double precision')
+            self.fallback_factorization = DirectSolver(self._A,
+                                                       **self._kwargs)
+        self.num_fallbacks += 1
+        return self.fallback_factorization(b)
+
+
+def _default_ordering(A):
+    """ Column ordering for SuperLU, based on the sparsity pattern of A.
+    """
+    if A.shape[0] != A.shape[1]:
+        return 'COLAMD'
+    P = A.copy()
+    P.data = np.ones(P.data.size)
+    diff = P - P.T
+    diff.eliminate_zeros()
+    if diff.nnz == 0:
+        return 'MMD_AT_PLUS_A'
+    return 'COLAMD'
+
+
+class AmgSolver(object):
+    """ Smoothed aggregation amg solver (pyamg), with reuse of the multigrid
+    hierarchy for matrices that change little between calls, e.g. in time
+    stepping and nonlinear iterations.
+
+    Each call to setup() does one of the following:
+        reuse: The matrix is equal to the previous one, and the hierarchy is
+            kept as it is.
+        refresh: The sparsity pattern is unchanged, and the relative change
+            in the matrix values, measured in the Frobenius norm relative to
+            the matrix of the last full setup, is below rebuild_tol. The
+            aggregates and interpolation operators are kept, while the coarse
+            operators are recomputed as Galerkin products, and the smoothers
+            and coarse solver are set up anew.
+        rebuild: Otherwise, a new hierarchy is constructed.
+
+    Attributes:
+        rebuild_tol (double): Threshold for relative change in values that
+            triggers a rebuild.
+        setup_time (double): Accumulated time spent in setup, in seconds.
+        solve_time (double): Accumulated time spent in solves, in seconds.
+        num_builds, num_refreshes, num_reuses (int): Number of calls to
+            setup resulting in each of the three actions.
+        num_solves (int): Number of solves (or preconditioner applications).
+
+    """
+
+    def __init__(self, null_space=None, rebuild_tol=0.1,
+                 coarse_solver='pinv', **kwargs):
+        """
+        Parameters:
+            null_space (optional): Null space of the matrix, see
+                Factory.amg(). Defaults to a vector of ones.
+            rebuild_tol (double, optional): See class documentation. Defaults
+                to 0.1.
+            coarse_solver (optional): Coarse solver, see pyamg. Defaults to
+                'pinv'.
+            **kwargs: Passed on to pyamg.smoothed_aggregation_solver.
+
+        Raises:
+            ImportError: If pyamg is not installed.
+
+        """
+        if pyamg is None:
+            raise ImportError('The amg solver requires pyamg')
+        self.null_space = null_space
+        self.rebuild_tol = rebuild_tol
+        self.coarse_solver = coarse_solver
+        self._smoother = kwargs.pop('smoother',
+                                    ('gauss_seidel', {'sweep': 'symmetric'}))
+        self._kwargs = kwargs
+
+        self.ml = None
+        self._A = None
+        self._A_build = None
+
+        self.setup_time = 0
+        self.solve_time = 0
+        self.num_builds = 0
+        self.num_refreshes = 0
+        self.num_reuses = 0
+        self.num_solves = 0
+
+    def setup(self, A):
+        """ Set up the hierarchy for a matrix, reusing the previous hierarchy
+        if possible.
+
+        Parameters:
+            A (Matrix): Matrix to be solved.
+
+        Returns:
+            str: The action taken, one of 'reuse', 'refresh' and 'rebuild'.
+
+        """
+        tic = time.time()
+        A = sps.csr_matrix(A)
+        A.sum_duplicates()
+        A.sort_indices()
+
+        B = self._A_build
+        if B is None or A.shape != B.shape or \
+                not np.array_equal(A.indptr, B.indptr) or \
+                not np.array_equal(A.indices, B.indices):
+            action = 'rebuild'
+        elif np.array_equal(A.data, self._A.data):
+            action = 'reuse'
+        else:
+            change = np.linalg.norm(A.data - B.data) / \
+                max(np.linalg.norm(B.data), 1e-300)
+            action = 'refresh' if change < self.rebuild_tol else 'rebuild'
+
+        if action == 'rebuild':
+            null_space = self.null_space
+            if null_space is None:
+                null_space = np.ones(A.shape[0])
+            self.ml = pyamg.smoothed_aggregation_solver(
+                A, B=null_space, presmoother=self._smoother,
+                postsmoother=self._smoother, coarse_solver=self.coarse_solver,
+                **self._kwargs)
+            self._A_build = A
+            self.num_builds += 1
+        elif action == 'refresh':
+            self._refresh(A)
+            self.num_refreshes += 1
+        else:
+            self.num_reuses += 1
+        self._A = A
+
+        self.setup_time += time.time() - tic
+        logger.debug('amg setup: ' + action + ', elapsed time ' +
+                     str(time.time() - tic))
+        return action
+
+    def solve(self, b, res=None, **kwargs):
+        """ Solve with the current hierarchy, by GMRES accelerated V-cycles.
+
+        Parameters:
+            b (np.ndarray): Right hand side.
+            res (list, optional): If given, residuals are appended to the
+                list.
+            **kwargs: Passed on to the solve method of the pyamg hierarchy.
+
+        Returns:
+            np.ndarray: Solution.
+
+        """
+        tic = time.time()
+        if res is None:
+            x = self.ml.solve(b, accel='gmres', cycle='V', **kwargs)
+        else:
+            x = self.ml.solve(b, residuals=res, accel='gmres', cycle='V',
+                              **kwargs)
+        self._count_solve(tic)
+        return x
+
+    def precondition(self, x):
+        """ Apply the hierarchy as a preconditioner (W-cycles).
+        """
+        tic = time.time()
+        y = self.ml.solve(x, tol=1e-20, maxiter=10, cycle='W')
+        self._count_solve(tic)
+        return y
+
+    def as_linear_operator(self):
+        """ Wrap the preconditioner as a LinearOperator.
+        """
+        return spl.LinearOperator(self._A.shape, self.precondition)
+
+    def statistics(self):
+        """ Timing and setup information.
+
+        Returns:
+            dictionary: With keys setup_time, solve_time, num_builds,
+                num_refreshes, num_reuses and num_solves.
+
+        """
+        return {'setup_time': self.setup_time,
+                'solve_time': self.solve_time,
+                'num_builds': self.num_builds,
+                'num_refreshes': self.num_refreshes,
+                'num_reuses': self.num_reuses,
+                'num_solves': self.num_solves}
+
+    def _refresh(self, A):
+        # Recompute the coarse operators as Galerkin products, keeping the
+        # interpolation operators.
+        levels = self.ml.levels
+        levels[0].A = A
+        for i in range(len(levels) - 1):
+            levels[i + 1].A = sps.csr_matrix(levels[i].R * levels[i].A *
+                                             levels[i].P)
+        # The smoothers and the coarse solver store data computed from the
+        # operators, e.g. inverse diagonals and the coarse inverse.
+        change_smoothers(self.ml, self._smoother, self._smoother)
+        self.ml.coarse_solver = coarse_grid_solver(self.coarse_solver)
+
+    def _count_solve(self, tic):
+        self.solve_time += time.time() - tic
+        self.num_solves += 1
+
+
+class FactorizationCache(object):
+    """
+    Keep the LU factorization of a matrix, and reuse it as long as the matrix
+    is unchanged.
+
+    To detect changes, a copy of the factorized matrix (in csr format) is
+    kept, and compared with new matrices. The comparison is much cheaper than
+    a new factorization.
+
+    Attributes:
+        num_factorizations (int): Number of factorizations computed.
+
+    """
+
+    def __init__(self):
+        self._solve = None
+        self._mat = None
+        self.num_factorizations = 0
+
+    def solver(self, A, constant=False):
+        """ Get a solver for a matrix, factorize if necessary.
+
+        Parameters:
+            A (scipy.sparse matrix): Matrix to be factorized.
+            constant (boolean, optional): If True, the matrix is assumed
+                equal to that of the previous call, and no comparison is done.
+                Defaults to False.
+
+        Returns:
+            function: Solves the system with A for a given right hand side.
+
+        """
+        if self._solve is not None and (constant or self._unchanged(A)):
+            return self._solve
+
+        A = sps.csr_matrix(A)
+        A.sum_duplicates()
+        self._mat = A.copy()
+        self._solve = Factory().lu(A.tocsc())
+        self.num_factorizations += 1
+        logger.debug('Factorized left hand side')
+        return self._solve
+
+    def clear(self):
+        """ Discard the stored factorization.
+        """
+        self._solve = None
+        self._mat = None
+
+    def _unchanged(self, A):
+        if not sps.issparse(A):
+            return False
+        A = sps.csr_matrix(A)
+        A.sum_duplicates()
+        return sparse_mat.csr_equal(A, self._mat)
+
+
 class Factory():
     """ Factory class for linear solver functionality. The intention is to
     provide a single entry point for all relevant linear solvers. Hopefully,
@@ -78,27 +759,46 @@ class Factory():
         return iA.solve
 
 
-    def direct(self, A, rhs=None):
-        """ Wrapper around spsolve from scipy.sparse.linalg.
-        Confer that function for documetnation.
+    def direct(self, A, rhs=None, precision='double', **kwargs):
+        """ Direct solver.
+
+        If a right hand side is given, the system is solved by spsolve from
+        scipy.sparse.linalg. If not, A is factorized, and a DirectSolver is
+        returned, which reuses the factorization in all calls.
+
+        With precision 'mixed', a single precision copy of A is factorized,
+        and double precision accuracy is recovered by iterative refinement,
+        see MixedPrecisionSolver.
 
         Parameters:
             A: Matrix to be factorized
             rhs (optional): Right hand side vector. If not provided, a funciton
                 to solve with the given A is returned instead.
+            precision (str, optional): 'double' or 'mixed'. Defaults to
+                'double'.
+            **kwargs: Passed on to DirectSolver, e.g. permc_spec and
+                max_memory, or MixedPrecisionSolver, e.g. method and tol.
 
         Returns:
-            Either scipy.sparse.LinearOperator: Ready to be used as a
-                preconditioner, or the solution A^-1 b
+            Either DirectSolver (or MixedPrecisionSolver): Callable with a
+                right hand side, can also be used as a preconditioner, or the
+                solution A^-1 b
 
-        """
-        def solve(b):
-            return spl.spsolve(A, b)
+        Raises:
+            ValueError: If the precision is unknown.
 
+        """
+        if precision == 'mixed':
+            slv = MixedPrecisionSolver(A, **kwargs)
+            if rhs is None:
+                return slv
+            return slv(rhs)
+        elif precision != 'double':
+            raise ValueError('Unknown precision ' + precision)
         if rhs is None:
-            return solve
+            return DirectSolver(A, **kwargs)
         else:
-            return solve(rhs)
+            return spl.spsolve(A, rhs)
 
 
     def gmres(self, A):
@@ -181,30 +881,131 @@ class Factory():
                 choice for standard elliptic equations.
             as_precond (optional, defaults to True): Whether to return a solver
                 or a preconditioner function.
-            **kwargs: For the moment not in use.
+            **kwargs: hierarchy (AmgSolver): If given, the hierarchy of this
+                object is set up for A (reusing its previous hierarchy if
+                possible, see AmgSolver), and used by the returned function.
 
         Returns:
             Function: Either a LinearOperator to be used as preconditioner,
                 or a solver.
 
-        """
-        if null_space is None:
-            null_space = np.ones(A.shape[0])
+        Raises:
+            ImportError: If pyamg is not installed.
 
-        ml = pyamg.smoothed_aggregation_solver(A, B=null_space)
+        """
+        if pyamg is None:
+            raise ImportError('The amg solver requires pyamg')
+        amg = kwargs.get('hierarchy', None)
+        if amg is None:
+            amg = AmgSolver(null_space)
+        amg.setup(A)
 
         def solve(b, res=None, **kwargs):
-            if res is None:
-                return ml.solve(b, accel='gmres', cycle='V')
-            else:
-                return ml.solve(b, residuals=res, accel='gmres', cycle='V')
+            return amg.solve(b, res)
 
         if as_precond:
-            M_x = lambda x: ml.solve(x, tol=1e-20, maxiter=10, cycle='W')
-            return spl.LinearOperator(A.shape, M_x)
+            return amg.as_linear_operator()
         else:
             return solve
 
+    def multiple_rhs(self, A, rhs, solver='direct', precond=None, **kwargs):
+        """ Solve a linear system for a block of right hand sides.
+
+        The setup cost of the solver is shared by all right hand sides: For
+        the direct solver, A is factorized once, and the factorization is
+        applied to all columns of rhs. For the Krylov solvers, the
+        preconditioner is constructed once, and used for all columns. For the
+        amg solver, the multigrid hierarchy is constructed once.
+
+        Typical applications are computation of upscaled permeabilities, well
+        indices and sensitivities, where the same matrix is solved for a
+        number of right hand sides.
+
+        Parameters:
+            A (Matrix): Left hand side matrix.
+            rhs (np.ndarray, size A.shape[0] x num_rhs): Right hand sides,
+                one per column. A 1d array is treated as a single right hand
+                side. Sparse matrices are converted to dense arrays.
+            solver (str, optional): One of 'direct', 'mixed_precision',
+                'gmres', 'cg', 'bicgstab' and 'amg'. Defaults to 'direct'.
+            precond (str, optional): Preconditioner for the Krylov solvers,
+                either 'ilu' or 'amg'. Ignored if a preconditioner is given as
+                the keyword argument M, and for the direct and amg solvers.
+                Defaults to no preconditioner.
+            **kwargs: Passed on to the solver (e.g. tol, maxiter, x0), and to
+                the factorization (see lu() and ilu()). x0 can be a block of
+                initial guesses, of the same size as rhs.
+
+        Returns:
+            np.ndarray: Solutions, of the same shape as rhs.
+            np.ndarray of int: Convergence information for each column, as
+                returned by the Krylov solvers (0 for success). Only returned
+                for the gmres, cg and bicgstab solvers.
+
+        Raises:
+            ValueError: If the solver or preconditioner is unknown.
+
+        """
+        if sps.issparse(rhs):
+            rhs = rhs.toarray()
+        rhs = np.asarray(rhs)
+        is_vector = rhs.ndim == 1
+        B = rhs.reshape((rhs.shape[0], -1))
+
+        solver = solver.strip().lower()
+        if solver == 'direct':
+            opts = self.__extract_splu_args(**kwargs)
+            iA = spl.splu(sps.csc_matrix(A), **opts)
+            X = iA.solve(np.asfortranarray(B))
+            return X.ravel() if is_vector else X
+
+        if solver == 'mixed_precision':
+            X = MixedPrecisionSolver(A, **kwargs)(B)
+            return X.ravel() if is_vector else X
+
+        if solver == 'amg':
+            null_space = kwargs.pop('null_space', None)
+            slv = self.amg(A, null_space=null_space, as_precond=False)
+            X = np.zeros(B.shape)
+            for i in range(B.shape[1]):
+                X[:, i] = slv(B[:, i])
+            return X.ravel() if is_vector else X
+
+        if solver == 'gmres':
+            slv = self.gmres(A)
+        elif solver == 'cg':
+            slv = self.cg(A)
+        elif solver == 'bicgstab':
+            slv = self.bicgstab(A)
+        else:
+            raise ValueError('Unknown solver ' + solver)
+
+        if kwargs.get('M', None) is None and precond is not None:
+            precond = precond.strip().lower()
+            if precond == 'ilu':
+                kwargs['M'] = self.ilu(sps.csc_matrix(A), **kwargs)
+            elif precond == 'amg':
+                kwargs['M'] = self.amg(A, null_space=kwargs.get('null_space'))
+            else:
+                raise ValueError('Unknown preconditioner ' + precond)
+
+        x0 = kwargs.pop('x0', None)
+        if x0 is not None:
+            x0 = np.asarray(x0).reshape(B.shape)
+        X = np.zeros(B.shape)
+        info = np.zeros(B.shape[1], dtype=np.int)
+        for i in range(B.shape[1]):
+            if x0 is not None:
+                kwargs['x0'] = x0[:, i]
+            X[:, i], info[i] = slv(B[:, i], **kwargs)
+        if np.any(info != 0):
+            logger.warning('Linear solver did not converge for ' +
+                           str(np.sum(info != 0)) + ' of ' +
+                           str(info.size) + ' right hand sides')
+        if is_vector:
+            return X.ravel(), info
+        return X, info
+
     #### Helper functions below
 
     def __extract_krylov_args(self, **kwargs):
@@ -228,7 +1029,6 @@ class Factory():
         d = {}
         d['permc_spec'] = kwargs.get('permc_spec', None)
         d['diag_pivot_thresh'] = kwargs.get('diag_pivot_thresh', None)
-        d['drop_tol'] = kwargs.get('drop_tol', None)
         d['relax'] = kwargs.get('relax', None)
         d['panel_size'] = kwargs.get('panel_size', None)
         return d
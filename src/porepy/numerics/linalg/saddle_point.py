@@ -0,0 +1,279 @@
+"""
+Iterative solvers for saddle point systems of the form
+
+    [A  Bt] [u]   [f]
+    [B  C ] [p] = [g],
+
+as they arise from mixed discretizations, e.g. dual virtual elements, where
+A is the H(div) mass matrix, Bt and B the gradient and divergence, and C is
+zero or small.
+
+The systems are solved by a Krylov method, preconditioned by block
+preconditioners built from a diagonal approximation D of A and an
+approximation of the Schur complement,
+    S = C - B D^-1 Bt.
+The matrix -S is a (graph) Laplacian for the pressure, and is solved by amg.
+
+Example:
+    M, rhs = DualVEM().matrix_rhs(g, data)
+    is_u = np.hstack((np.ones(g.num_faces, dtype=np.bool),
+                      np.zeros(g.num_cells, dtype=np.bool)))
+    slv = SaddlePointSolver.from_matrix(M, is_u)
+    up = slv(rhs)
+
+"""
+import logging
+import time
+
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spl
+
+from porepy.numerics.linalg.linsolve import Factory, AmgSolver, relative_gmres
+
+# Module-wide logger
+logger = logging.getLogger(__name__)
+
+
+class SaddlePointSolver(object):
+    """ Krylov solver for saddle point systems with a block preconditioner.
+
+    Two methods are available:
+        gmres: GMRES, preconditioned by the block upper triangular matrix
+            [D Bt; 0 S].
+        minres: MINRES, preconditioned by the symmetric positive definite
+            block diagonal matrix [D 0; 0 -S]. Requires a symmetric system;
+            if the system is not symmetric (e.g. Neumann conditions imposed
+            by modifying rows), gmres is used instead.
+
+    The diagonal approximation of A is either the diagonal ('diagonal'), or
+    the row sums of the absolute values ('lumped'). The Schur complement
+    approximation is set up once, in the constructor, and reused in all
+    solves.
+
+    Attributes:
+        method (str): 'gmres' or 'minres'.
+        A, Bt, B, C (sps.csr_matrix): Blocks of the system.
+        tol (double): Relative residual tolerance.
+        maxiter (int): Maximum number of iterations (for gmres, of restart
+            cycles).
+        residuals (list of list of double): Relative residual norms of the
+            iterations, one list per solve. For gmres, these are the
+            preconditioned residual norms reported by the Krylov solver,
+            followed by the true relative residual norm of the solution.
+        iterations (list of int): Number of iterations, one per solve.
+        setup_time (double): Time spent in setup, in seconds.
+        solve_time (double): Accumulated time spent in solves, in seconds.
+
+    """
+
+    def __init__(self, A, Bt, B, C=None, method='gmres',
+                 mass_approx='diagonal', schur_solver='amg', tol=1e-8,
+                 maxiter=1000):
+        """
+        Parameters:
+            A (sps.matrix): Upper left (mass) block.
+            Bt (sps.matrix): Upper right (gradient) block.
+            B (sps.matrix): Lower left (divergence) block.
+            C (sps.matrix, optional): Lower right block. Defaults to zero.
+            method (str, optional): 'gmres' or 'minres'. Defaults to 'gmres'.
+            mass_approx (str, optional): 'diagonal' or 'lumped'. Defaults to
+                'diagonal'.
+            schur_solver (str, optional): Solver for the Schur complement
+                approximation, 'amg' or 'direct'. Defaults to 'amg'; if
+                pyamg is not available, a direct solver is used.
+            tol (double, optional): Relative residual tolerance. Defaults to
+                1e-8.
+            maxiter (int, optional): Maximum number of iterations (for gmres,
+                of restart cycles). Defaults to 1000.
+
+        Raises:
+            ValueError: If the method, mass approximation or Schur solver is
+                unknown.
+
+        """
+        tic = time.time()
+        method = method.strip().lower()
+        if method not in ['gmres', 'minres']:
+            raise ValueError('Unknown method ' + method)
+        if mass_approx not in ['diagonal', 'lumped']:
+            raise ValueError('Unknown mass approximation ' + mass_approx)
+        if schur_solver not in ['amg', 'direct']:
+            raise ValueError('Unknown Schur complement solver ' + schur_solver)
+
+        self.A = sps.csr_matrix(A)
+        self.Bt = sps.csr_matrix(Bt)
+        self.B = sps.csr_matrix(B)
+        num_u, num_p = self.Bt.shape
+        if C is None:
+            C = sps.csr_matrix((num_p, num_p))
+        self.C = sps.csr_matrix(C)
+        self.num_u = num_u
+        self.shape = (num_u + num_p, num_u + num_p)
+
+        if method == 'minres' and not self._is_symmetric():
+            logger.warning('Saddle point system is not symmetric, use gmres')
+            method = 'gmres'
+        self.method = method
+        self.tol = tol
+        self.maxiter = maxiter
+
+        if mass_approx == 'diagonal':
+            d = self.A.diagonal()
+        else:
+            d = np.asarray(np.abs(self.A).sum(axis=1)).ravel()
+        if np.any(d <= 0):
+            raise ValueError('Mass approximation is not positive')
+        self._inv_d = 1. / d
+
+        # Negative of the Schur complement approximation
+        S = self.B * sps.dia_matrix((self._inv_d, 0), shape=self.A.shape) \
+            * self.Bt - self.C
+        S = sps.csr_matrix(S)
+        S.sum_duplicates()
+        self._S = S
+        self._schur_solve = self._setup_schur_solver(S, schur_solver)
+
+        # Ordering of the unknowns, if set up from an assembled matrix
+        self._perm = None
+        self.residuals = []
+        self.iterations = []
+        self.setup_time = time.time() - tic
+        self.solve_time = 0
+
+    @classmethod
+    def from_matrix(cls, M, is_u, **kwargs):
+        """ Set up the solver from an assembled system matrix.
+
+        Parameters:
+            M (sps.matrix): System matrix.
+            is_u (np.ndarray of bool): True for the first (flux) block of
+                unknowns, False for the second (pressure) block.
+            **kwargs: Passed on to the constructor.
+
+        Returns:
+            SaddlePointSolver: The solver. The solve() method takes and
+                returns vectors ordered as M.
+
+        """
+        M = sps.csr_matrix(M)
+        is_u = np.asarray(is_u, dtype=np.bool)
+        u = np.where(is_u)[0]
+        p = np.where(np.logical_not(is_u))[0]
+        slv = cls(M[u][:, u], M[u][:, p], M[p][:, u], M[p][:, p], **kwargs)
+        slv._perm = np.hstack((u, p))
+        return slv
+
+    def matrix(self):
+        """ The system matrix, with the flux unknowns first.
+        """
+        return sps.bmat([[self.A, self.Bt], [self.B, self.C]], format='csr')
+
+    def precondition(self, r):
+        """ Apply the block preconditioner, on vectors ordered with the flux
+        unknowns first.
+        """
+        nu = self.num_u
+        p = self._schur_solve(r[nu:])
+        if self.method == 'gmres':
+            # Block upper triangular, S is minus the solved matrix
+            p = -p
+            u = self._inv_d * (r[:nu] - self.Bt * p)
+        else:
+            u = self._inv_d * r[:nu]
+        return np.hstack((u, p))
+
+    def solve(self, b, x0=None):
+        """ Solve the system.
+
+        Parameters:
+            b (np.ndarray): Right hand side.
+            x0 (np.ndarray, optional): Initial guess. Defaults to zero.
+
+        Returns:
+            np.ndarray: Solution.
+
+        """
+        tic = time.time()
+        b = np.asarray(b).ravel()
+        if self._perm is not None:
+            # Reorder to flux unknowns first
+            b = b[self._perm]
+            if x0 is not None:
+                x0 = np.asarray(x0).ravel()[self._perm]
+        A = spl.LinearOperator(self.shape, self._matvec)
+        M = spl.LinearOperator(self.shape, self.precondition)
+        norm_b = np.linalg.norm(b)
+        if norm_b == 0:
+            norm_b = 1
+        res = []
+
+        if self.method == 'gmres':
+            # The callback receives the preconditioned residual norm,
+            # already relative to the right hand side.
+            def callback(rk):
+                res.append(float(rk))
+            x, info = relative_gmres(A, b, x0=x0, M=M, tol=self.tol,
+                                     maxiter=self.maxiter, callback=callback)
+            num_iter = len(res)
+            # The residual of the final iterate, unpreconditioned
+            res.append(np.linalg.norm(b - A * x) / norm_b)
+        else:
+            def callback(xk):
+                res.append(np.linalg.norm(b - A * xk) / norm_b)
+            x, info = spl.minres(A, b, x0=x0, M=M, tol=self.tol,
+                                 maxiter=self.maxiter, callback=callback)
+            num_iter = len(res)
+        if info != 0:
+            logger.warning(self.method + ' failed with status ' + str(info))
+
+        self.residuals.append(res)
+        self.iterations.append(num_iter)
+        if self._perm is not None:
+            y = np.empty_like(x)
+            y[self._perm] = x
+            x = y
+        self.solve_time += time.time() - tic
+        return x
+
+    def __call__(self, b):
+        return self.solve(b)
+
+    def statistics(self):
+        """ Timings and iteration counts.
+
+        Returns:
+            dictionary: With keys setup_time, solve_time, iterations and
+                residuals.
+
+        """
+        return {'setup_time': self.setup_time,
+                'solve_time': self.solve_time,
+                'iterations': self.iterations,
+                'residuals': self.residuals}
+
+    def _matvec(self, x):
+        x = np.asarray(x).ravel()
+        nu = self.num_u
+        u, p = x[:nu], x[nu:]
+        return np.hstack((self.A * u + self.Bt * p, self.B * u + self.C * p))
+
+    def _is_symmetric(self):
+        def equal(X, Y):
+            D = X - Y
+            return D.nnz == 0 or np.abs(D.data).max() <= \
+                1e-12 * max(np.abs(X.data).max(), 1e-300)
+        return equal(self.A, self.A.T.tocsr()) \
+            and equal(self.Bt, self.B.T.tocsr()) \
+            and equal(self.C, self.C.T.tocsr())
+
+    def _setup_schur_solver(self, S, solver):
+        if solver == 'amg':
+            try:
+                amg = AmgSolver()
+                amg.setup(S)
+                return amg.precondition
+            except ImportError:
+                logger.warning('pyamg not available, use direct solver for '
+                               'the Schur complement')
+        return Factory().direct(S)
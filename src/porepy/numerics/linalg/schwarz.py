@@ -0,0 +1,341 @@
+"""
+Block preconditioners of Schwarz type.
+
+The degrees of freedom are split into blocks, typically one block per grid in
+a GridBucket, and the preconditioner is composed of solvers for the diagonal
+blocks of the matrix. Two variants are available:
+
+    additive: All blocks are solved independently (block Jacobi), and the
+        solutions are combined.
+    multiplicative: The blocks are grouped in levels, e.g. according to the
+        dimension of the grids. Blocks on the same level are solved
+        independently, while the residual is updated between the levels
+        (block Gauss-Seidel over the levels).
+
+Optionally, the blocks are extended with algebraic overlap, that is, with
+neighboring degrees of freedom in the matrix graph. The overlap is used in the
+block solves, but only the original degrees of freedom of a block are updated
+(restricted Schwarz).
+
+Optionally, independent block solves are run in a thread pool. Whether this
+speeds up the preconditioner depends on whether the block solvers release the
+GIL; by default the blocks are solved one by one. The pool is created on the
+first application of the preconditioner, and shut down by close(), or on exit
+from a with statement.
+
+Example:
+    blocks, levels = grid_bucket_blocks(gb, TpfaMixedDim().solver)
+    with Schwarz(A, blocks, levels, mode='multiplicative') as M:
+        x, info = spl.gmres(A, b, M=M.as_linear_operator())
+
+"""
+import logging
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spl
+
+from porepy.numerics.linalg.linsolve import Factory
+from porepy.utils.sparse_mat import CsrPattern
+
+# Module-wide logger
+logger = logging.getLogger(__name__)
+
+
+class Schwarz(object):
+    """ Additive or multiplicative Schwarz preconditioner.
+
+    The extraction of the block matrices from the global matrix is computed
+    once, in the constructor. If the matrix changes values, but not sparsity
+    pattern, the preconditioner is updated by update(), which reuses the
+    extraction maps.
+
+    If more than one thread is requested, the thread pool used for the block
+    solves is created on the first application, and kept for the lifetime of
+    the preconditioner, also when it is updated. Call close() to shut it
+    down, or use the preconditioner in a with statement.
+
+    Attributes:
+        shape (tuple): Shape of the matrix.
+        mode (str): 'additive' or 'multiplicative'.
+        blocks (list of np.ndarray): Degrees of freedom of each block,
+            including overlap.
+        block_matrices (list of sps.csr_matrix): Diagonal blocks of the
+            matrix, including overlap.
+        solvers (list of functions): Solvers for the block matrices.
+
+    """
+
+    def __init__(self, A, blocks, levels=None, mode='additive', overlap=0,
+                 num_threads=1, max_direct=5000, block_solver=None):
+        """
+        Parameters:
+            A (sps.matrix): Matrix to be preconditioned.
+            blocks (list of np.ndarray): Degrees of freedom of each block. The
+                blocks should form a partition of the degrees of freedom.
+            levels (np.ndarray of int, optional): Level of each block. In
+                multiplicative mode, the levels are visited in increasing
+                order. Defaults to one level per block, in the order of
+                blocks.
+            mode (str, optional): 'additive' or 'multiplicative'. Defaults to
+                'additive'.
+            overlap (int, optional): Number of layers of algebraic overlap
+                added to each block. Defaults to 0.
+            num_threads (int, optional): Number of threads used for block
+                solves. If None, the number of cpus is used. Defaults to 1,
+                that is, no thread pool is used.
+            max_direct (int, optional): Blocks smaller than this are solved by
+                a direct solver, larger blocks by an amg V-cycle (ilu if pyamg
+                is not available). Defaults to 5000. Only used if block_solver
+                is not given.
+            block_solver (function, optional): Takes a block matrix, returns a
+                function that (approximately) solves with the matrix.
+
+        Raises:
+            ValueError: If the mode is unknown.
+
+        """
+        mode = mode.strip().lower()
+        if mode not in ['additive', 'multiplicative']:
+            raise ValueError('Unknown Schwarz mode ' + mode)
+        self.mode = mode
+        self.overlap = overlap
+        self.num_threads = num_threads
+        self.max_direct = max_direct
+        self._block_solver = block_solver
+        # Created on the first application, see _solve_blocks()
+        self._pool = None
+        self._closed = False
+
+        self._setup(A, blocks, levels)
+
+    def _setup(self, A, blocks, levels):
+        # Compute the maps from the matrix to the blocks, and set up the
+        # block solvers
+        A = sps.csr_matrix(A)
+        A.sum_duplicates()
+        self.shape = A.shape
+        self._A = A
+        self._indptr = A.indptr.copy()
+        self._indices = A.indices.copy()
+
+        num_blocks = len(blocks)
+        if levels is None:
+            levels = np.arange(num_blocks)
+        levels = np.asarray(levels)
+        # Blocks grouped by level, in increasing order of levels
+        self._levels = [np.where(levels == l)[0] for l in np.unique(levels)]
+
+        self.blocks = []
+        # Local indices, within the extended block, of the dofs owned by the
+        # block.
+        self._owned = []
+        self._own_dofs = []
+        self._patterns = []
+        self._positions = []
+        for b in blocks:
+            b = np.sort(np.asarray(b))
+            ind = algebraic_overlap(A, b, self.overlap) if self.overlap > 0 \
+                else b
+            self.blocks.append(ind)
+            self._own_dofs.append(b)
+            self._owned.append(np.searchsorted(ind, b))
+            pattern, pos = _submatrix_map(A, ind)
+            self._patterns.append(pattern)
+            self._positions.append(pos)
+
+        self._setup_solvers(A)
+
+    def update(self, A):
+        """ Update the preconditioner for a matrix with new values.
+
+        If the sparsity pattern of the matrix is unchanged, the block
+        extraction maps are reused, otherwise the preconditioner is set up
+        from scratch.
+
+        Parameters:
+            A (sps.matrix): New matrix.
+
+        """
+        A = sps.csr_matrix(A)
+        A.sum_duplicates()
+        if A.shape != self.shape or \
+                not np.array_equal(A.indptr, self._indptr) or \
+                not np.array_equal(A.indices, self._indices):
+            logger.info('Sparsity pattern changed, rebuild Schwarz blocks')
+            levels = np.zeros(len(self.blocks), dtype=np.int)
+            for i, l in enumerate(self._levels):
+                levels[l] = i
+            self._setup(A, self._own_dofs, levels)
+            return
+        self._A = A
+        self._setup_solvers(A)
+
+    def close(self):
+        """ Shut down the thread pool used for the block solves.
+
+        The preconditioner can still be applied, the blocks are then solved
+        one by one.
+        """
+        self._closed = True
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def apply(self, r):
+        """ Apply the preconditioner to a vector.
+
+        Parameters:
+            r (np.ndarray): Residual.
+
+        Returns:
+            np.ndarray: Approximation of A^-1 r.
+
+        """
+        r = np.asarray(r).ravel()
+        x = np.zeros(r.size, dtype=np.result_type(r.dtype, np.float64))
+        if self.mode == 'additive':
+            self._solve_blocks(np.arange(len(self.blocks)), r, x)
+        else:
+            res = r
+            for lvl in self._levels:
+                self._solve_blocks(lvl, res, x)
+                res = r - self._A * x
+        return x
+
+    def __call__(self, r):
+        return self.apply(r)
+
+    def as_linear_operator(self):
+        """ Wrap the preconditioner as a LinearOperator.
+        """
+        return spl.LinearOperator(self.shape, self.apply)
+
+    def _solve_blocks(self, block_ind, r, x):
+        # Solve for all blocks in block_ind, and insert the owned part of the
+        # solutions in x. The owned dofs of the blocks are disjoint, thus the
+        # blocks can be solved in parallel.
+        def solve(i):
+            sol = self.solvers[i](r[self.blocks[i]])
+            x[self._own_dofs[i]] += np.asarray(sol).ravel()[self._owned[i]]
+
+        if len(block_ind) > 1 and self._pool is None and not self._closed \
+                and self.num_threads != 1:
+            self._pool = ThreadPool(self.num_threads)
+
+        if self._pool is None or len(block_ind) == 1:
+            for i in block_ind:
+                solve(i)
+        else:
+            # Consume the results to raise any exceptions from the workers
+            list(self._pool.map(solve, block_ind))
+
+    def _setup_solvers(self, A):
+        self.block_matrices = [p.matrix(A.data[pos]) for p, pos in
+                               zip(self._patterns, self._positions)]
+        if self._pool is None:
+            self.solvers = [self._assign_solver(m)
+                            for m in self.block_matrices]
+        else:
+            self.solvers = list(self._pool.map(self._assign_solver,
+                                               self.block_matrices))
+
+    def _assign_solver(self, A):
+        if self._block_solver is not None:
+            return self._block_solver(A)
+        factory = Factory()
+        if A.shape[0] < self.max_direct:
+            return factory.direct(A)
+        # amg solver is pyamg is installed, if not ilu
+        try:
+            return factory.amg(A, as_precond=True)
+        except ImportError:
+            return factory.ilu(sps.csc_matrix(A))
+
+#------------------------------------------------------------------------------#
+
+
+def grid_bucket_blocks(gb, solver):
+    """ Blocks of the degrees of freedom of a GridBucket, one per grid.
+
+    Parameters:
+        gb (GridBucket): Mixed-dimensional grid.
+        solver (Coupler): Coupler used to assemble the matrix, provides the
+            degrees of freedom of each grid.
+
+    Returns:
+        list of np.ndarray: Degrees of freedom of each grid.
+        np.ndarray: Level of each block. The grids of highest dimension are on
+            level 0, the next dimension on level 1 etc.
+
+    """
+    blocks = []
+    dims = []
+    for g, _ in gb:
+        blocks.append(solver.dof_of_grid(gb, g))
+        dims.append(g.dim)
+    dims = np.array(dims)
+    return blocks, dims.max() - dims
+
+
+def algebraic_overlap(A, ind, num_layers):
+    """
+    From a set of degrees of freedom, find an extended set that form an
+    overlap in the graph of a matrix.
+
+    This is the algebraic analogue of porepy.grids.partition.overlap: In each
+    layer, the set is increased by all degrees of freedom that are connected
+    to the set by a nonzero matrix element.
+
+    Parameters:
+        A (sps.matrix): Matrix, its sparsity pattern defines the connections.
+        ind (np.array): Indices of the initial set.
+        num_layers (int): Number of overlap layers.
+
+    Returns:
+        np.array: Sorted indices of the extended set.
+
+    """
+    # Symmetrized connection pattern
+    C = sps.csr_matrix(A, copy=True)
+    C.data = np.ones(C.data.size)
+    C = C + C.T
+
+    active = np.zeros(A.shape[0], dtype=np.bool)
+    active[ind] = 1
+    for _ in range(num_layers):
+        active[(C * active) > 0] = 1
+    return np.where(active)[0]
+
+
+def _submatrix_map(A, ind):
+    """ Map from a csr matrix to its submatrix A[ind][:, ind].
+
+    Returns:
+        CsrPattern: Pattern of the submatrix.
+        np.ndarray: Positions in A.data of the submatrix elements, so that
+            the submatrix is pattern.matrix(A.data[pos]).
+
+    """
+    num = ind.size
+    loc = -np.ones(A.shape[1], dtype=np.int)
+    loc[ind] = np.arange(num)
+
+    start = A.indptr[ind]
+    lengths = A.indptr[ind + 1] - start
+    offsets = np.cumsum(lengths) - lengths
+    pos = np.arange(lengths.sum()) - np.repeat(offsets - start, lengths)
+    rows = np.repeat(np.arange(num), lengths)
+    cols = loc[A.indices[pos]]
+
+    keep = cols >= 0
+    pattern = CsrPattern(rows[keep], cols[keep], (num, num))
+    return pattern, pos[keep]
@@ -0,0 +1,348 @@
+"""
+Policies for the choice between direct and iterative linear solvers.
+
+A policy has a method choose(A, dim), which returns either 'direct' or
+'iterative', and a method record(), which is called after the solve with the
+choice made and the time spent. Two policies are available:
+
+    ThresholdPolicy: Direct solver for systems smaller than a fixed size.
+    SolverPolicy: The cost and memory of the two options are estimated from
+        the size, number of nonzeros and spatial dimension of the problem. The
+        cost model is calibrated by a micro-benchmark on the host machine.
+
+Cost model of SolverPolicy:
+    Direct solver: For a matrix of size n with r times the nonzeros per row
+        of the standard (2 * dim + 1)-point stencil, the number of nonzeros in
+        the factors is predicted as
+            fill = c_fill * r * F(n),  F = n, n log2(n), n^(4/3)
+        in 1d, 2d and 3d, respectively (nested dissection type estimates), and
+        the factorization time as
+            time = c_time * r^2 * W(n),  W = n, n^1.5, n^2.
+        The memory is 12 bytes (value and index) per nonzero of the factors.
+    Iterative solver: Amg preconditioned Krylov method, with time
+            time = nnz * (c_setup + iterations * (c_matvec + c_precond)).
+        The expected number of iterations is updated from recorded solves.
+
+The constants c_fill and c_time (per dimension), c_setup, c_matvec and
+c_precond are computed by factorizing, setting up amg for, and multiplying
+with, small Laplacians in 2d and 3d, together with the number of iterations
+of amg preconditioned GMRES. The calibration is done once per process.
+
+Example:
+    policy = SolverPolicy()
+    if policy.choose(A, dim=3) == 'direct':
+        ...
+    policy.record('direct', elapsed_time, A, dim=3)
+
+"""
+from __future__ import division
+import logging
+import os
+import time
+
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spl
+
+from porepy.numerics.linalg.linsolve import Factory, AmgSolver, DirectSolver
+from porepy.numerics.linalg.linsolve import IterCounter
+
+# Module-wide logger
+logger = logging.getLogger(__name__)
+
+# Calibration constants of SolverPolicy, computed once per process
+_CALIBRATION = None
+
+# Bytes per nonzero in the LU factors, value and index
+_BYTES_PER_NNZ = 12
+
+
+class ThresholdPolicy(object):
+    """ Direct solver for systems with fewer than max_direct unknowns.
+
+    Attributes:
+        max_direct (int): Threshold for the direct solver.
+        history (list of dictionaries): Recorded solves, see
+            SolverPolicy.record().
+
+    """
+
+    def __init__(self, max_direct=40000):
+        self.max_direct = max_direct
+        self.history = []
+
+    def choose(self, A, dim=None):
+        """ Choose solver for a matrix.
+
+        Returns:
+            str: 'direct' or 'iterative'.
+
+        """
+        return 'direct' if A.shape[0] < self.max_direct else 'iterative'
+
+    def record(self, solver, elapsed, A, dim=None, iterations=None):
+        """ Record a solve, see SolverPolicy.record().
+        """
+        self.history.append(_record(solver, elapsed, A, dim, iterations))
+
+
+class SolverPolicy(object):
+    """ Choice of linear solver based on a calibrated cost model, see the
+    module documentation.
+
+    The direct solver is chosen if its predicted memory is within the memory
+    limit, and its predicted time is not larger than that of the iterative
+    solver.
+
+    Attributes:
+        memory_limit (int): Maximum memory for the direct solver, in bytes.
+        iterations (double): Expected number of iterations of the iterative
+            solver.
+        calibration (dictionary): Constants of the cost model.
+        history (list of dictionaries): Recorded solves, see record().
+
+    """
+
+    def __init__(self, memory_limit=None, iterations=None, calibrate=True):
+        """
+        Parameters:
+            memory_limit (int, optional): Maximum memory for the direct
+                solver, in bytes. Defaults to half the physical memory of the
+                host, if this can be found, otherwise no limit.
+            iterations (double, optional): Initial estimate of the number of
+                iterations of the iterative solver. Defaults to the number of
+                iterations in the calibration.
+            calibrate (boolean, optional): If True, the cost model is
+                calibrated on the host machine. If False, default constants
+                are used. Defaults to True.
+
+        """
+        if memory_limit is None:
+            memory_limit = _physical_memory()
+            if memory_limit is not None:
+                memory_limit //= 2
+        self.memory_limit = memory_limit
+        self.history = []
+        if calibrate:
+            self.calibration = calibration()
+        else:
+            self.calibration = _default_calibration()
+        if iterations is None:
+            iterations = self.calibration['iterations']
+        self.iterations = iterations
+
+    def estimate(self, A, dim=None):
+        """ Estimate cost and memory of the direct and iterative solvers.
+
+        Parameters:
+            A (sps.matrix): Matrix of the system.
+            dim (int, optional): Spatial dimension of the problem. If not
+                given, it is guessed from the number of nonzeros per row.
+
+        Returns:
+            dictionary: With keys n, nnz, dim, fill (predicted nonzeros in the
+                LU factors), direct_memory (bytes), direct_time and
+                iterative_time (seconds).
+
+        """
+        n = A.shape[0]
+        nnz = A.nnz
+        if dim is None:
+            dim = _guess_dimension(n, nnz)
+        dim = min(max(dim, 1), 3)
+        cal = self.calibration
+        # Nonzeros per row relative to the standard stencil
+        r = max(nnz / max(n, 1) / (2 * dim + 1), 1)
+
+        fill = cal['fill'][dim] * r * _fill_model(n, dim)
+        direct_time = cal['time'][dim] * r ** 2 * _work_model(n, dim)
+        iterative_time = nnz * (cal['setup'] + self.iterations *
+                                (cal['matvec'] + cal['precond']))
+        return {'n': n, 'nnz': nnz, 'dim': dim, 'fill': fill,
+                'direct_memory': _BYTES_PER_NNZ * fill,
+                'direct_time': direct_time,
+                'iterative_time': iterative_time}
+
+    def choose(self, A, dim=None):
+        """ Choose solver for a matrix.
+
+        Parameters:
+            A (sps.matrix): Matrix of the system.
+            dim (int, optional): Spatial dimension of the problem.
+
+        Returns:
+            str: 'direct' or 'iterative'.
+
+        """
+        est = self.estimate(A, dim)
+        if self.memory_limit is not None and \
+                est['direct_memory'] > self.memory_limit:
+            choice = 'iterative'
+        elif est['direct_time'] <= est['iterative_time']:
+            choice = 'direct'
+        else:
+            choice = 'iterative'
+        logger.info('Solver policy: ' + choice + ' solver. Estimated time '
+                    'direct ' + str(est['direct_time']) + ', iterative ' +
+                    str(est['iterative_time']) + ', direct memory ' +
+                    str(est['direct_memory']))
+        return choice
+
+    def record(self, solver, elapsed, A, dim=None, iterations=None):
+        """ Record a solve.
+
+        The expected number of iterations is updated from iterative solves.
+
+        Parameters:
+            solver (str): The solver used.
+            elapsed (double): Time spent in the solve, in seconds.
+            A (sps.matrix): Matrix of the system.
+            dim (int, optional): Spatial dimension of the problem.
+            iterations (int, optional): Number of iterations of an iterative
+                solver.
+
+        """
+        rec = _record(solver, elapsed, A, dim, iterations)
+        rec['estimate'] = self.estimate(A, dim)
+        self.history.append(rec)
+        if iterations is not None:
+            # Running average over the recorded iterative solves
+            num = sum(1 for h in self.history
+                      if h['iterations'] is not None)
+            self.iterations += (iterations - self.iterations) / (num + 1)
+
+    def block_solver(self, A):
+        """ Set up a solver for a matrix according to the policy, e.g. for
+        the blocks of a Schwarz preconditioner.
+
+        Returns:
+            function: Direct solver, or amg preconditioner (ilu if pyamg is
+                not available).
+
+        """
+        factory = Factory()
+        if self.choose(A) == 'direct':
+            return factory.direct(A)
+        try:
+            return factory.amg(A, as_precond=True)
+        except ImportError:
+            return factory.ilu(sps.csc_matrix(A))
+
+
+def calibration(force=False):
+    """ Constants of the cost model of SolverPolicy, computed by a
+    micro-benchmark on the host machine. The benchmark is run once per
+    process, the result is reused in later calls.
+
+    Parameters:
+        force (boolean, optional): If True, the benchmark is rerun. Defaults
+            to False.
+
+    Returns:
+        dictionary: With keys fill and time (dictionaries with one constant
+            per dimension 1, 2, 3), setup, matvec, precond and iterations.
+
+    """
+    global _CALIBRATION
+    if _CALIBRATION is not None and not force:
+        return _CALIBRATION
+
+    tic = time.time()
+    cal = _default_calibration()
+    for dim, num in [(2, 100), (3, 20)]:
+        A = _laplacian(num, dim)
+        n = A.shape[0]
+        t = time.time()
+        lu = DirectSolver(A)
+        t = time.time() - t
+        cal['fill'][dim] = lu.nnz / _fill_model(n, dim)
+        cal['time'][dim] = max(t, 1e-6) / _work_model(n, dim)
+
+    # Matrix vector products and amg preconditioned GMRES, timed on the 3d
+    # Laplacian
+    x = np.ones(A.shape[0])
+    t = time.time()
+    for _ in range(10):
+        A * x
+    cal['matvec'] = (time.time() - t) / (10 * A.nnz)
+    try:
+        amg = AmgSolver()
+        t = time.time()
+        amg.setup(A)
+        cal['setup'] = (time.time() - t) / A.nnz
+        t = time.time()
+        amg.precondition(x)
+        cal['precond'] = (time.time() - t) / A.nnz
+        counter = IterCounter(disp=False)
+        spl.gmres(A, x, M=amg.as_linear_operator(), tol=1e-8,
+                  callback=counter)
+        cal['iterations'] = max(counter.niter, 1)
+    except ImportError:
+        cal['setup'] = 20 * cal['matvec']
+        cal['precond'] = 10 * cal['matvec']
+
+    _CALIBRATION = cal
+    logger.info('Calibrated solver cost model in ' + str(time.time() - tic) +
+                ' seconds')
+    return cal
+
+
+def _default_calibration():
+    # Rough constants for a typical workstation, used if no calibration is
+    # done
+    return {'fill': {1: 3., 2: 1., 3: 1.5},
+            'time': {1: 1e-7, 2: 2e-8, 3: 2e-9},
+            'setup': 1e-7, 'matvec': 5e-9, 'precond': 2e-7, 'iterations': 10}
+
+
+def _fill_model(n, dim):
+    if dim == 1:
+        return n
+    elif dim == 2:
+        return n * np.log2(max(n, 2))
+    return n ** (4. / 3)
+
+
+def _work_model(n, dim):
+    if dim == 1:
+        return n
+    elif dim == 2:
+        return n ** 1.5
+    return float(n) ** 2
+
+
+def _guess_dimension(n, nnz):
+    # Standard stencils have 3, 5 and 7 nonzeros per row in 1d, 2d and 3d
+    per_row = nnz / max(n, 1)
+    if per_row <= 3.5:
+        return 1
+    elif per_row <= 6:
+        return 2
+    return 3
+
+
+def _laplacian(num, dim):
+    # Finite difference Laplacian on a Cartesian grid with num^dim points
+    T = sps.diags([-np.ones(num - 1), 2 * np.ones(num), -np.ones(num - 1)],
+                  [-1, 0, 1])
+    I = sps.identity(num)
+    if dim == 2:
+        return sps.csr_matrix(sps.kron(T, I) + sps.kron(I, T))
+    return sps.csr_matrix(sps.kron(sps.kron(T, I), I) +
+                          sps.kron(sps.kron(I, T), I) +
+                          sps.kron(sps.kron(I, I), T))
+
+
+def _physical_memory():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, AttributeError, OSError):
+        return None
+
+
+def _record(solver, elapsed, A, dim, iterations):
+    rec = {'solver': solver, 'time': elapsed, 'n': A.shape[0], 'nnz': A.nnz,
+           'dim': dim, 'iterations': iterations}
+    logger.info('Solved system of size ' + str(A.shape[0]) + ' with ' +
+                solver + ' solver in ' + str(elapsed) + ' seconds')
+    return rec
@@ -7,9 +7,10 @@ import numpy as np
 import scipy.sparse as sps
 
 from porepy.params.data import Parameters
+from porepy.numerics.linalg.linsolve import Factory
 
 
-def solve_static_condensation(A, rhs, gb, dim=0, condensation_inverter=sps.linalg.inv,
+def solve_static_condensation(A, rhs, gb, dim=0, condensation_inverter=None,
                               system_inverter=sps.linalg.spsolve):
     """
     A call to this function uses a static condensation to solve a linear
@@ -22,7 +23,9 @@ def solve_static_condensation(A, rhs, gb, dim=0, condensation_inverter=sps.linal
             solved.
         dim: The dimension one wishes to get rid of. No tests for dim>0.
         condensation_inverter: The inverter of the (small) system solved 
-            to perform the static condensation.
+            to perform the static condensation. If None (default), the
+            block diagonal structure of the system, with one block per grid
+            of dimension dim, is exploited, see eliminate_dofs.
         system_inverter: Inverter for solving the problem after static 
             condensation has been performed.
     Returns:
@@ -38,9 +41,15 @@ def solve_static_condensation(A, rhs, gb, dim=0, condensation_inverter=sps.linal
     """
     to_be_eliminated = dofs_of_dimension(gb, A, dim)
 
-    
+    if condensation_inverter is None:
+        blocks = dof_blocks_of_dimension(gb, dim)
+        condensation_inverter = sps.linalg.inv
+    else:
+        blocks = None
+
     a_reduced, rhs_reduced, condensation_matrix, original_to_kept_dofs, a_ss_inv \
-        = eliminate_dofs(A, rhs, to_be_eliminated, condensation_inverter)
+        = eliminate_dofs(A, rhs, to_be_eliminated, condensation_inverter,
+                         blocks)
 
     eliminated_dofs = np.nonzero(to_be_eliminated)[0]
     x_reduced = system_inverter(a_reduced, rhs_reduced)
@@ -51,6 +60,90 @@ def solve_static_condensation(A, rhs, gb, dim=0, condensation_inverter=sps.linal
     return x, x_reduced, original_to_kept_dofs, eliminated_dofs
 
 
+class StaticCondensation(object):
+    """
+    Static condensation of a linear system, for repeated solves with the same
+    matrix and different right hand sides.
+
+    The condensation operators are computed, and the reduced system is
+    factorized, once, in the constructor. A solve then consists of the
+    reduction of the right hand side, a solve with the factorized reduced
+    system, and the back-substitution for the eliminated dofs.
+
+    Attributes:
+        A_reduced (sps.csr_matrix): The reduced system matrix.
+        condensation_matrix (sps.csc_matrix): Maps the master unknowns to the
+            slave unknowns.
+        A_ss_inv (sps.matrix): Inverse of the slave block.
+        kept_dofs (np.array): Indices of the masters.
+        eliminated_dofs (np.array): Indices of the slaves.
+
+    """
+
+    def __init__(self, A, to_be_eliminated, blocks=None,
+                 inverter=sps.linalg.inv, system_inverter=None):
+        """
+        Parameters:
+            A (sps.matrix): Original matrix.
+            to_be_eliminated (np.array of bool): Mask of the dofs to be
+                eliminated.
+            blocks (list of np.array, optional): Dofs of the diagonal blocks
+                of the slave system, see eliminate_dofs.
+            inverter (optional): Inverter of the slave system, used if blocks
+                is not given.
+            system_inverter (optional): Function that takes the reduced
+                matrix and returns a solver function. Defaults to a direct
+                solver that factorizes once.
+
+        """
+        A = sps.csr_matrix(A)
+        self.eliminated_dofs = np.nonzero(to_be_eliminated)[0]
+        self.A_reduced, _, self.condensation_matrix, self.kept_dofs, \
+            self.A_ss_inv = eliminate_dofs(A, np.zeros(A.shape[0]),
+                                           to_be_eliminated, inverter, blocks)
+        self.A_ms = A[self.kept_dofs][:, self.eliminated_dofs]
+        self.num_dofs = A.shape[0]
+
+        if system_inverter is None:
+            self._solve = Factory().direct(self.A_reduced)
+        else:
+            self._solve = system_inverter(self.A_reduced)
+
+    @classmethod
+    def from_grid_bucket(cls, A, gb, dim=0, **kwargs):
+        """ Condensation of the dofs of all grids of dimension dim, exploiting
+        the block structure of the slave system.
+        """
+        return cls(A, dofs_of_dimension(gb, A, dim),
+                   dof_blocks_of_dimension(gb, dim), **kwargs)
+
+    def reduce_rhs(self, rhs):
+        """ Right hand side of the reduced system.
+        """
+        rhs_s = self.A_ss_inv * rhs[self.eliminated_dofs]
+        return rhs[self.kept_dofs] - self.A_ms * rhs_s
+
+    def expand(self, x_reduced, rhs):
+        """ Full solution from the solution of the reduced system.
+        """
+        x = np.zeros(self.num_dofs)
+        x[self.kept_dofs] = x_reduced
+        x[self.eliminated_dofs] = self.condensation_matrix * x_reduced \
+            + self.A_ss_inv * rhs[self.eliminated_dofs]
+        return x
+
+    def solve(self, rhs):
+        """ Solve the full system.
+
+        Parameters:
+            rhs (np.array): Right hand side of the full system.
+
+        Returns:
+            np.array: Solution of the full system.
+
+        """
+        return self.expand(self._solve(self.reduce_rhs(rhs)), rhs)
+
 
 def dofs_of_dimension(gb, A, dim=0):
     """
@@ -74,7 +167,26 @@ def dofs_of_dimension(gb, A, dim=0):
     return to_be_eliminated
 
 
-def eliminate_dofs(A, rhs, to_be_eliminated, inverter=sps.linalg.inv):
+def dof_blocks_of_dimension(gb, dim=0):
+    """
+    Extracts the global dof numbers of each grid of a given dimension.
+    Returns a list of arrays, one per grid.
+    """
+    dofs = np.empty(gb.size(), dtype=int)
+    for _, d in gb:
+        dofs[d['node_number']] = d['dof']
+    dofs = np.r_[0, np.cumsum(dofs)]
+
+    blocks = []
+    for g, d in gb:
+        i = d['node_number']
+        if g.dim == dim:
+            blocks.append(np.arange(dofs[i], dofs[i + 1]))
+    return blocks
+
+
+def eliminate_dofs(A, rhs, to_be_eliminated, inverter=sps.linalg.inv,
+                   blocks=None):
     """
     Splits the system matrix A into four blocks according to which dofs
     are to be eliminated (the "slaves"). The right hand side is split 
@@ -82,11 +194,22 @@ def eliminate_dofs(A, rhs, to_be_eliminated, inverter=sps.linalg.inv):
     part corresponding to the slaves has to be inverted, hence the option
     to choose inverter. This system will usually be quite small.
 
+    If the slave dofs are split into blocks with no connections between
+    them, e.g. one block per 0d intersection grid, the slave system is block
+    diagonal. If the blocks are given, the slave system is inverted by
+    inverting all the (small) blocks at once, and the Schur complement is
+    assembled directly from the nonzero entries of A_ms and A_sm. If the
+    slave system turns out not to be block diagonal, the general inverter is
+    used.
+
     Input:
     A, rhs: original matrix and right hand side of the problem to be
         solved.
         to_be_eliminated: boolean mask specifying which degrees of freedom 
         should be eliminated from the system.
+        inverter: Inverter of the slave system, used if blocks are not given.
+        blocks (list of np.array, optional): Global indices of the slave dofs
+            of each diagonal block.
 
     Returns:
         A_reduced (scipy.sparse.csr_matrix): The system matrix for the reduced system, i.e.,
@@ -118,14 +241,21 @@ def eliminate_dofs(A, rhs, to_be_eliminated, inverter=sps.linalg.inv):
     A_ss = A[:, to_be_eliminated]
     A_ss = A_ss[to_be_eliminated, :]
     
-    A_ss_inv = inverter(A_ss)
-    A_ms_A_ss_inv = A_ms * A_ss_inv
-    
-    # Needed for broadcasting
-    if A_ss.size == 1:
-        A_ms_A_ss_inv = A_ms_A_ss_inv[:, np.newaxis]
+    A_ss_inv = None
+    if blocks is not None:
+        A_ss_inv = _invert_block_diagonal(A_ss, to_be_eliminated, blocks)
+    if A_ss_inv is None:
+        A_ss_inv = inverter(A_ss)
+        A_ms_A_ss_inv = A_ms * A_ss_inv
 
-    sparse_product = sps.csr_matrix(A_ms_A_ss_inv * A_sm)
+        # Needed for broadcasting
+        if A_ss.size == 1:
+            A_ms_A_ss_inv = A_ms_A_ss_inv[:, np.newaxis]
+
+        sparse_product = sps.csr_matrix(A_ms_A_ss_inv * A_sm)
+    else:
+        A_ms_A_ss_inv = sps.csc_matrix(A_ms * A_ss_inv)
+        sparse_product = _sparse_outer_products(A_ms_A_ss_inv, A_sm)
 
     A_reduced = A_mm - sparse_product
     rhs_reduced = rhs[to_be_kept][:, np.newaxis] - \
@@ -135,6 +265,73 @@ def eliminate_dofs(A, rhs, to_be_eliminated, inverter=sps.linalg.inv):
     return A_reduced, rhs_reduced, condensation_matrix, to_be_kept, A_ss_inv
 
 
+def _invert_block_diagonal(A_ss, eliminated, blocks):
+    """
+    Invert the slave system, given the global dofs of its diagonal blocks.
+
+    Returns None if the blocks do not cover the slaves, or if A_ss has
+    entries outside the blocks.
+    """
+    # Block number of each slave, in the local numbering of the slaves
+    block_of_slave = -np.ones(eliminated.size, dtype=int)
+    sizes = np.zeros(len(blocks), dtype=np.int64)
+    for i, b in enumerate(blocks):
+        loc = np.searchsorted(eliminated, b)
+        if np.any(loc >= eliminated.size) or \
+                np.any(eliminated[np.minimum(loc, eliminated.size - 1)] != b):
+            return None
+        block_of_slave[loc] = i
+        sizes[i] = b.size
+    # The inversion requires blocks of contiguous slaves, ordered as the
+    # blocks.
+    if np.any(np.diff(block_of_slave) < 0) or np.any(block_of_slave < 0):
+        return None
+    A_ss = sps.coo_matrix(A_ss)
+    if np.any(block_of_slave[A_ss.row] != block_of_slave[A_ss.col]):
+        return None
+
+    # Imported here to avoid a circular import through GridBucket
+    from porepy.numerics.fv import fvutils
+    return fvutils.invert_diagonal_blocks(sps.csr_matrix(A_ss),
+                                          sizes[sizes > 0])
+
+
+def _sparse_outer_products(P, Q):
+    """
+    Compute P * Q as the sum of the outer products of the columns of P and
+    the rows of Q, assembled directly in coo format.
+
+    This is efficient when P has few nonzeros per column and Q few nonzeros
+    per row, which is the case for the coupling between slave and master dofs
+    in the static condensation.
+
+    Parameters:
+        P (sps.csc_matrix): Left factor.
+        Q (sps.csr_matrix): Right factor.
+
+    Returns:
+        sps.csr_matrix: The product.
+
+    """
+    P = sps.csc_matrix(P)
+    Q = sps.csr_matrix(Q)
+    num_p = np.diff(P.indptr)
+    num_q = np.diff(Q.indptr)
+    # Number of products for each slave
+    num_prod = num_p * num_q
+    num_tot = num_prod.sum()
+
+    slave = np.repeat(np.arange(num_prod.size), num_prod)
+    local = np.arange(num_tot) - np.repeat(np.cumsum(num_prod) - num_prod,
+                                           num_prod)
+    ind_p = P.indptr[slave] + local // num_q[slave]
+    ind_q = Q.indptr[slave] + local % num_q[slave]
+
+    return sps.coo_matrix((P.data[ind_p] * Q.data[ind_q],
+                           (P.indices[ind_p], Q.indices[ind_q])),
+                          shape=(P.shape[0], Q.shape[1])).tocsr()
+
+
 def new_coupling_fluxes(gb_old, gb_el, neighbours_old, neighbours_el, node_old): 
     """ 
     Adds new coupling_flux data fields to the new gb edges arising through  
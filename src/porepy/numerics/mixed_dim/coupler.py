@@ -12,6 +12,8 @@ and puts submatrices in their right places.
 import numpy as np
 import scipy.sparse as sps
 
+from porepy.utils import sparse_mat
+
 
 class Coupler(object):
 
@@ -42,6 +44,17 @@ class Coupler(object):
         else:
             self.coupling_fct = coupling.matrix_rhs
 
+        # If True, the caller guarantees that the sparsity structure of the
+        # blocks is the same in all calls to matrix_rhs(), and the structure
+        # is not compared. See self._assemble().
+        self.constant_structure = kwargs.get('constant_structure', False)
+
+        # Sparsity pattern of the global matrix, with the structure of the
+        # blocks it was assembled from, see self._assemble()
+        self._pattern = None
+        self._block_structure = None
+        self._block_indices = None
+
 #------------------------------------------------------------------------------#
 
     def ndof(self, gb):
@@ -81,41 +94,95 @@ class Coupler(object):
         matrix: sparse matrix from the discretization.
         rhs: array right-hand side of the problem.
         """
-        self.ndof(gb)
+        dofs = self._dof_start_of_grids(gb)
 
-        # Initialize the global matrix and rhs to store the local problems
-        matrix = np.empty((gb.size(), gb.size()), dtype=np.object)
-        rhs = np.empty(gb.size(), dtype=np.object)
-        for g_i, d_i in gb:
-            pos_i = d_i['node_number']
-            rhs[pos_i] = np.empty(d_i['dof'])
-            for g_j, d_j in gb:
-                pos_j = d_j['node_number']
-                matrix[pos_i, pos_j] = sps.coo_matrix((d_i['dof'], d_j['dof']))
+        # The blocks of the global matrix, with their block row and column
+        blocks = []
+
+        def add_block(block, pos_i, pos_j):
+            blocks.append((block, pos_i, pos_j))
 
         # Loop over the grids and compute the problem matrix
+        rhs = np.empty(gb.size(), dtype=np.object)
         for g, data in gb:
             pos = data['node_number']
-            matrix[pos, pos], rhs[pos] = self.discr_fct(g, data)
+            block, rhs[pos] = self.discr_fct(g, data)
+            add_block(block, pos, pos)
 
         # Handle special case of 1-element grids, that give 0-d arrays
         rhs = np.array([np.atleast_1d(a) for a in tuple(rhs)])
 
-        # if the coupling conditions are not given fill only the diagonal part
-        if self.coupling_fct is None:
-            return sps.bmat(matrix, matrix_format), np.concatenate(tuple(rhs))
-
         # Loop over the edges of the graph (pair of connected grids) to compute
-        # the coupling conditions
-        for e, data in gb.edges_props():
-            g_l, g_h = gb.sorted_nodes_of_edge(e)
-            pos_l, pos_h = gb.nodes_prop([g_l, g_h], 'node_number')
-            idx = np.ix_([pos_h, pos_l], [pos_h, pos_l])
-
-            data_l, data_h = gb.node_props(g_l), gb.node_props(g_h)
-            matrix[idx] += self.coupling_fct(g_h, g_l, data_h, data_l, data)
-
-        return sps.bmat(matrix, matrix_format), np.concatenate(tuple(rhs))
+        # the coupling conditions. If the coupling conditions are not given
+        # fill only the diagonal part
+        if self.coupling_fct is not None:
+            for e, data in gb.edges_props():
+                g_l, g_h = gb.sorted_nodes_of_edge(e)
+                pos = gb.nodes_prop([g_h, g_l], 'node_number')
+
+                data_l, data_h = gb.node_props(g_l), gb.node_props(g_h)
+                cc = self.coupling_fct(g_h, g_l, data_h, data_l, data)
+                if cc.size == 1:
+                    # Coupling of a grid with itself, all contributions are
+                    # given as a single block
+                    add_block(cc.ravel()[0], pos[0], pos[0])
+                    continue
+                for i in range(2):
+                    for j in range(2):
+                        add_block(cc[i, j], pos[i], pos[j])
+
+        matrix = self._assemble(blocks, dofs)
+        return matrix.asformat(matrix_format), np.concatenate(tuple(rhs))
+
+    def _assemble(self, blocks, dofs):
+        """ Assemble the global matrix from its blocks.
+
+        The sparsity pattern of the global matrix, together with the map from
+        the data arrays of the (csr) blocks to the global data array, is
+        computed on the first call, and kept for later calls. As long as the
+        structure of the blocks is unchanged (e.g. in time stepping), the
+        assembly reduces to a scatter of the block values into the global
+        data array. If the structure changes, a new pattern is computed.
+
+        The block shapes and numbers of nonzeros are always compared with
+        those of the stored pattern. The indices of the blocks are compared
+        only if self.constant_structure is False.
+        """
+        csr_blocks = []
+        for block, _, _ in blocks:
+            block = sps.csr_matrix(block)
+            if not block.has_canonical_format:
+                block = block.copy()
+                block.sum_duplicates()
+            csr_blocks.append(block)
+        structure = [(b.shape, b.nnz, i, j)
+                     for b, (_, i, j) in zip(csr_blocks, blocks)]
+
+        unchanged = self._pattern is not None \
+            and structure == self._block_structure
+        if unchanged and not self.constant_structure:
+            unchanged = all(np.array_equal(b.indptr, indptr) and
+                            np.array_equal(b.indices, indices)
+                            for b, (indptr, indices)
+                            in zip(csr_blocks, self._block_indices))
+
+        if not unchanged:
+            rows, cols = [], []
+            for b, (_, i, j) in zip(csr_blocks, blocks):
+                rows.append(dofs[i] + np.repeat(np.arange(b.shape[0]),
+                                                np.diff(b.indptr)))
+                cols.append(dofs[j] + b.indices)
+            self._pattern = sparse_mat.CsrPattern(np.hstack(rows),
+                                                  np.hstack(cols),
+                                                  (dofs[-1], dofs[-1]))
+            self._block_structure = structure
+            if self.constant_structure:
+                self._block_indices = None
+            else:
+                self._block_indices = [(b.indptr.copy(), b.indices.copy())
+                                       for b in csr_blocks]
+
+        return self._pattern.matrix(np.hstack([b.data for b in csr_blocks]))
 
 #------------------------------------------------------------------------------#
 
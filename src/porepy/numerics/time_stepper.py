@@ -1,8 +1,9 @@
 import numpy as np
+import scipy.sparse as sps
 import logging
 
 from porepy.grids.grid_bucket import GridBucket
-from porepy.numerics.linalg.linsolve import Factory as LSFactory
+from porepy.numerics.linalg.linsolve import FactorizationCache
 
 
 logger = logging.getLogger(__name__)
@@ -52,7 +53,11 @@ class AbstractSolver(object):
         self.lhs = []
         self.rhs = []
 
-        self.parameters = {'store_results': False, 'verbose': False}
+        self.parameters = {'store_results': False, 'verbose': False,
+                           'constant_lhs': False}
+        # LU factorization of the left hand side, reused as long as the left
+        # hand side is unchanged.
+        self.factorization = FactorizationCache()
 
     def solve(self):
         """
@@ -76,10 +81,16 @@ class AbstractSolver(object):
 
     def step(self):
         """
-        Take one time step
+        Take one time step.
+
+        The factorization of the left hand side is reused from the previous
+        step if the left hand side is unchanged, or if
+        self.parameters['constant_lhs'] is True (in which case the user
+        guarantees that the left hand side does not change in time).
         """
-        ls = LSFactory()
-        self.p = ls.direct(self.lhs, self.rhs)
+        solve = self.factorization.solver(self.lhs,
+                                          self.parameters['constant_lhs'])
+        self.p = solve(self.rhs)
         return self.p
 
     def update(self, t):
@@ -148,6 +159,8 @@ class BDF2(AbstractSolver):
         self.flag_first = True
         AbstractSolver.__init__(self, problem)
         self.p_1 = self.p0
+        # Type of step (first or not) of the factorized left hand side
+        self._factorized_first = None
 
     def update(self, t):
         """
@@ -173,6 +186,20 @@ class BDF2(AbstractSolver):
             bdf2_rhs = 4. / 3 * lhs_time * self.p0 - 1. / 3 * lhs_time * self.p_1
             self.rhs = bdf2_rhs + 2. / 3 * rhs_flux + rhs_time
 
+    def step(self):
+        """
+        Take one time step.
+
+        The first step is an implicit Euler step, with a left hand side that
+        differs from that of the later steps. The factorization is therefore
+        not reused between the two kinds of steps, also if
+        self.parameters['constant_lhs'] is True.
+        """
+        if self.flag_first != self._factorized_first:
+            self.factorization.clear()
+            self._factorized_first = self.flag_first
+        return AbstractSolver.step(self)
+
 
 class Explicit(AbstractSolver):
     """
@@ -207,6 +234,97 @@ class Explicit(AbstractSolver):
         self.rhs = (lhs_time - lhs_flux) * self.p0 + rhs_flux + rhs_time
 
 
+class LinearExplicit(Explicit):
+    """
+    Explicit time discretization for linear problems where the space and time
+    discretizations, and the right hand side, are constant in time, e.g.
+    upwind transport with a fixed discharge field and constant sources:
+        y_k = U y_k-1 + c,  U = M^-1 (M - A),  c = M^-1 b
+    Here M is the time (mass) matrix, A the space discretization and b the sum
+    of the right hand sides.
+
+    The update operator is assembled once, in the first time step, and the
+    time loop then reduces to matrix-vector products. The problem is not
+    updated during the time loop. If the mass matrix is not diagonal, its
+    factorization is reused in all steps.
+
+    If self.parameters['store_results'] is True, the solution is stored every
+    self.parameters['store_interval'] step, starting with the initial
+    condition. The times stored are those of the stored solutions.
+    """
+
+    def __init__(self, problem):
+        Explicit.__init__(self, problem)
+        self.parameters['store_interval'] = 1
+        # Update operator and vector, see assemble_update_operator()
+        self.update_operator = None
+        self.update_vector = None
+        self._mass_solve = None
+
+    def assemble_update_operator(self):
+        """
+        Assemble the update operator U and vector c, see class documentation.
+        """
+        lhs_flux, rhs_flux = self._discretize(self.space_disc)
+        lhs_time, rhs_time = self._discretize(self.time_disc)
+        mass = sps.csr_matrix(lhs_time)
+        rhs = rhs_flux + rhs_time
+
+        self.lhs = mass
+        self.rhs = rhs
+        diag = mass.diagonal()
+        off_diag = (mass - sps.diags(diag, 0)).tocsr()
+        off_diag.eliminate_zeros()
+        if off_diag.nnz == 0:
+            inv_mass = sps.diags(1. / diag, 0)
+            self.update_operator = (inv_mass * (mass - lhs_flux)).tocsr()
+            self.update_vector = inv_mass * rhs
+            self._mass_solve = None
+        else:
+            # The inverse of the mass matrix is not sparse. Keep the
+            # factorization instead.
+            self.update_operator = (mass - lhs_flux).tocsr()
+            self._mass_solve = self.factorization.solver(mass)
+            self.update_vector = self._mass_solve(rhs)
+
+    def solve(self):
+        """
+        Solve problem.
+        """
+        self.problem.update(0.0)
+        self.assemble_update_operator()
+
+        store = self.parameters['store_results']
+        interval = self.parameters['store_interval']
+        physics = self.problem.physics
+        U = self.update_operator
+        c = self.update_vector
+        mass_solve = self._mass_solve
+
+        p = self.p
+        p0 = self.p0
+        t = 0.0
+        counter = 0
+        while t < self.T - self.dt + 1e-14:
+            if store and counter % interval == 0:
+                self.data[physics].append(p)
+                self.data['times'].append(t)
+            p0 = p
+            if mass_solve is None:
+                p = U * p + c
+            else:
+                p = mass_solve(U * p) + c
+            t += self.dt
+            counter += 1
+
+        if store and counter % interval == 0:
+            self.data[physics].append(p)
+            self.data['times'].append(t)
+        self.p = p
+        self.p0 = p0
+        return self.data
+
+
 class CrankNicolson(AbstractSolver):
     """
     Crank-Nicolson time discretization:
@@ -13,6 +13,7 @@ from porepy.params import tensor
 from porepy.numerics.mixed_dim.solver import Solver, SolverMixedDim
 from porepy.numerics.mixed_dim.coupler import Coupler
 from porepy.numerics.mixed_dim.abstract_coupling import AbstractCoupling
+from porepy.numerics.linalg.saddle_point import SaddlePointSolver
 
 from porepy.utils import comp_geom as cg
 
@@ -29,6 +30,30 @@ class DualVEMMixedDim(SolverMixedDim):
 
         self.solver = Coupler(self.discr, self.coupling_conditions)
 
+    def saddle_point_solver(self, gb, A, **kwargs):
+        """
+        Return an iterative solver for the saddle point system assembled by
+        self.matrix_rhs, with a block preconditioner based on a diagonal
+        approximation of the mass matrix and an amg solved approximation of
+        the Schur complement. See
+        porepy.numerics.linalg.saddle_point.SaddlePointSolver for details.
+
+        Parameters
+        ----------
+        gb: grid bucket, or a subclass.
+        A: the matrix of the system, as given by self.matrix_rhs.
+        **kwargs: passed on to SaddlePointSolver.
+
+        Return
+        ------
+        solver: SaddlePointSolver, takes the right-hand side and returns the
+            solution.
+        """
+        is_u = np.zeros(A.shape[0], dtype=np.bool)
+        for g, _ in gb:
+            is_u[self.solver.dof_of_grid(gb, g)[:g.num_faces]] = True
+        return SaddlePointSolver.from_matrix(A, is_u, **kwargs)
+
     def extract_u(self, gb, up, u):
         gb.add_node_props([u])
         for g, d in gb:
@@ -231,9 +256,6 @@ class DualVEM(Solver):
         weight: if bc_weight is True return the weight computed.
 
         """
-        # Allow short variable names in backend function
-        # pylint: disable=invalid-name
-
         # If a 0-d grid is given then we return an identity matrix
         if g.dim == 0:
             M = sps.dia_matrix(([1, 0], 0), (self.ndof(g), self.ndof(g)))
@@ -241,6 +263,43 @@ class DualVEM(Solver):
                 return M, 1
             return M
 
+        mass, grad, div, norm = self.matrix_blocks(g, data, bc_weight)
+        M = sps.bmat([[mass, grad],
+                      [ div,  None]], format='csr')
+
+        if bc_weight:
+            return M, norm
+        return M
+
+#------------------------------------------------------------------------------#
+
+    def matrix_blocks(self, g, data, bc_weight=False):
+        """
+        Return the blocks of the saddle point matrix of the dual virtual
+        element method, [[mass, grad], [div, 0]], where the boundary
+        conditions are imposed. See self.matrix_rhs for a detaild
+        description.
+
+        Parameters
+        ----------
+        g : grid, or a subclass, with geometry fields computed. Should not
+            be a 0-d grid.
+        data: dictionary to store the data.
+        bc_weight: to compute the infinity norm of the mass matrix and use it
+            as a weight to impose the boundary conditions. Default False.
+
+        Return
+        ------
+        mass: sparse csr (g.num_faces, g.num_faces) H(div) mass matrix.
+        grad: sparse csr (g.num_faces, g.num_cells) Transpose of the
+            divergence, with the rows of Neumann faces set to zero.
+        div: sparse csr (g.num_cells, g.num_faces) Divergence.
+        weight: the weight used to impose the boundary conditions.
+
+        """
+        # Allow short variable names in backend function
+        # pylint: disable=invalid-name
+
         # Retrieve the permeability, boundary conditions, and aperture
         # The aperture is needed in the hybrid-dimensional case, otherwise is
         # assumed unitary
@@ -302,23 +361,60 @@ class DualVEM(Solver):
             idx += cols.size
 
         # Construct the global matrices
-        mass = sps.coo_matrix((dataIJ, (I, J)))
+        mass = sps.coo_matrix((dataIJ, (I, J)), shape=(g.num_faces,)*2)
         div = -g.cell_faces.T
-        M = sps.bmat([[mass, div.T],
-                      [ div,  None]], format='csr')
+        grad = div.T
 
         norm = sps.linalg.norm(mass, np.inf) if bc_weight else 1
 
         # assign the Neumann boundary conditions
         if bc and np.any(bc.is_neu):
-            is_neu = np.hstack((bc.is_neu,
-                                np.zeros(g.num_cells, dtype=np.bool)))
-            M[is_neu, :] *= 0
-            M[is_neu, is_neu] = norm
+            # Replace the rows of the Neumann faces by the identity, scaled
+            # by norm
+            keep = sps.dia_matrix((np.logical_not(bc.is_neu).astype(np.float),
+                                   0), shape=mass.shape)
+            mass = keep * mass + sps.dia_matrix((norm * bc.is_neu, 0),
+                                                shape=mass.shape)
+            grad = keep * grad
 
-        if bc_weight:
-            return M, norm
-        return M
+        return sps.csr_matrix(mass), sps.csr_matrix(grad), \
+            sps.csr_matrix(div), norm
+
+#------------------------------------------------------------------------------#
+
+    def saddle_point_solver(self, g, data, **kwargs):
+        """
+        Return an iterative solver for the saddle point system, with a block
+        preconditioner based on a diagonal approximation of the mass matrix
+        and an amg solved approximation of the Schur complement, and the
+        right-hand side. The mass and divergence matrices are kept as separate
+        blocks, and the full system matrix is never assembled. See
+        porepy.numerics.linalg.saddle_point.SaddlePointSolver for details.
+
+        Parameters
+        ----------
+        g : grid, or a subclass, with geometry fields computed.
+        data: dictionary to store the data.
+        **kwargs: passed on to SaddlePointSolver, e.g. method ('gmres' or
+            'minres'), mass_approx ('diagonal' or 'lumped') and tol.
+
+        Return
+        ------
+        solver: SaddlePointSolver, takes the right-hand side and returns the
+            solution, stored as [velocity,pressure].
+        rhs: array (g.num_faces+g_num_cells)
+            Right-hand side which contains the boundary conditions and the
+            scalar source term.
+
+        Examples
+        --------
+        slv, rhs = dual.saddle_point_solver(g, data, method='minres')
+        up = slv(rhs)
+
+        """
+        mass, grad, div, norm = self.matrix_blocks(g, data, bc_weight=True)
+        return SaddlePointSolver(mass, grad, div, **kwargs), \
+            self.rhs(g, data, norm)
 
 #------------------------------------------------------------------------------#
 
@@ -0,0 +1,243 @@
+"""
+Compiled kernels for loops that are too slow in pure python.
+
+The kernels are compiled with numba, if available. Compilation is done the
+first time a kernel is requested, and the compiled code is cached on disk
+(numba's cache=True), so that later processes only pay the cost of loading
+the kernel. To move the compilation out of a time critical part of the code,
+call warm_up() first.
+
+If numba is not available, requesting a kernel raises an ImportError, and the
+caller is expected to fall back on a pure python implementation. Use
+backend() to check which backend will be used.
+
+Kernels currently available:
+    inv_diagonal_blocks: Inversion of block diagonal matrices in csr format,
+        used by porepy.numerics.fv.fvutils.invert_diagonal_blocks().
+    point_ind: Ordering of the nodes of polyhedral cells, used by the vtk
+        exporter.
+
+"""
+import logging
+import os
+import numpy as np
+
+try:
+    import numba
+    from numba import prange
+except ImportError:
+    numba = None
+    prange = range
+
+# Module-wide logger
+logger = logging.getLogger(__name__)
+
+
+def _inv_diagonal_blocks(indptr, ind, data, sz):
+    """
+    Invert block matrices by explicitly forming local matrices. The code
+    in itself is not efficient, but it is hopefully well suited for
+    speeding up with numba.
+
+    The blocks are independent, and are inverted in parallel.
+    """
+    # Index of where the rows start for each block.
+    block_row_starts_ind = np.zeros(sz.size, dtype=np.int64)
+    block_row_starts_ind[1:] = np.cumsum(sz[:-1])
+
+    # Number of columns per row. Will change from one column to the next
+    num_cols_per_row = indptr[1:] - indptr[0:-1]
+    # Index to where the columns start for each row (NOT blocks)
+    row_cols_start_ind = np.zeros(num_cols_per_row.size + 1, dtype=np.int64)
+    row_cols_start_ind[1:] = np.cumsum(num_cols_per_row)
+
+    # Index to where the (full) data starts. Needed, since the inverse matrix
+    # will generally be full
+    full_block_starts_ind = np.zeros(sz.size + 1, dtype=np.int64)
+    full_block_starts_ind[1:] = np.cumsum(np.square(sz))
+    # Structure to store the solution
+    inv_vals = np.zeros(np.sum(np.square(sz)))
+
+    # Loop over all blocks
+    for iter1 in prange(sz.size):
+        n = sz[iter1]
+        loc_mat = np.zeros((n, n))
+        # Fill in non-zero elements in local matrix
+        for iter2 in range(n):  # Local rows
+            global_row = block_row_starts_ind[iter1] + iter2
+            data_counter = row_cols_start_ind[global_row]
+
+            # Loop over local columns.
+            for _ in range(num_cols_per_row[global_row]):
+                loc_col = ind[data_counter] - block_row_starts_ind[iter1]
+                loc_mat[iter2, loc_col] = data[data_counter]
+                data_counter += 1
+
+        inv_mat = np.ravel(np.linalg.inv(loc_mat))
+
+        start = full_block_starts_ind[iter1]
+        for iter2 in range(n * n):
+            inv_vals[start + iter2] = inv_mat[iter2]
+    return inv_vals
+
+
+def _point_ind(cell_ptr, face_ptr, faces_cells, nodes_faces, nodes, fc,
+               normals, num_cell_nodes):
+    """ Implementation note: This turned out to be less than pretty, and quite
+    a bit more explicit than the corresponding pure python implementation
+    in the exporter. The process was basically to circumvent whatever
+    statements numba did not like.
+    """
+    cell_nodes = np.zeros(num_cell_nodes.sum(), dtype=np.int32)
+    counter = 0
+    for ci in range(cell_ptr.size - 1):
+        loc_c = slice(cell_ptr[ci], cell_ptr[ci + 1])
+        for fi in faces_cells[loc_c]:
+            loc_f = np.arange(face_ptr[fi], face_ptr[fi+1])
+            ptsId = nodes_faces[loc_f]
+            num_p_loc = ptsId.size
+            nodes_loc = np.zeros((3, num_p_loc))
+            for iter1 in range(num_p_loc):
+                nodes_loc[:, iter1] = nodes[:, ptsId[iter1]]
+            # Sort points. Cut-down version of
+            # sort_points.sort_points_plane() and subfunctions
+            reference = np.array([0., 0., 1])
+            angle = np.arccos(np.dot(normals[:, fi], reference))
+            # Hand code cross product, not supported by current numba version
+            vect = np.array([normals[1, fi] * reference[2]
+                             - normals[2, fi] * reference[1],
+                             normals[2, fi] * reference[0]
+                             - normals[0, fi] * reference[2],
+                             normals[0, fi] * reference[1]
+                             - normals[1, fi] * reference[0]
+                             ], dtype=np.float64)
+            # Cut-down version of cg.rot()
+            W = np.array([0., -vect[2], vect[1],
+                          vect[2], 0., -vect[0],
+                          -vect[1], vect[0], 0.]).reshape((3, 3))
+            R = np.identity(3) + np.sin(angle) * W + \
+                ((1. - np.cos(angle))
+                 * np.linalg.matrix_power(W, 2).ravel()).reshape((3, 3))
+            # pts is now a 3 x npt matrix
+            num_p = nodes_loc.shape[1]
+            pts = np.zeros((3, num_p))
+            fc_loc = fc[:, fi]
+            center = np.zeros(3)
+            for i in range(3):
+                center[i] = R[i, 0] * fc_loc[0] + R[i, 1] * fc_loc[1] + \
+                    R[i, 2] * fc_loc[2]
+            for i in range(num_p):
+                for j in range(3):
+                    pts[j, i] = R[j, 0] * nodes_loc[0, i] \
+                        + R[j, 1] * nodes_loc[1, i] \
+                        + R[j, 2] * nodes_loc[2, i]
+            # Distance from projected points to center
+            delta = 0 * pts
+            for i in range(num_p):
+                delta[:, i] = pts[:, i] - center
+            nrm = np.sqrt(delta[0]**2 + delta[1]**2)
+            for i in range(num_p):
+                delta[:, i] = delta[:, i] / nrm[i]
+
+            argsort = np.argsort(np.arctan2(delta[0], delta[1]))
+            cell_nodes[counter:(counter+num_p_loc)] = ptsId[argsort]
+            counter += num_p_loc
+
+    return cell_nodes
+
+
+# Python implementation, signatures and numba options for each kernel. The
+# signatures cover both 32 and 64 bit indices of scipy sparse matrices.
+_kernel_definitions = {
+    'inv_diagonal_blocks': (_inv_diagonal_blocks,
+                            ["f8[:](i4[:],i4[:],f8[:],i8[:])",
+                             "f8[:](i8[:],i8[:],f8[:],i8[:])"],
+                            {'parallel': True}),
+    'point_ind': (_point_ind,
+                  ["i4[:](i4[:],i4[:],i4[:],i4[:],f8[:,:],f8[:,:],f8[:,:],"
+                   "i4[:])"],
+                  {}),
+}
+
+# Kernels compiled in this process
+_compiled = {}
+
+
+def backend():
+    """ Name of the backend used for the kernels, either 'numba' or 'python'.
+    """
+    if numba is None:
+        return 'python'
+    return 'numba'
+
+
+def _launch_threads():
+    """ Start the threads used by numba for parallel kernels.
+
+    numba chooses its threading layer when the threads are started, with TBB
+    as the first choice. A process that has run a parallel kernel with TBB,
+    and then forks worker processes (as mpfa does when discretizing in
+    parallel), may hang on exit. Unless the user has chosen the layer, either
+    through numba.config or the environment variables NUMBA_THREADING_LAYER
+    and NUMBA_THREADING_LAYER_PRIORITY, OpenMP and workqueue are therefore
+    preferred here. The numba configuration is restored afterwards; nothing
+    is changed if the threads are already running.
+    """
+    config = numba.config
+    if config.THREADING_LAYER != 'default' or \
+            'NUMBA_THREADING_LAYER_PRIORITY' in os.environ:
+        return
+    priority = config.THREADING_LAYER_PRIORITY
+    config.THREADING_LAYER_PRIORITY = ['omp', 'workqueue', 'tbb']
+    try:
+        numba.get_num_threads()
+    finally:
+        config.THREADING_LAYER_PRIORITY = priority
+
+
+def get(name):
+    """
+    Get a compiled kernel, compile (or load from the disk cache) if necessary.
+
+    Parameters:
+        name (str): Name of the kernel. See module documentation for
+            available kernels.
+
+    Returns:
+        function: The compiled kernel.
+
+    Raises:
+        ImportError if numba is not available.
+        KeyError if the kernel is unknown.
+
+    """
+    if numba is None:
+        raise ImportError('Numba not available on the system')
+    if name not in _compiled:
+        func, signatures, options = _kernel_definitions[name]
+        logger.info('Compile numba kernel ' + name)
+        if options.get('parallel', False):
+            _launch_threads()
+        _compiled[name] = numba.jit(signatures, nopython=True, nogil=False,
+                                    cache=True, **options)(func)
+    return _compiled[name]
+
+
+def warm_up(names=None):
+    """
+    Compile kernels, or load them from the disk cache, ahead of use.
+
+    Parameters:
+        names (list of str, optional): Kernels to compile. Defaults to all
+            available kernels.
+
+    Returns:
+        str: Backend that will be used for the kernels, see backend().
+
+    """
+    if names is None:
+        names = sorted(_kernel_definitions.keys())
+    if numba is not None:
+        for name in names:
+            get(name)
+    return backend()
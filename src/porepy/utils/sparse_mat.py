@@ -234,3 +234,105 @@ def slice_mat(A, ind):
         return sps.csc_matrix((data, indices, indptr), shape=(A.shape[0], N))
     elif A.getformat() == 'csr':
         return sps.csr_matrix((data, indices, indptr), shape=(N, A.shape[1]))
+
+
+def csr_equal(A, B):
+    """
+    Check if two csr matrices are identical, that is, have the same shape,
+    sparsity structure and values. The comparison is done on the storage
+    arrays, thus the matrices should have summed duplicates (and sorted
+    indices), as is the case for matrices assembled by scipy.
+
+    Parameters
+    ----------
+    A (scipy.sparse.csr_matrix): A sparse matrix.
+    B (scipy.sparse.csr_matrix): A sparse matrix, or None.
+
+    Returns
+    -------
+    boolean: True if the matrices are identical, False if not, or if B is
+        None.
+    """
+    if B is None or A.shape != B.shape:
+        return False
+    return np.array_equal(A.indptr, B.indptr) \
+        and np.array_equal(A.indices, B.indices) \
+        and np.array_equal(A.data, B.data)
+
+
+class CsrPattern(object):
+    """
+    Sparsity pattern of a csr matrix assembled from coo triplets, together
+    with the map from the triplets to the csr data array.
+
+    The pattern is intended for repeated assembly of matrices with the same
+    structure, but changing values: The sorting and summation of duplicates
+    done by scipy when converting from coo to csr format is then done only
+    once, and later assemblies reduce to a scatter of the values into the
+    csr data array.
+
+    Attributes:
+        shape (tuple of int): Shape of the matrix.
+        rows, cols (np.ndarray of int): Row and column indices of the coo
+            triplets the pattern was constructed from.
+        indices, indptr (np.ndarray of int): Indices and index pointers of
+            the csr matrix.
+        position (np.ndarray of int): Position in the csr data array of each
+            of the coo triplets.
+
+    """
+
+    def __init__(self, rows, cols, shape):
+        self.shape = tuple(shape)
+        self.rows = np.asarray(rows)
+        self.cols = np.asarray(cols)
+
+        pattern = sps.coo_matrix((np.ones(self.rows.size),
+                                  (self.rows, self.cols)),
+                                 shape=self.shape).tocsr()
+        pattern.sort_indices()
+        self.indices = pattern.indices
+        self.indptr = pattern.indptr
+
+        # Linear index of the elements in the pattern. These are sorted, since
+        # the csr storage is.
+        pattern_rows = np.repeat(np.arange(self.shape[0], dtype=np.int64),
+                                 np.diff(self.indptr))
+        linear = pattern_rows * self.shape[1] + self.indices
+        self.position = np.searchsorted(linear, self.rows.astype(np.int64)
+                                        * self.shape[1] + self.cols)
+
+    def matches(self, rows, cols, shape):
+        """ Check if coo triplets have the structure of this pattern.
+
+        Parameters:
+            rows, cols (np.ndarray of int): Row and column indices.
+            shape (tuple of int): Shape of the matrix.
+
+        Returns:
+            boolean: True if the triplets are equal to those of the pattern.
+
+        """
+        return tuple(shape) == self.shape and rows.size == self.rows.size \
+            and np.array_equal(rows, self.rows) \
+            and np.array_equal(cols, self.cols)
+
+    def matrix(self, vals):
+        """ Assemble a matrix with this pattern.
+
+        Parameters:
+            vals (np.ndarray): Values of the coo triplets, in the ordering
+                used to construct the pattern. Duplicates are summed.
+
+        Returns:
+            sps.csr_matrix: The assembled matrix.
+
+        """
+        data = np.bincount(self.position, weights=vals,
+                           minlength=self.indices.size)
+        # Copy the index arrays, so that in-place operations on the matrix
+        # (e.g. eliminate_zeros) do not destroy the pattern.
+        mat = sps.csr_matrix((data, self.indices.copy(), self.indptr.copy()),
+                             shape=self.shape)
+        mat.has_sorted_indices = True
+        return mat
@@ -1,7 +1,9 @@
 import numpy as np
+import scipy.sparse.linalg as spl
 import unittest
 
 from porepy.numerics import elliptic
+from porepy.numerics.linalg import solver_policy
 from porepy.grids.structured import CartGrid
 from porepy.fracs import meshing
 from porepy.params.data import Parameters
@@ -92,6 +94,78 @@ class BasicsTest(unittest.TestCase):
             p_diff = pressure - p_analytic
             assert np.max(np.abs(p_diff)) < 0.033
 
+    @unittest.skipIf(not hasattr(spl, 'gcrotmk'),
+                     'scipy does not provide gcrotmk')
+    def test_iterative_solver_reuse(self):
+        gb = setup_2d_1d([10, 10])
+        problem = elliptic.EllipticModel(gb)
+        p_direct = problem.solve()
+
+        for krylov in ['gmres', 'gcrotmk']:
+            problem.clear_solver()
+            problem.solve(max_direct=0, krylov=krylov, tol=1e-10)
+            precond = problem._precond
+            assert np.allclose(problem.x, p_direct)
+            # Unchanged system: The preconditioner is kept, and the previous
+            # solution is a good initial guess.
+            problem.solve(max_direct=0, krylov=krylov, tol=1e-10)
+            assert problem._precond is precond
+            assert problem.iterations[-1] < problem.iterations[-2]
+
+        # Changed boundary values, the preconditioner is kept
+        for g, d in gb:
+            if g.dim == 2:
+                d['param'].set_bc_val('flow', 2 * g.face_centers[1])
+        p = problem.solve(max_direct=0, krylov='gcrotmk', tol=1e-10)
+        assert problem._precond is precond
+        assert np.allclose(p, 2 * p_direct)
+
+#------------------------------------------------------------------------------#
+
+    def test_gcrotmk_missing(self):
+        # Emulate a version of scipy without gcrotmk
+        gb = setup_2d_1d([4, 4])
+        problem = elliptic.EllipticModel(gb)
+        gcrotmk = getattr(spl, 'gcrotmk', None)
+        if gcrotmk is not None:
+            del spl.gcrotmk
+        try:
+            self.assertRaises(ValueError, problem.solve, max_direct=0,
+                              krylov='gcrotmk')
+        finally:
+            if gcrotmk is not None:
+                spl.gcrotmk = gcrotmk
+
+#------------------------------------------------------------------------------#
+
+    def test_solver_policy_history(self):
+        gb = setup_2d_1d([10, 10])
+        problem = elliptic.EllipticModel(gb)
+        problem.solve()
+        rec = problem.solver_policy.history[-1]
+        assert rec['solver'] == 'direct'
+        assert rec['n'] == problem.rhs.size
+        assert rec['dim'] == 2
+
+#------------------------------------------------------------------------------#
+
+    def test_calibrated_solver_policy(self):
+        # The default policy is the fixed threshold, the calibrated policy
+        # must be asked for.
+        gb = setup_2d_1d([10, 10])
+        problem = elliptic.EllipticModel(gb)
+        assert isinstance(problem.solver_policy,
+                          solver_policy.ThresholdPolicy)
+
+        policy = solver_policy.SolverPolicy(calibrate=False)
+        problem = elliptic.EllipticModel(gb, solver_policy=policy)
+        p = problem.solve()
+        assert problem.solver_policy is policy
+        assert len(policy.history) == 1
+        assert np.allclose(problem.lhs * p, problem.rhs)
+
+#------------------------------------------------------------------------------#
+
     def test_elliptic_dirich_neumann_source_sink_cart(self):
         gb = setup_3d(np.array([4, 4, 4]), simplex_grid=False)
         problem = elliptic.EllipticModel(gb)
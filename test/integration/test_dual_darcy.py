@@ -101,6 +101,21 @@ class BasicsTest(unittest.TestCase):
             p_diff = pressure - p_analytic
             assert np.max(np.abs(p_diff)) < 0.0004
 
+#------------------------------------------------------------------------------#
+
+    def test_elliptic_uniform_flow_cart_iterative(self):
+        gb = setup_2d_1d([10, 10])
+        problem = elliptic.DualEllipticModel(gb)
+        problem.solve(max_direct=0, tol=1e-12)
+        problem.split()
+        problem.pressure('pressure')
+
+        for g, d in gb:
+            pressure = d['pressure']
+            p_analytic = g.cell_centers[1]
+            p_diff = pressure - p_analytic
+            assert np.max(np.abs(p_diff)) < 0.0004
+
 #------------------------------------------------------------------------------#
 
     def test_elliptic_uniform_flow_simplex(self):
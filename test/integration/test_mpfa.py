@@ -156,6 +156,31 @@ def test_uniform_flow_cart_2d_pert():
     assert np.max(np.abs(p_diff)) < 1e-8
 
 
+def test_ensemble_equals_single_discretizations():
+    g = structured.CartGrid([4, 4])
+    g.compute_geometry()
+    bound_faces = g.get_boundary_faces().ravel()
+    bnd = bc.BoundaryCondition(g, bound_faces, ['dir'] * bound_faces.size)
+
+    np.random.seed(0)
+    perms = [tensor.SecondOrder(g.dim, kxx=np.exp(np.random.randn(
+        g.num_cells)), kyy=np.ones(g.num_cells)) for _ in range(3)]
+
+    fluxes, bound_fluxes = mpfa.mpfa_ensemble(g, perms, bnd)
+    for k, flux, bound_flux in zip(perms, fluxes, bound_fluxes):
+        flux_single, bound_single = mpfa.mpfa(g, k, bnd)
+        assert np.allclose((flux - flux_single).A, 0)
+        assert np.allclose((bound_flux - bound_single).A, 0)
+        # The sparsity pattern is shared between the realizations
+        assert np.all(flux.indices == fluxes[0].indices)
+        assert np.all(flux.indptr == fluxes[0].indptr)
+
+    # Process parallel discretization gives the same result
+    fluxes_par, _ = mpfa.mpfa_ensemble(g, perms, bnd, num_proc=2)
+    for flux, flux_par in zip(fluxes, fluxes_par):
+        assert np.allclose((flux - flux_par).A, 0)
+
+
 if __name__ == '__main__':
     test_uniform_flow_cart_2d_structured_pert()
     test_laplacian_stencil_cart_2d()
@@ -1,4 +1,5 @@
 import unittest
+import warnings
 import numpy as np
 import scipy.sparse as sps
 
@@ -7,6 +8,7 @@ from porepy.params.tensor import SecondOrder as PermTensor
 from porepy.params.tensor import FourthOrder as StiffnessTensor
 from porepy.grids.structured import CartGrid
 from porepy.params import bc
+from porepy.params.data import Parameters
 
 
 class TestPartialMPFA(unittest.TestCase):
@@ -118,6 +120,138 @@ class TestPartialMPFA(unittest.TestCase):
         assert (bound_flux - bound_flux_full).max() < 1e-8
         assert (bound_flux - bound_flux_full).min() > -1e-8
 
+    def _partitioned_setup(self):
+        g = CartGrid([6, 6])
+        g.compute_geometry()
+
+        np.random.seed(42)
+        kxx = np.random.random(g.num_cells)
+        kyy = np.random.random(g.num_cells)
+        kxy = np.random.random(g.num_cells) * kxx * kyy
+        perm = PermTensor(2, kxx=kxx, kyy=kyy, kxy=kxy)
+        bnd = bc.BoundaryCondition(g)
+
+        flux_full, bound_flux_full = mpfa.mpfa(g, perm, bnd, inverter='python')
+        # Memory threshold that gives four partitions
+        max_memory = mpfa._estimate_peak_memory(g) / 3.5
+        return g, perm, bnd, flux_full, bound_flux_full, max_memory
+
+    def test_max_memory_serial(self):
+        g, perm, bnd, flux_full, bound_flux_full, max_memory \
+            = self._partitioned_setup()
+        flux, bound_flux = mpfa.mpfa(g, perm, bnd, inverter='python',
+                                     max_memory=max_memory)
+
+        assert np.allclose((flux - flux_full).A, 0)
+        assert np.allclose((bound_flux - bound_flux_full).A, 0)
+
+    def test_max_memory_process_pool(self):
+        g, perm, bnd, flux_full, bound_flux_full, max_memory \
+            = self._partitioned_setup()
+        flux_serial, bound_serial = mpfa.mpfa(g, perm, bnd, inverter='python',
+                                              max_memory=max_memory)
+        flux, bound_flux = mpfa.mpfa(g, perm, bnd, inverter='python',
+                                     max_memory=max_memory, num_proc=2)
+
+        assert np.allclose((flux - flux_full).A, 0)
+        assert np.allclose((bound_flux - bound_flux_full).A, 0)
+        # The merging of partitions is deterministic
+        assert np.all((flux - flux_serial).A == 0)
+        assert np.all((bound_flux - bound_serial).A == 0)
+
+    def test_max_memory_discretize_keywords(self):
+        g, perm, bnd, flux_full, bound_flux_full, max_memory \
+            = self._partitioned_setup()
+        param = Parameters(g)
+        param.set_tensor('flow', perm)
+        param.set_bc('flow', bnd)
+        d = {'param': param, 'max_memory': max_memory, 'num_proc': 2}
+        mpfa.Mpfa('flow').discretize(g, d)
+
+        assert np.allclose((d['flux'] - flux_full).A, 0)
+        assert np.allclose((d['bound_flux'] - bound_flux_full).A, 0)
+
+    def test_discretize_partial_update(self):
+        # Change the permeability in a single cell, and the boundary condition
+        # on a single face. The partial update should give the same result as
+        # a new discretization.
+        g = CartGrid([5, 5])
+        g.compute_geometry()
+        perm = PermTensor(g.dim, np.ones(g.num_cells))
+        param = Parameters(g)
+        param.set_tensor('flow', perm)
+        param.set_bc('flow', bc.BoundaryCondition(g))
+        d = {'param': param, 'partial_update': True}
+        discr = mpfa.Mpfa('flow')
+        discr.discretize(g, d)
+
+        kxx = np.ones(g.num_cells)
+        kxx[12] = 10
+        perm = PermTensor(g.dim, kxx)
+        bnd = bc.BoundaryCondition(g, np.array([0]), ['dir'])
+        param.set_tensor('flow', perm)
+        param.set_bc('flow', bnd)
+        discr.discretize(g, d)
+
+        flux_full, bound_flux_full = mpfa.mpfa(g, perm, bnd)
+        assert np.allclose((d['flux'] - flux_full).A, 0)
+        assert np.allclose((d['bound_flux'] - bound_flux_full).A, 0)
+
+    def test_discretize_partial_update_warnings(self):
+        # The warning on the untested cells and faces keywords of
+        # mpfa_partial is suppressed, other warnings are not.
+        g = CartGrid([5, 5])
+        g.compute_geometry()
+        param = Parameters(g)
+        param.set_tensor('flow', PermTensor(g.dim, np.ones(g.num_cells)))
+        param.set_bc('flow', bc.BoundaryCondition(g))
+        d = {'param': param, 'partial_update': True}
+        discr = mpfa.Mpfa('flow')
+        discr.discretize(g, d)
+
+        kxx = np.ones(g.num_cells)
+        kxx[12] = 10
+        param.set_tensor('flow', PermTensor(g.dim, kxx))
+        param.set_bc('flow', bc.BoundaryCondition(g, np.array([0]), ['dir']))
+
+        partial = mpfa.mpfa_partial
+
+        def warning_partial(*args, **kwargs):
+            warnings.warn('Warning from mpfa_partial')
+            return partial(*args, **kwargs)
+        mpfa.mpfa_partial = warning_partial
+        try:
+            with warnings.catch_warnings(record=True) as w:
+                warnings.simplefilter('always')
+                discr.discretize(g, d)
+        finally:
+            mpfa.mpfa_partial = partial
+        msg = [str(x.message) for x in w]
+        assert 'Warning from mpfa_partial' in msg
+        assert not any('has not been tested' in m for m in msg)
+
+    def test_discretize_partial_update_moved_nodes(self):
+        # Perturb the nodes, keeping the number of cells and faces. The grid
+        # has changed, and the whole grid should be discretized again.
+        g = CartGrid([5, 5])
+        g.compute_geometry()
+        perm = PermTensor(g.dim, np.ones(g.num_cells))
+        bnd = bc.BoundaryCondition(g)
+        param = Parameters(g)
+        param.set_tensor('flow', perm)
+        param.set_bc('flow', bnd)
+        d = {'param': param, 'partial_update': True}
+        discr = mpfa.Mpfa('flow')
+        discr.discretize(g, d)
+
+        g.nodes[:2] += 0.1 * np.sin(np.arange(g.num_nodes))
+        g.compute_geometry()
+        discr.discretize(g, d)
+
+        flux_full, bound_flux_full = mpfa.mpfa(g, perm, bnd)
+        assert np.allclose((d['flux'] - flux_full).A, 0)
+        assert np.allclose((d['bound_flux'] - bound_flux_full).A, 0)
+
     if __name__ == '__main__':
         unittest.main()
 
@@ -243,6 +377,31 @@ class TestPartialMPSA():
         assert (bound_stress - bound_stress_full).max() < 1e-8
         assert (bound_stress - bound_stress_full).min() > -1e-8
 
+    def test_discretize_partial_update(self):
+        # Change the stiffness in a single cell. The partial update should
+        # give the same result as a new discretization.
+        g = CartGrid([5, 5])
+        g.compute_geometry()
+        bnd = bc.BoundaryCondition(g)
+        param = Parameters(g)
+        param.set_tensor('mechanics',
+                         StiffnessTensor(g.dim, np.ones(g.num_cells),
+                                         np.ones(g.num_cells)))
+        param.set_bc('mechanics', bnd)
+        d = {'param': param, 'partial_update': True}
+        discr = mpsa.Mpsa()
+        discr.discretize(g, d)
+
+        mu = np.ones(g.num_cells)
+        mu[10] = 5
+        stiffness = StiffnessTensor(g.dim, mu, np.ones(g.num_cells))
+        param.set_tensor('mechanics', stiffness)
+        discr.discretize(g, d)
+
+        stress_full, bound_stress_full = mpsa.mpsa(g, stiffness, bnd)
+        assert np.allclose((d['stress'] - stress_full).A, 0)
+        assert np.allclose((d['bound_stress'] - bound_stress_full).A, 0)
+
     if __name__ == '__main__':
         unittest.main()
 
@@ -3,6 +3,7 @@ import numpy as np
 
 from porepy.numerics.parabolic import ParabolicModel, ParabolicDataAssigner
 from porepy.numerics.time_stepper import Implicit, Explicit, BDF2
+from porepy.numerics.time_stepper import LinearExplicit
 from porepy.numerics.time_stepper import CrankNicolson
 from porepy.grids import structured
 from porepy.fracs import meshing
@@ -86,6 +87,58 @@ class TestBase(unittest.TestCase):
         assert np.sum(np.abs(solver.p) > 1e-6) == 1
         assert np.sum(np.abs(solver.p - 0.5) < 1e-6) == 1
 
+    def test_factorization_reuse(self):
+        '''The left hand side is constant in time, and should be factorized
+        only once for the implicit method. The first step of BDF2 is an
+        implicit step, with a different left hand side.'''
+        problem = UnitSquareDiffusionFourSteps(self.gb)
+        problem.update(0.0)
+        solver = Implicit(problem)
+        solver.solve()
+        assert solver.factorization.num_factorizations == 1
+
+        problem = UnitSquareDiffusionFourSteps(self.gb)
+        problem.update(0.0)
+        solver = BDF2(problem)
+        solver.solve()
+        assert solver.factorization.num_factorizations == 2
+        p = solver.p
+
+        # With a constant left hand side, the factorization of the first step
+        # should not be used for the later steps
+        problem = UnitSquareDiffusionFourSteps(self.gb)
+        problem.update(0.0)
+        solver = BDF2(problem)
+        solver.parameters['constant_lhs'] = True
+        solver.solve()
+        assert solver.factorization.num_factorizations == 2
+        assert np.allclose(solver.p, p)
+
+        # Forced refactorization
+        solver.factorization.clear()
+        solver.step()
+        assert solver.factorization.num_factorizations == 3
+
+    def test_linear_explicit_solver(self):
+        '''With constant operators and source, the linear explicit solver
+        should reproduce the explicit solver.'''
+        problem = UnitSquareConstantInjection(self.gb)
+        problem.update(0.0)
+        solver = Explicit(problem)
+        solver.solve()
+        p_explicit = solver.p
+
+        problem = UnitSquareConstantInjection(self.gb)
+        solver = LinearExplicit(problem)
+        solver.parameters['store_results'] = True
+        solver.parameters['store_interval'] = 2
+        data = solver.solve()
+        assert np.allclose(solver.p, p_explicit)
+        # Four steps: The initial condition and solution after two and four
+        # steps are stored
+        assert np.allclose(data['times'], [0, 0.5, 1])
+        assert np.allclose(data[problem.physics][-1], p_explicit)
+
 
 ###############################################################################
 
@@ -115,3 +168,34 @@ class UnitSquareInjectionTwoSteps(UnitSquareInjectionMultiDim):
 
     def time_step(self):
         return 0.5
+
+
+###############################################################################
+class UnitSquareInjectionFourSteps(UnitSquareInjectionMultiDim):
+    def __init__(self, gb):
+        UnitSquareInjectionMultiDim.__init__(self, gb)
+
+    def time_step(self):
+        return 0.25
+
+
+###############################################################################
+class UnitSquareDiffusionFourSteps(UnitSquareInjectionFourSteps):
+    def __init__(self, gb):
+        UnitSquareInjectionFourSteps.__init__(self, gb)
+
+    def space_disc(self):
+        return self.diffusive_disc(), self.source_disc()
+
+
+###############################################################################
+class UnitSquareConstantInjection(UnitSquareInjectionFourSteps):
+    def __init__(self, gb):
+        UnitSquareInjectionFourSteps.__init__(self, gb)
+
+    def update(self, t):
+        for g, d in self.grid():
+            source = np.zeros(g.num_cells)
+            if g.dim == 0:
+                source[0] = 1.0
+            d['param'].set_source('transport', source)
@@ -0,0 +1,21 @@
+"""
+Checks shared by the tests of the iterative linear solvers.
+"""
+import numpy as np
+
+
+def assert_scale_invariant_residuals(slv, b):
+    """ Solve with a right hand side and a scaled copy of it, and check that
+    the recorded relative residual histories are equal.
+
+    Parameters:
+        slv: Solver, called with a right hand side, with an attribute
+            residuals (list of list of double), one list per solve.
+        b (np.ndarray): Right hand side.
+
+    """
+    slv(b)
+    slv(1e6 * b)
+    res, res_scaled = slv.residuals[-2], slv.residuals[-1]
+    assert len(res) == len(res_scaled)
+    assert np.allclose(res, res_scaled)
@@ -4,9 +4,11 @@ import numpy.linalg
 import unittest
 
 from porepy.numerics.fv import mpfa, mpsa, fvutils, biot
+from porepy.grids import structured
 from porepy.params import tensor, bc
 from porepy.params.data import Parameters
 from test.integration import setup_grids_mpfa_mpsa_tests as setup_grids
+from test.unit.residual_checks import assert_scale_invariant_residuals
 
 
 class BiotTest(unittest.TestCase):
@@ -77,6 +79,113 @@ class BiotTest(unittest.TestCase):
 #            assert np.isclose(sol[:sz_mech], 
 #                              const_bound_val_mech * np.ones(sz_mech)).all()
 
+    def _biot_system(self, dt):
+        g = structured.CartGrid([5, 5])
+        g.compute_geometry()
+        bound_faces = g.get_boundary_faces()
+        bound = bc.BoundaryCondition(g, bound_faces.ravel('F'),
+                                     ['dir'] * bound_faces.size)
+        mu = np.ones(g.num_cells)
+        param = Parameters(g)
+        param.set_bc('flow', bound)
+        param.set_bc('mechanics', bound)
+        param.set_tensor('flow', tensor.SecondOrder(g.dim, mu))
+        param.set_tensor('mechanics', tensor.FourthOrder(g.dim, mu, mu))
+        param.set_bc_val('mechanics', np.zeros(g.num_faces * g.dim))
+        param.set_bc_val('flow', np.zeros(g.num_faces))
+        param.porosity = np.ones(g.num_cells)
+        param.fluid_compr = 0.1
+        data = {'param': param, 'dt': dt}
+        A, _ = biot.Biot().matrix_rhs(g, data)
+        return g, A, data
+
+    def test_fixed_stress_iterations(self):
+        g, A, _ = self._biot_system(dt=1)
+        b = np.arange(A.shape[0]) / A.shape[0]
+        slv = biot.Biot().solve(A, 'fixed_stress', g=g, tol=1e-10)
+        x = slv(b)
+        assert np.linalg.norm(A * x - b) < 1e-8 * np.linalg.norm(b)
+        assert slv.iterations[0] == len(slv.residuals[0])
+        assert slv.residuals[0][-1] < 1e-10
+
+    def test_fixed_stress_gmres_reuse(self):
+        g, A, _ = self._biot_system(dt=0.1)
+        b = np.arange(A.shape[0]) / A.shape[0]
+        slv = biot.Biot().solve(A, 'gmres', g=g, tol=1e-10)
+        x = slv(b)
+        assert np.linalg.norm(A * x - b) < 1e-8 * np.linalg.norm(b)
+
+        # A new time step size changes only the flow block; the mechanics
+        # solver should be kept.
+        mech_solve = slv._mech_solve
+        _, A, _ = self._biot_system(dt=0.2)
+        slv.update(A)
+        assert slv._mech_solve is mech_solve
+        x = slv(b)
+        assert np.linalg.norm(A * x - b) < 1e-8 * np.linalg.norm(b)
+        assert len(slv.iterations) == 2
+
+    def _time_loop_reference(self, g, data, time_steps):
+        # Time loop with a full assembly in each step
+        discr = biot.Biot()
+        for dt in time_steps:
+            data['dt'] = dt
+            A, b = discr.matrix_rhs(g, data, discretize=False)
+            data['state'] = sps.linalg.spsolve(A, b)
+        return data['state']
+
+    def test_time_loop_variable_dt(self):
+        g, _, data = self._biot_system(dt=0.1)
+        time_steps = np.array([0.1, 0.1, 0.2, 0.1])
+        state = np.arange(3 * g.num_cells) / g.num_cells
+        data['state'] = state
+        known = self._time_loop_reference(g, data, time_steps)
+
+        times = []
+
+        def callback(t, x, d):
+            times.append(t)
+            assert d['state'] is x
+
+        data['state'] = state
+        x = biot.Biot().time_loop(g, data, time_steps, callback=callback)
+        assert np.allclose(x, known)
+        assert np.allclose(times, np.cumsum(time_steps))
+        assert data['state'] is x
+
+    def test_time_loop_keeps_current_factorization(self):
+        g, _, data = self._biot_system(dt=0.1)
+        time_steps = np.array([0.1, 0.1, 0.2, 0.2, 0.1])
+        discr = biot.Biot()
+        solvers = []
+        solve = discr.solve
+
+        def counting_solve(*args, **kwargs):
+            solvers.append(solve(*args, **kwargs))
+            return solvers[-1]
+        discr.solve = counting_solve
+        discr.time_loop(g, data, time_steps)
+        # One factorization per change of time step size
+        assert len(solvers) == 3
+
+    def test_time_loop_gmres(self):
+        g, _, data = self._biot_system(dt=0.1)
+        time_steps = np.array([0.1, 0.2, 0.2])
+        state = np.arange(3 * g.num_cells) / g.num_cells
+        data['state'] = state
+        known = self._time_loop_reference(g, data, time_steps)
+
+        data['state'] = state
+        x = biot.Biot().time_loop(g, data, time_steps, solver='gmres',
+                                  discretize=False, tol=1e-12)
+        assert np.allclose(x, known)
+
+    def test_fixed_stress_gmres_residuals_scale_invariant(self):
+        g, A, _ = self._biot_system(dt=0.1)
+        b = np.arange(A.shape[0]) / A.shape[0]
+        slv = biot.Biot().solve(A, 'gmres', g=g, tol=1e-10)
+        assert_scale_invariant_residuals(slv, b)
+
     def test_face_vector_to_scalar(self):
         # Test of function face_vector_to_scalar
         nf = 3
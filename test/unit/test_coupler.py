@@ -0,0 +1,76 @@
+import numpy as np
+import scipy.sparse as sps
+import unittest
+
+from porepy.fracs import meshing
+from porepy.numerics.mixed_dim import coupler
+
+
+class TestCouplerAssembly(unittest.TestCase):
+
+    def setUp(self):
+        f = np.array([[0, 2], [1, 1]])
+        self.gb = meshing.cart_grid([f], [2, 2], physdims=[2, 2])
+        self.gb.compute_geometry()
+        self.gb.assign_node_ordering()
+        # Scaling of the values, and the cell of the higher dimensional grid
+        # which is coupled, this changes the sparsity structure
+        self.state = {'scale': 1, 'coupled_cell': 0}
+
+    def _coupler(self, **kwargs):
+        state = self.state
+
+        def ndof(g):
+            return g.num_cells
+
+        def discr(g, d):
+            A = sps.diags([state['scale'] * np.arange(1, g.num_cells + 1)],
+                          [0])
+            return A.tocsr(), np.ones(g.num_cells)
+
+        def coupling(g_h, g_l, d_h, d_l, d_e):
+            c = np.zeros((g_h.num_cells, g_l.num_cells))
+            c[state['coupled_cell'], 0] = -state['scale']
+            cc = np.empty((2, 2), dtype=np.object)
+            cc[0, 0] = sps.csr_matrix((g_h.num_cells, g_h.num_cells))
+            cc[0, 1] = sps.csr_matrix(c)
+            cc[1, 0] = sps.csr_matrix(c.T)
+            cc[1, 1] = sps.identity(g_l.num_cells, format='csr')
+            return cc
+
+        return coupler.Coupler(discr_ndof=ndof, discr_fct=discr,
+                               coupling_fct=coupling, **kwargs)
+
+    def _check(self, cpl):
+        # Compare with a coupler without a stored pattern
+        A, _ = cpl.matrix_rhs(self.gb)
+        A_known, _ = self._coupler().matrix_rhs(self.gb)
+        assert np.allclose((A - A_known).A, 0)
+
+    def test_reuse_pattern(self):
+        cpl = self._coupler()
+        self._check(cpl)
+        pattern = cpl._pattern
+
+        # New values, the pattern is kept
+        self.state['scale'] = 3
+        self._check(cpl)
+        assert cpl._pattern is pattern
+
+        # New structure, with the same number of nonzeros in all blocks
+        self.state['coupled_cell'] = 1
+        self._check(cpl)
+        assert cpl._pattern is not pattern
+
+    def test_constant_structure(self):
+        cpl = self._coupler(constant_structure=True)
+        self._check(cpl)
+        pattern = cpl._pattern
+        assert cpl._block_indices is None
+
+        self.state['scale'] = 3
+        self._check(cpl)
+        assert cpl._pattern is pattern
+
+    if __name__ == '__main__':
+        unittest.main()
@@ -0,0 +1,85 @@
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+from porepy.grids import structured
+from porepy.params import tensor, bc, data
+from porepy.numerics.fv import tpfa, mpfa, mpsa
+from porepy.numerics.fv.discretization_cache import DiscretizationCache
+
+
+def _setup(g, physics='flow'):
+    params = data.Parameters(g)
+    bound_faces = g.get_boundary_faces().ravel()
+    bound = bc.BoundaryCondition(g, bound_faces, ['dir'] * bound_faces.size)
+    if physics == 'flow':
+        params.set_tensor('flow', tensor.SecondOrder(g.dim,
+                                                     np.ones(g.num_cells)))
+    else:
+        params.set_tensor('mechanics',
+                          tensor.FourthOrder(g.dim, np.ones(g.num_cells),
+                                             np.ones(g.num_cells)))
+    params.set_bc(physics, bound)
+    return {'param': params}
+
+
+class TestDiscretizationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.g = structured.CartGrid([3, 3])
+        self.g.compute_geometry()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def _compare(self, discr, d, keys):
+        d_cache = dict(d)
+        d_cache['discretization_cache'] = DiscretizationCache(self.path)
+        # First call stores the discretization, second loads it
+        discr.discretize(self.g, d_cache)
+        assert len(d_cache['discretization_cache']._entries()) == 1
+        d_cache_2 = dict(d_cache)
+        discr.discretize(self.g, d_cache_2)
+        discr.discretize(self.g, d)
+        for k in keys:
+            assert np.allclose((d[k] - d_cache_2[k]).A, 0)
+
+    def test_tpfa(self):
+        self._compare(tpfa.Tpfa(), _setup(self.g), ['flux', 'bound_flux'])
+
+    def test_mpfa(self):
+        self._compare(mpfa.Mpfa(), _setup(self.g), ['flux', 'bound_flux'])
+
+    def test_mpsa(self):
+        self._compare(mpsa.Mpsa(), _setup(self.g, 'mechanics'),
+                      ['stress', 'bound_stress'])
+
+    def test_key_depends_on_parameters(self):
+        cache = DiscretizationCache(self.path)
+        k1 = tensor.SecondOrder(2, np.ones(self.g.num_cells))
+        k2 = tensor.SecondOrder(2, 2 * np.ones(self.g.num_cells))
+        assert cache.key('mpfa', self.g, k1) == cache.key('mpfa', self.g, k1)
+        assert cache.key('mpfa', self.g, k1) != cache.key('mpfa', self.g, k2)
+        assert cache.key('mpfa', self.g, k1) != cache.key('tpfa', self.g, k1)
+
+    def test_lru_eviction(self):
+        cache = DiscretizationCache(self.path)
+        a = np.eye(10)
+        cache.store('a', {'m': a})
+        cache.store('b', {'m': 2 * a})
+        entry_size = cache.size() / 2
+        # Room for two entries only
+        cache.max_size = 2.5 * entry_size
+        # Make sure 'a' is the most recently used entry
+        os.utime(cache._file_name('b'), (0, 0))
+        assert cache.load('a') is not None
+        cache.store('c', {'m': 3 * a})
+        assert cache.load('b') is None
+        assert np.allclose(cache.load('a')['m'].A, a)
+        assert np.allclose(cache.load('c')['m'].A, 3 * a)
+
+    if __name__ == '__main__':
+        unittest.main()
@@ -1,8 +1,10 @@
 from __future__ import division
 import numpy as np
 import scipy.sparse as sps
+import unittest
 
 from porepy.numerics.fv import fvutils
+from porepy.utils import kernels
 from porepy.grids import structured, simplex
 
 def test_subcell_topology_2d_cart_1():
@@ -60,3 +62,35 @@ def test_determine_eta():
     assert fvutils.determine_eta(g) == 1/3
     g = structured.CartGrid([1, 1])
     assert fvutils.determine_eta(g) == 0
+
+
+def _block_diagonal_test_matrix():
+    # Blocks of varying size, ordered so that blocks of equal size are not
+    # neighbors
+    np.random.seed(0)
+    sz = np.array([2, 3, 2, 1, 3, 2], dtype=np.int64)
+    blocks = [np.random.rand(n, n) + n * np.eye(n) for n in sz]
+    a = sps.block_diag(blocks, format='csr')
+    inv = sps.block_diag([np.linalg.inv(b) for b in blocks], format='csr')
+    return a, sz, inv
+
+
+def test_invert_diagonal_blocks_vectorized():
+    a, sz, inv = _block_diagonal_test_matrix()
+    ia = fvutils.invert_diagonal_blocks(a, sz, method='vectorized')
+    assert np.allclose((ia - inv).A, 0)
+
+
+def test_invert_diagonal_blocks_default_method():
+    a, sz, inv = _block_diagonal_test_matrix()
+    ia = fvutils.invert_diagonal_blocks(a, sz)
+    ia_python = fvutils.invert_diagonal_blocks(a, sz, method='python')
+    assert np.allclose((ia - inv).A, 0)
+    assert np.allclose((ia - ia_python).A, 0)
+
+
+@unittest.skipIf(kernels.backend() != 'numba', 'numba is not installed')
+def test_invert_diagonal_blocks_numba():
+    a, sz, inv = _block_diagonal_test_matrix()
+    ia = fvutils.invert_diagonal_blocks(a, sz, method='numba')
+    assert np.allclose((ia - inv).A, 0)
@@ -1,7 +1,8 @@
 import numpy as np
 import unittest
 
-from porepy.grids import structured
+from porepy.grids import structured, simplex, grid, coarsening
+from porepy.fracs import meshing
 
 #------------------------------------------------------------------------------#
 
@@ -23,4 +24,128 @@ class BasicsTest( unittest.TestCase ):
         known = np.repeat( np.sqrt(3), g.num_cells )
         assert np.allclose( cell_diameters, known )
 
+#------------------------------------------------------------------------------#
+
+    def test_cached_maps(self):
+        g = structured.CartGrid([3, 2])
+        cn = g.cell_nodes()
+        # The cached map is returned as a copy
+        cn.data[:] = False
+        assert g.cell_nodes().nnz == 4 * g.num_cells
+        assert np.all(g.cell_nodes().sum(axis=0) == 4)
+        assert np.array_equal(g.num_cell_nodes(), 4 * np.ones(g.num_cells))
+        assert g.cell_connection_map().shape == (g.num_cells, g.num_cells)
+        assert g.get_boundary_faces().size == 10
+
+#------------------------------------------------------------------------------#
+
+    def test_cache_cleared_on_assignment(self):
+        g = structured.CartGrid([3, 2])
+        g.cell_nodes()
+        g.cell_face_as_dense()
+        # Remove the first cell
+        g.cell_faces = g.cell_faces[:, 1:]
+        g.num_cells -= 1
+        assert g.cell_nodes().shape == (g.num_nodes, 5)
+        assert g.cell_face_as_dense().max() == 4
+
+#------------------------------------------------------------------------------#
+
+    def test_cache_cleared_on_tag_change(self):
+        g = structured.CartGrid([3, 2])
+        assert 0 in g.get_boundary_faces()
+        g.remove_face_tag(0, grid.FaceTag.BOUNDARY)
+        assert 0 not in g.get_boundary_faces()
+        g.add_face_tag([0], grid.FaceTag.BOUNDARY)
+        assert 0 in g.get_boundary_faces()
+
+#------------------------------------------------------------------------------#
+
+    def test_clear_cache(self):
+        g = structured.CartGrid([3, 2])
+        num_nodes = g.num_cell_nodes()
+        # In place modification, connect all faces to the first node
+        g.face_nodes.indices[:] = 0
+        assert np.array_equal(g.num_cell_nodes(), num_nodes)
+        g.clear_cache()
+        assert np.all(g.num_cell_nodes() == 1)
+
+#------------------------------------------------------------------------------#
+
+    def test_cell_diameters_mixed_cells(self):
+        # Coarse grid with cells of 4, 6 and 8 nodes
+        g = structured.CartGrid([4, 2])
+        g.nodes[:2] += 0.1 * np.sin(np.arange(g.num_nodes))
+        g.compute_geometry()
+        subdiv = np.array([0, 0, 1, 1, 0, 0, 2, 3])
+        coarsening.generate_coarse_grid(g, subdiv)
+        cn = g.cell_nodes()
+        known = np.zeros(g.num_cells)
+        for c in range(g.num_cells):
+            p = g.nodes[:, cn.indices[cn.indptr[c]:cn.indptr[c + 1]]]
+            d = p[:, :, np.newaxis] - p[:, np.newaxis, :]
+            known[c] = np.sqrt(np.amax(np.sum(d ** 2, axis=0)))
+        assert np.unique(np.diff(cn.indptr)).size == 3
+        assert np.allclose(g.cell_diameters(), known)
+        assert np.allclose(g.cell_diameters(cn), known)
+
+#------------------------------------------------------------------------------#
+
+    def test_locate_points_cart_3d(self):
+        g = structured.CartGrid([4, 3, 2])
+        g.compute_geometry()
+        p = np.random.rand(3, 100) * np.array([[5], [3], [2]]) - 0.5
+        p[1:] += 0.5
+        known = np.floor(p[0]) + 4 * np.floor(p[1]) + 12 * np.floor(p[2])
+        known[np.logical_or(p[0] < 0, p[0] > 4)] = -1
+        assert np.array_equal(g.locate_points(p), known)
+
+#------------------------------------------------------------------------------#
+
+    def test_locate_points_simplex_2d(self):
+        p = np.hstack((np.random.rand(2, 20), [[0, 1, 0, 1], [0, 0, 1, 1]]))
+        g = simplex.TriangleGrid(p)
+        g.compute_geometry()
+        q = np.random.rand(2, 100) * 1.2 - 0.1
+        ci = g.locate_points(q)
+        outside = np.any(np.logical_or(q < 0, q > 1), axis=0)
+        assert np.all(ci[outside] == -1) and np.all(ci[~outside] >= 0)
+        # Barycentric coordinates of the points in the cells found
+        cn = g.cell_nodes().indices.reshape((3, -1), order='F')
+        for i in np.where(~outside)[0]:
+            x = np.vstack((g.nodes[:2, cn[:, ci[i]]], np.ones(3)))
+            lam = np.linalg.solve(x, np.hstack((q[:, i], 1)))
+            assert np.all(lam > -1e-10)
+
+#------------------------------------------------------------------------------#
+
+    def test_locate_points_embedded(self):
+        f = np.array([[1, 3, 3, 1], [1, 1, 3, 3], [2, 2, 2, 2]])
+        gb = meshing.cart_grid([f], [4, 4, 4])
+        g = gb.grids_of_dimension(2)[0]
+        p = np.array([[1.5, 2.5, 1.5, 0.5], [1.5, 1.2, 1.5, 1.5],
+                      [2, 2, 2.1, 2]])
+        ci = g.locate_points(p)
+        assert np.all(ci[2:] == -1)
+        assert np.allclose(g.cell_centers[:, ci[0]], [1.5, 1.5, 2])
+        assert np.allclose(g.cell_centers[:, ci[1]], [2.5, 1.5, 2])
+
+        g = structured.CartGrid(4)
+        g.nodes = np.tile(np.arange(5), (3, 1))
+        g.compute_geometry()
+        p = np.array([[0.5, 3.5, 0.5, 5], [0.5, 3.5, 0.6, 5],
+                      [0.5, 3.5, 0.5, 5]])
+        assert np.array_equal(g.locate_points(p), [0, 3, -1, -1])
+
+#------------------------------------------------------------------------------#
+
+    def test_closest_cell(self):
+        g = structured.CartGrid([3, 2])
+        g.compute_geometry()
+        p = np.array([[0.4, 2.9, -1, 10], [0.4, 1.9, -1, 0.1]])
+        assert np.array_equal(g.closest_cell(p), [0, 5, 0, 2])
+        # The spatial index is rebuilt when the cell centers are assigned
+        g.cell_centers = g.cell_centers[:, ::-1]
+        assert np.array_equal(g.closest_cell(p), [5, 0, 5, 3])
+
 #------------------------------------------------------------------------------#
@@ -0,0 +1,118 @@
+import numpy as np
+import scipy.sparse as sps
+import unittest
+
+from porepy.fracs import meshing
+from porepy.grids import structured
+from porepy.grids.grid_bucket import GridBucket
+from porepy.grids.point_grid import PointGrid
+
+
+def _bucket():
+    # Two intersecting 1d grids in a 2d grid, connected through a 0d grid
+    g_2 = structured.CartGrid([2, 2])
+    g_1a = structured.CartGrid(2)
+    g_1b = structured.CartGrid(2)
+    g_0 = PointGrid(np.zeros(3))
+    gb = GridBucket()
+    gb.add_nodes([g_2, g_1a, g_1b, g_0])
+    gb.add_edge([g_1a, g_2], sps.csc_matrix((2, 12)))
+    gb.add_edge([g_2, g_1b], sps.csc_matrix((2, 12)))
+    gb.add_edge([g_0, g_1a], sps.csc_matrix((1, 3)))
+    gb.add_edge([g_1b, g_0], sps.csc_matrix((1, 3)))
+    gb.assign_node_ordering()
+    return gb, g_2, g_1a, g_1b, g_0
+
+
+class TestGridBucket(unittest.TestCase):
+
+    def test_nodes_and_edges(self):
+        gb, g_2, g_1a, g_1b, g_0 = _bucket()
+        assert gb.size() == 4
+        assert [g for g, _ in gb] == [g_2, g_1a, g_1b, g_0]
+        assert gb.dim_max() == 2 and gb.dim_min() == 0
+        assert gb.grids_of_dimension(1) == [g_1a, g_1b]
+        # The higher-dimensional grid is the first node of an edge
+        assert list(gb.edges()) == [(g_2, g_1a), (g_2, g_1b), (g_1a, g_0),
+                                    (g_1b, g_0)]
+        assert gb.node_neighbors(g_1a) == [g_2, g_0]
+        assert gb.sorted_nodes_of_edge([g_2, g_1b]) == (g_1b, g_2)
+        adj = gb.adjacency()
+        assert adj.shape == (4, 4)
+        assert adj[0, 1] == 1 and adj[1, 0] == 1 and adj[2, 3] == 4
+        assert adj.nnz == 8
+
+    def test_node_props(self):
+        gb, g_2, g_1a, g_1b, g_0 = _bucket()
+        gb.add_node_prop('a')
+        gb.add_node_prop('b', [g_1a, g_0], [1, 2])
+        assert gb.has_nodes_prop([g_2, g_0], 'a') == (True, True)
+        assert gb.nodes_prop([g_2, g_1a, g_1b, g_0], 'b') == \
+            (None, 1, None, 2)
+        assert gb.node_props_of_keys(g_1a, ['a', 'b']) == {'a': None, 'b': 1}
+        assert gb.nodes_prop([g for g, _ in gb], 'node_number') == \
+            (0, 1, 2, 3)
+
+        # Data yielded by the iterator is a view of the stored properties
+        for g, d in gb:
+            d['c'] = g.dim
+        assert gb.node_prop(g_1b, 'c') == 1
+        assert gb.has_nodes_prop([g_2], 'd') == (False,)
+        with self.assertRaises(KeyError):
+            gb.nodes_prop([g_2], 'd')
+        d = gb.node_props(g_0)
+        del d['c']
+        assert 'c' not in d and set(d.keys()) == {'node_number', 'a', 'b'}
+        assert d.copy() == {'node_number': 3, 'a': None, 'b': 2}
+
+    def test_edge_props(self):
+        gb, g_2, g_1a, g_1b, g_0 = _bucket()
+        gb.add_edge_prop('kn', [[g_1a, g_2], [g_0, g_1b]], [1, 2])
+        assert gb.edge_props([g_2, g_1a])['kn'] == 1
+        assert gb.edge_props([g_1b, g_0])['kn'] == 2
+        assert 'kn' not in gb.edge_props([g_2, g_1b])
+        assert gb.edge_prop([g_0, g_1b], 'face_cells')[0].shape == (1, 3)
+        with self.assertRaises(KeyError):
+            gb.edge_props([g_2, g_0])
+        edges = [e for e, _ in gb.edges_props_of_node(g_1b)]
+        assert edges == [(g_1b, g_2), (g_1b, g_0)]
+
+    def test_remove_node(self):
+        gb, g_2, g_1a, g_1b, g_0 = _bucket()
+        d_0 = gb.node_props(g_0)
+        d_1b = gb.node_props(g_1b)
+        gb.remove_node(g_1a)
+        gb.update_node_ordering(1)
+        assert gb.size() == 3
+        assert list(gb.edges()) == [(g_2, g_1b), (g_1b, g_0)]
+        assert gb.nodes_prop([g_2, g_1b, g_0], 'node_number') == (0, 1, 2)
+        assert gb.node_neighbors(g_0) == [g_1b]
+        # Views held by the caller still refer to the right nodes
+        assert d_0['node_number'] == 2 and d_1b['node_number'] == 1
+        with self.assertRaises(KeyError):
+            gb.remove_node(g_1a)
+
+    def test_copy(self):
+        gb, g_2, g_1a, g_1b, g_0 = _bucket()
+        gb.add_node_prop('a', [g_2], [np.ones(2)])
+        gb_copy = gb.copy()
+        h_2 = gb_copy.grids_of_dimension(2)[0]
+        assert h_2 is not g_2
+        gb_copy.node_props(h_2)['a'][0] = 0
+        assert gb.node_prop(g_2, 'a')[0] == 1
+        assert len(list(gb_copy.edges())) == 4
+        assert gb_copy.node_neighbors(h_2)[0].dim == 1
+
+    def test_duplicate_without_dimension(self):
+        f_1 = np.array([[0, 2], [1, 1]])
+        f_2 = np.array([[1, 1], [0, 2]])
+        gb = meshing.cart_grid([f_1, f_2], [2, 2])
+        gb.assign_node_ordering()
+        gb_r, elimination = gb.duplicate_without_dimension(0)
+        assert gb_r.size() == 3
+        assert len(list(gb_r.edges())) == 3
+        assert len(gb.grids_of_dimension(0)) == 1
+        assert len(elimination['neighbours'][0]) == 2
+
+    if __name__ == '__main__':
+        unittest.main()
@@ -0,0 +1,112 @@
+import numpy as np
+import shutil
+import tempfile
+import unittest
+
+from porepy.fracs import meshing
+from porepy.grids import structured, simplex
+from porepy.grids.storage import save_grid, load_grid, save_grid_bucket, \
+    load_grid_bucket
+from porepy.numerics.fv import tpfa
+from porepy.params import tensor, bc, data
+
+
+def _compare_grids(g, h):
+    assert type(g) is type(h)
+    assert set(vars(g).keys()) == set(vars(h).keys())
+    for key, value in vars(g).items():
+        other = getattr(h, key)
+        if isinstance(value, np.ndarray):
+            assert np.array_equal(value, other)
+            assert value.dtype == other.dtype
+        elif hasattr(value, 'nnz'):
+            assert value.format == other.format
+            assert (value != other).nnz == 0
+        else:
+            assert value == other
+
+
+def _tpfa_matrix(g):
+    params = data.Parameters(g)
+    params.set_tensor('flow', tensor.SecondOrder(g.dim,
+                                                 np.ones(g.num_cells)))
+    bound_faces = g.get_boundary_faces().ravel()
+    params.set_bc('flow', bc.BoundaryCondition(g, bound_faces,
+                                               ['dir'] * bound_faces.size))
+    return tpfa.Tpfa().matrix_rhs(g, {'param': params})[0]
+
+
+class TestGridStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_cart_grid(self):
+        g = structured.CartGrid([3, 4], physdims=[1, 2])
+        g.compute_geometry()
+        save_grid(g, self.path)
+        h = load_grid(self.path)
+        _compare_grids(g, h)
+        assert isinstance(h.nodes, np.memmap)
+        assert np.allclose((_tpfa_matrix(g) - _tpfa_matrix(h)).A, 0)
+
+    def test_simplex_grid_no_mmap(self):
+        p = np.array([[0, 1, 0, 1, 0.5], [0, 0, 1, 1, 0.5]])
+        g = simplex.TriangleGrid(p)
+        g.compute_geometry()
+        g.parent_cell_ind = np.arange(g.num_cells)
+        save_grid(g, self.path)
+        h = load_grid(self.path, mmap=False)
+        _compare_grids(g, h)
+        assert not isinstance(h.nodes, np.memmap)
+
+    def test_loaded_grid_is_writable(self):
+        g = structured.CartGrid([2, 2])
+        g.compute_geometry()
+        save_grid(g, self.path)
+        h = load_grid(self.path)
+        h.nodes[0] += 1
+        h.face_tags[0] = 1
+        # Modifications of a memory-mapped grid are not written to disk
+        _compare_grids(g, load_grid(self.path))
+
+    def test_unsupported_attribute(self):
+        g = structured.CartGrid([2, 2])
+        g.some_object = object()
+        save_grid(g, self.path)
+        h = load_grid(self.path)
+        assert not hasattr(h, 'some_object')
+
+    def test_grid_bucket(self):
+        f_1 = np.array([[0, 2], [1, 1]])
+        f_2 = np.array([[1, 1], [0, 2]])
+        gb = meshing.cart_grid([f_1, f_2], [2, 2])
+        gb.assign_node_ordering()
+        gb.add_node_props(['param'])
+        for g, d in gb:
+            d['param'] = data.Parameters(g)
+        save_grid_bucket(gb, self.path)
+        gb_2 = load_grid_bucket(self.path)
+
+        assert gb.size() == gb_2.size()
+        for (g, d), (h, d_2) in zip(gb, gb_2):
+            _compare_grids(g, h)
+            assert d['node_number'] == d_2['node_number']
+            assert 'param' not in d_2
+
+        edges = [e for e, _ in gb.edges_props()]
+        edges_2 = [e for e, _ in gb_2.edges_props()]
+        assert len(edges) == len(edges_2)
+        for e, e_2 in zip(edges, edges_2):
+            assert e[0].dim == e_2[0].dim and e[1].dim == e_2[1].dim
+            fc = gb.edge_prop(e, 'face_cells')[0]
+            fc_2 = gb_2.edge_prop(e_2, 'face_cells')[0]
+            assert (fc != fc_2).nnz == 0
+            assert np.array_equal(e[0].cell_centers, e_2[0].cell_centers)
+            assert np.array_equal(e[1].cell_centers, e_2[1].cell_centers)
+
+    if __name__ == '__main__':
+        unittest.main()
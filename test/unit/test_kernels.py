@@ -0,0 +1,39 @@
+import numpy as np
+import scipy.sparse as sps
+import unittest
+
+from porepy.utils import kernels
+
+
+class TestKernels(unittest.TestCase):
+
+    def test_warm_up_reports_backend(self):
+        backend = kernels.warm_up(['inv_diagonal_blocks'])
+        assert backend == kernels.backend()
+        assert backend in ('numba', 'python')
+
+    def test_inv_diagonal_blocks(self):
+        if kernels.backend() != 'numba':
+            return
+        np.random.seed(0)
+        sz = np.array([2, 3, 1, 2], dtype=np.int64)
+        blocks = [np.random.rand(n, n) + n * np.eye(n) for n in sz]
+        a = sps.block_diag(blocks, format='csr')
+        inv = np.hstack([np.linalg.inv(b).ravel() for b in blocks])
+
+        kernel = kernels.get('inv_diagonal_blocks')
+        # Both 32 and 64 bit indices should be accepted
+        v32 = kernel(a.indptr.astype(np.int32), a.indices.astype(np.int32),
+                     a.data, sz)
+        v64 = kernel(a.indptr.astype(np.int64), a.indices.astype(np.int64),
+                     a.data, sz)
+        assert np.allclose(v32, inv)
+        assert np.allclose(v64, inv)
+
+    def test_unknown_kernel(self):
+        if kernels.backend() != 'numba':
+            return
+        self.assertRaises(KeyError, kernels.get, 'no_such_kernel')
+
+    if __name__ == '__main__':
+        unittest.main()
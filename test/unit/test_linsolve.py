@@ -0,0 +1,231 @@
+import numpy as np
+import scipy.sparse as sps
+import unittest
+
+from porepy.numerics.linalg.linsolve import Factory, DirectSolver, AmgSolver
+from porepy.numerics.linalg.linsolve import MixedPrecisionSolver
+from porepy.numerics.linalg import linsolve
+from porepy.numerics.linalg.linsolve import pyamg
+from test.unit.residual_checks import assert_scale_invariant_residuals
+
+
+def _laplacian(n):
+    # Dirichlet Laplacian on a 1d grid, symmetric positive definite
+    return sps.diags([-np.ones(n - 1), 2 * np.ones(n), -np.ones(n - 1)],
+                     [-1, 0, 1]).tocsr()
+
+
+class TestMultipleRhs(unittest.TestCase):
+
+    def setUp(self):
+        self.A = _laplacian(20)
+        self.B = np.random.rand(20, 3)
+        self.X = np.linalg.solve(self.A.toarray(), self.B)
+
+    def test_direct(self):
+        X = Factory().multiple_rhs(self.A, self.B)
+        assert np.allclose(X, self.X)
+
+    def test_direct_single_rhs(self):
+        x = Factory().multiple_rhs(self.A, self.B[:, 0])
+        assert x.shape == (20,)
+        assert np.allclose(x, self.X[:, 0])
+
+    def test_cg_ilu(self):
+        X, info = Factory().multiple_rhs(self.A, self.B, solver='cg',
+                                         precond='ilu', tol=1e-12)
+        assert np.all(info == 0)
+        assert np.allclose(X, self.X)
+
+    def test_gmres_initial_guess(self):
+        X, info = Factory().multiple_rhs(self.A, self.B, solver='gmres',
+                                         x0=self.X, tol=1e-12)
+        assert np.all(info == 0)
+        assert np.allclose(X, self.X)
+
+    def test_unknown_solver(self):
+        self.assertRaises(ValueError, Factory().multiple_rhs, self.A, self.B,
+                          solver='foo')
+
+    if __name__ == '__main__':
+        unittest.main()
+
+
+class TestDirectSolver(unittest.TestCase):
+
+    def test_factorize_once(self):
+        A = _laplacian(20)
+        b = np.random.rand(20)
+        slv = Factory().direct(A)
+        assert isinstance(slv, DirectSolver)
+        assert slv.is_exact
+        assert slv.permc_spec == 'MMD_AT_PLUS_A'
+        for _ in range(3):
+            assert np.allclose(A * slv(b), b)
+        stats = slv.statistics()
+        assert stats['num_solves'] == 3
+        assert stats['fill_factor'] >= 1
+
+    def test_nonsymmetric_pattern(self):
+        A = _laplacian(10).tolil()
+        A[0, 5] = 1
+        slv = DirectSolver(A.tocsr())
+        assert slv.permc_spec == 'COLAMD'
+        b = np.random.rand(10)
+        assert np.allclose(A * slv(b), b)
+
+    def test_memory_budget_fallback(self):
+        A = _laplacian(20)
+        slv = DirectSolver(A, max_memory=1)
+        assert not slv.is_exact
+        # Solves are completed by GMRES
+        b = np.ones(20)
+        x = slv.solve(b)
+        assert np.linalg.norm(A * x - b) < 1e-8 * np.linalg.norm(b)
+        assert len(slv.iterations) == 1 and slv.iterations[0] > 0
+        X = slv.solve(np.column_stack((b, 2 * b)))
+        assert np.allclose(X[:, 1], 2 * x)
+        # The incomplete factorization is still a usable preconditioner
+        M = slv.as_linear_operator()
+        x, info = Factory().gmres(A)(b, M=M)
+        assert info == 0
+
+    def test_memory_budget_sufficient(self):
+        A = _laplacian(20)
+        slv = DirectSolver(A, max_memory=10**8)
+        assert slv.is_exact
+        b = np.ones(20)
+        assert np.allclose(A * slv.solve(b), b)
+        assert slv.iterations == []
+
+    if __name__ == '__main__':
+        unittest.main()
+
+
+class TestMixedPrecision(unittest.TestCase):
+
+    def setUp(self):
+        self.A = _laplacian(50)
+        self.b = np.random.rand(50)
+
+    def _rel_res(self, A, x, b):
+        return np.linalg.norm(A * x - b) / np.linalg.norm(b)
+
+    def test_refinement(self):
+        slv = MixedPrecisionSolver(self.A)
+        x = slv(self.b)
+        assert self._rel_res(self.A, x, self.b) < 1e-12
+        assert slv.factorization._lu.L.dtype == np.float32
+        assert slv.converged == [True]
+        assert slv.iterations[0] > 1
+        assert slv.num_fallbacks == 0
+
+    def test_gmres(self):
+        slv = Factory().direct(self.A, precision='mixed', method='gmres')
+        x = slv(self.b)
+        assert self._rel_res(self.A, x, self.b) < 1e-12
+        assert slv.statistics()['converged'] == [True]
+
+    def test_gmres_residuals_scale_invariant(self):
+        slv = MixedPrecisionSolver(self.A, method='gmres')
+        assert_scale_invariant_residuals(slv, self.b)
+
+    def test_fallback_ill_conditioned(self):
+        # Shift the Laplacian to be close to singular, the single precision
+        # factorization is then useless.
+        lam = 2 - 2 * np.cos(np.pi / 51)
+        A = self.A - (1 - 1e-5) * lam * sps.identity(50)
+        slv = MixedPrecisionSolver(A, maxiter=5)
+        x = slv(self.b)
+        assert slv.converged == [False]
+        assert slv.num_fallbacks == 1
+        assert self._rel_res(A, x, self.b) < 1e-6
+
+    def test_out_of_range(self):
+        A = 1e40 * self.A
+        slv = MixedPrecisionSolver(A)
+        assert slv.factorization is None
+        assert self._rel_res(A, slv(self.b), self.b) < 1e-12
+
+    def test_multiple_rhs(self):
+        B = np.random.rand(50, 3)
+        X = Factory().multiple_rhs(self.A, B, solver='mixed_precision')
+        assert np.allclose(X, np.linalg.solve(self.A.A, B))
+
+    def test_gmres_without_new_scipy_arguments(self):
+        # Emulate a version of scipy where gmres accepts neither atol nor
+        # callback_type
+        gmres = linsolve.spl.gmres
+
+        def old_gmres(A, b, x0=None, tol=1e-5, restart=None, maxiter=None,
+                      M=None, callback=None):
+            return gmres(A, b, x0=x0, tol=tol, restart=restart,
+                         maxiter=maxiter, M=M, callback=callback,
+                         callback_type='legacy')
+        options = dict(linsolve._gmres_options)
+        linsolve.spl.gmres = old_gmres
+        try:
+            slv = MixedPrecisionSolver(self.A, method='gmres')
+            x = slv(self.b)
+        finally:
+            linsolve.spl.gmres = gmres
+            linsolve._gmres_options.update(options)
+        assert self._rel_res(self.A, x, self.b) < 1e-12
+        assert slv.converged == [True]
+
+
+class TestAmgSolver(unittest.TestCase):
+
+    def setUp(self):
+        self.A = _laplacian(200)
+        self.b = np.random.rand(200)
+
+    @unittest.skipIf(pyamg is None, 'pyamg is not installed')
+    def test_reuse_refresh_rebuild(self):
+        amg = AmgSolver()
+        assert amg.setup(self.A) == 'rebuild'
+        assert amg.setup(self.A.copy()) == 'reuse'
+        assert amg.setup(1.01 * self.A) == 'refresh'
+        x = amg.solve(self.b, tol=1e-10)
+        res = 1.01 * self.A * x - self.b
+        assert np.linalg.norm(res) < 1e-5 * np.linalg.norm(self.b)
+        assert amg.setup(2 * self.A) == 'rebuild'
+        stats = amg.statistics()
+        assert stats['num_builds'] == 2
+        assert stats['num_refreshes'] == 1
+        assert stats['num_reuses'] == 1
+        assert stats['num_solves'] == 1
+
+    @unittest.skipIf(pyamg is None, 'pyamg is not installed')
+    def test_refreshed_preconditioner(self):
+        amg = AmgSolver()
+        amg.setup(self.A)
+        A = self.A + sps.diags(0.01 * np.random.rand(200), 0)
+        assert amg.setup(A) == 'refresh'
+        # The coarse operators are Galerkin products of the new matrix
+        level = amg.ml.levels[0]
+        coarse = level.R * A * level.P
+        assert np.allclose(amg.ml.levels[1].A.A, coarse.A)
+        x, info = Factory().gmres(A)(self.b, M=amg.as_linear_operator(),
+                                     tol=1e-10)
+        assert info == 0
+
+    @unittest.skipIf(pyamg is None, 'pyamg is not installed')
+    def test_factory_hierarchy(self):
+        amg = AmgSolver()
+        Factory().amg(self.A, hierarchy=amg)
+        Factory().amg(self.A, hierarchy=amg)
+        assert amg.num_builds == 1
+        assert amg.num_reuses == 1
+
+    def test_missing_pyamg(self):
+        amg_module = linsolve.pyamg
+        linsolve.pyamg = None
+        try:
+            self.assertRaises(ImportError, AmgSolver)
+            self.assertRaises(ImportError, Factory().amg, self.A)
+        finally:
+            linsolve.pyamg = amg_module
+
+    if __name__ == '__main__':
+        unittest.main()
@@ -0,0 +1,103 @@
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spl
+import unittest
+
+from porepy.grids import structured
+from porepy.params import tensor
+from porepy.params.bc import BoundaryCondition
+from porepy.params.data import Parameters
+from porepy.numerics.vem import vem_dual as dual
+from porepy.numerics.linalg.saddle_point import SaddlePointSolver
+from test.unit.residual_checks import assert_scale_invariant_residuals
+
+
+def _dual_data(g, neumann=False):
+    perm = tensor.SecondOrder(3, 1 + g.cell_centers[0], kyy=1, kzz=1)
+    bf = g.get_boundary_faces()
+    labels = np.array(['dir'] * bf.size)
+    if neumann:
+        labels[g.face_centers[1, bf] < 1e-6] = 'neu'
+    bc_val = g.face_centers[0] + g.face_centers[1]
+
+    param = Parameters(g)
+    param.set_tensor('flow', perm)
+    param.set_bc('flow', BoundaryCondition(g, bf, labels))
+    param.set_bc_val('flow', bc_val)
+    param.set_source('flow', np.ones(g.num_cells) / g.num_cells)
+    return {'param': param}
+
+
+class TestSaddlePoint(unittest.TestCase):
+
+    def setUp(self):
+        self.g = structured.CartGrid([6, 5], physdims=[1, 1])
+        self.g.compute_geometry()
+
+    def test_blocks_equal_matrix(self):
+        data = _dual_data(self.g, neumann=True)
+        solver = dual.DualVEM('flow')
+        M = solver.matrix(self.g, data)
+        mass, grad, div, _ = solver.matrix_blocks(self.g, data)
+        M_blocks = sps.bmat([[mass, grad], [div, None]])
+        assert np.allclose(M.A, M_blocks.A)
+
+    def test_minres_dirichlet(self):
+        data = _dual_data(self.g)
+        solver = dual.DualVEM('flow')
+        M, rhs = solver.matrix_rhs(self.g, data)
+        slv, rhs_blocks = solver.saddle_point_solver(self.g, data,
+                                                     method='minres',
+                                                     tol=1e-12)
+        assert slv.method == 'minres'
+        assert np.allclose(rhs, rhs_blocks)
+        up = slv(rhs)
+        assert np.allclose(up, spl.spsolve(M.tocsc(), rhs), atol=1e-8)
+
+    def test_gmres_neumann(self):
+        data = _dual_data(self.g, neumann=True)
+        solver = dual.DualVEM('flow')
+        M, rhs = solver.matrix_rhs(self.g, data)
+        # Not symmetric, falls back to gmres
+        slv, _ = solver.saddle_point_solver(self.g, data, method='minres',
+                                            mass_approx='lumped', tol=1e-12)
+        assert slv.method == 'gmres'
+        up = slv(rhs)
+        assert np.allclose(up, spl.spsolve(M.tocsc(), rhs), atol=1e-8)
+
+    def test_gmres_residuals_scale_invariant(self):
+        data = _dual_data(self.g, neumann=True)
+        solver = dual.DualVEM('flow')
+        _, rhs = solver.matrix_rhs(self.g, data)
+        slv, _ = solver.saddle_point_solver(self.g, data, method='gmres',
+                                            tol=1e-12)
+        assert_scale_invariant_residuals(slv, rhs)
+
+    def test_from_matrix_ordering(self):
+        # Pressure unknowns first in the assembled matrix
+        data = _dual_data(self.g)
+        M, rhs = dual.DualVEM('flow').matrix_rhs(self.g, data)
+        nf = self.g.num_faces
+        perm = np.hstack((np.arange(nf, M.shape[0]), np.arange(nf)))
+        M = M[perm][:, perm]
+        rhs = rhs[perm]
+        is_u = np.hstack((np.zeros(self.g.num_cells, dtype=np.bool),
+                          np.ones(nf, dtype=np.bool)))
+        slv = SaddlePointSolver.from_matrix(M, is_u, schur_solver='direct',
+                                            tol=1e-12)
+        up = slv(rhs)
+        assert np.allclose(M * up, rhs, atol=1e-8)
+        # The final entry is the true residual of the solution
+        assert slv.iterations[0] == len(slv.residuals[0]) - 1
+        true_res = np.linalg.norm(rhs - M * up) / np.linalg.norm(rhs)
+        assert np.isclose(slv.residuals[0][-1], true_res, rtol=1e-4,
+                          atol=1e-15)
+
+    def test_unknown_method(self):
+        A = sps.identity(2, format='csr')
+        B = sps.csr_matrix(np.ones((1, 2)))
+        self.assertRaises(ValueError, SaddlePointSolver, A, B.T, B,
+                          method='cg')
+
+    if __name__ == '__main__':
+        unittest.main()
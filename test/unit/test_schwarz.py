@@ -0,0 +1,96 @@
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spl
+import unittest
+
+from porepy.numerics.linalg import schwarz
+
+
+def _laplacian(n):
+    return sps.diags([-np.ones(n - 1), 2 * np.ones(n), -np.ones(n - 1)],
+                     [-1, 0, 1]).tocsr()
+
+
+class TestSchwarz(unittest.TestCase):
+
+    def setUp(self):
+        self.A = _laplacian(12)
+        self.blocks = [np.arange(6), np.arange(6, 12)]
+
+    def test_submatrix_map(self):
+        ind = np.array([1, 2, 3, 7])
+        pattern, pos = schwarz._submatrix_map(self.A, ind)
+        sub = pattern.matrix(self.A.data[pos])
+        assert np.allclose(sub.A, self.A[ind][:, ind].A)
+
+    def test_single_block_is_exact(self):
+        with schwarz.Schwarz(self.A, [np.arange(12)]) as M:
+            b = np.random.rand(12)
+            assert np.allclose(self.A * M(b), b)
+
+    def test_additive_is_block_jacobi(self):
+        with schwarz.Schwarz(self.A, self.blocks, num_threads=2) as M:
+            b = np.random.rand(12)
+            x = M(b)
+        for bl in self.blocks:
+            assert np.allclose(self.A[bl][:, bl] * x[bl], b[bl])
+
+    def test_multiplicative_block_triangular(self):
+        # Lower block triangular matrix: Block Gauss-Seidel is exact
+        A = sps.tril(self.A, format='csr')
+        with schwarz.Schwarz(A, self.blocks, mode='multiplicative') as M:
+            b = np.random.rand(12)
+            assert np.allclose(A * M(b), b)
+
+    def test_overlap_gmres(self):
+        with schwarz.Schwarz(self.A, self.blocks, overlap=2) as M:
+            assert M.blocks[0].size == 8
+            b = np.ones(12)
+            x, info = spl.gmres(self.A, b, M=M.as_linear_operator(),
+                                tol=1e-10)
+        assert info == 0
+        assert np.allclose(self.A * x, b)
+
+    def test_update_values(self):
+        M = schwarz.Schwarz(self.A, self.blocks, num_threads=1)
+        A = 2 * self.A
+        M.update(A)
+        b = np.random.rand(12)
+        assert np.allclose(M(b), 0.5 * schwarz.Schwarz(
+            self.A, self.blocks, num_threads=1)(b))
+
+    def test_update_pattern(self):
+        # A new sparsity pattern rebuilds the blocks, but keeps the pool
+        A = (self.A + sps.eye(12, k=3)).tocsr()
+        b = np.random.rand(12)
+        with schwarz.Schwarz(self.A, self.blocks, num_threads=2) as M:
+            M(b)
+            pool = M._pool
+            M.update(A)
+            assert M._pool is pool
+            x = M(b)
+        assert M._pool is None
+        assert np.allclose(M(b), x)
+        assert np.allclose(x, schwarz.Schwarz(A, self.blocks,
+                                              num_threads=1)(b))
+
+    def test_lazy_pool(self):
+        b = np.random.rand(12)
+        M = schwarz.Schwarz(self.A, self.blocks)
+        M(b)
+        assert M._pool is None
+        with schwarz.Schwarz(self.A, self.blocks, num_threads=2) as M:
+            assert M._pool is None
+            M(b)
+            assert M._pool is not None
+        assert M._pool is None
+        # Closed preconditioners solve the blocks one by one
+        M(b)
+        assert M._pool is None
+
+    def test_algebraic_overlap(self):
+        ind = schwarz.algebraic_overlap(self.A, np.array([5]), 2)
+        assert np.array_equal(ind, np.arange(3, 8))
+
+    if __name__ == '__main__':
+        unittest.main()
@@ -0,0 +1,61 @@
+import numpy as np
+import scipy.sparse as sps
+import unittest
+
+from porepy.numerics.linalg import solver_policy
+
+
+class TestSolverPolicy(unittest.TestCase):
+
+    def test_threshold(self):
+        policy = solver_policy.ThresholdPolicy(max_direct=100)
+        assert policy.choose(solver_policy._laplacian(5, 2)) == 'direct'
+        assert policy.choose(solver_policy._laplacian(20, 2)) == 'iterative'
+        policy.record('direct', 0.1, sps.identity(3))
+        assert policy.history[0]['solver'] == 'direct'
+        assert policy.history[0]['n'] == 3
+
+    def test_size_and_dimension(self):
+        policy = solver_policy.SolverPolicy(memory_limit=1e15,
+                                            calibrate=False)
+        assert policy.choose(solver_policy._laplacian(10, 2), dim=2) == \
+            'direct'
+        A = solver_policy._laplacian(40, 3)
+        assert policy.choose(A, dim=3) == 'iterative'
+        # The dimension is guessed from the stencil
+        assert policy.estimate(A)['dim'] == 3
+
+    def test_denser_stencil_costs_more(self):
+        policy = solver_policy.SolverPolicy(calibrate=False)
+        A = solver_policy._laplacian(20, 3)
+        # Add more nonzeros per row, as for mpfa
+        B = A + sps.diags([np.ones(A.shape[0] - 40)] * 2, [-40, 40])
+        est_a = policy.estimate(A, dim=3)
+        est_b = policy.estimate(B, dim=3)
+        assert est_b['fill'] > est_a['fill']
+        assert est_b['direct_time'] > est_a['direct_time']
+
+    def test_memory_limit(self):
+        policy = solver_policy.SolverPolicy(memory_limit=1000,
+                                            calibrate=False)
+        A = solver_policy._laplacian(10, 2)
+        assert policy.choose(A, dim=2) == 'iterative'
+
+    def test_record_updates_iterations(self):
+        policy = solver_policy.SolverPolicy(iterations=10, calibrate=False)
+        A = solver_policy._laplacian(10, 2)
+        policy.record('iterative', 0.1, A, dim=2, iterations=20)
+        assert policy.iterations == 15
+        assert policy.history[0]['estimate']['n'] == 100
+
+    def test_calibration(self):
+        cal = solver_policy.calibration()
+        assert solver_policy.calibration() is cal
+        for key in ['setup', 'matvec', 'precond', 'iterations']:
+            assert cal[key] > 0
+        for dim in [1, 2, 3]:
+            assert cal['fill'][dim] > 0
+            assert cal['time'][dim] > 0
+
+    if __name__ == '__main__':
+        unittest.main()
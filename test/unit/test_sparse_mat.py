@@ -321,5 +321,35 @@ class TestSparseMath(unittest.TestCase):
 
         assert np.sum(A != A_t) == 0
 
+    def test_csr_pattern(self):
+        # Triplets with a duplicate entry (1, 0) and unsorted order
+        rows = np.array([2, 1, 0, 1])
+        cols = np.array([2, 0, 1, 0])
+        pattern = sparse_mat.CsrPattern(rows, cols, (3, 3))
+
+        vals = np.array([1., 2., 3., 4.])
+        A = pattern.matrix(vals)
+        A_t = sps.coo_matrix((vals, (rows, cols)), shape=(3, 3))
+        assert np.allclose((A - A_t).A, 0)
+
+        # New values, same structure
+        A = pattern.matrix(2 * vals)
+        assert np.allclose((A - 2 * A_t).A, 0)
+
+        assert pattern.matches(rows, cols, (3, 3))
+        assert not pattern.matches(rows, cols, (3, 4))
+        assert not pattern.matches(rows[:-1], cols[:-1], (3, 3))
+
+    def test_csr_equal(self):
+        A = sps.csr_matrix(np.array([[1., 0], [2, 3]]))
+        assert sparse_mat.csr_equal(A, A.copy())
+        assert not sparse_mat.csr_equal(A, None)
+        assert not sparse_mat.csr_equal(A, 2 * A)
+        # Same values, different structure
+        B = A.copy()
+        B[0, 1] = 0
+        assert not sparse_mat.csr_equal(A, B)
+        assert not sparse_mat.csr_equal(A, sps.csr_matrix((3, 2)))
+
     if __name__ == '__main__':
         unittest.main()
@@ -0,0 +1,55 @@
+import numpy as np
+import scipy.sparse as sps
+import unittest
+
+from porepy.numerics.mixed_dim import condensation
+
+
+def _system():
+    # Six masters coupled to two slave blocks, of size 1 and 2
+    np.random.seed(0)
+    n = 9
+    A = sps.lil_matrix(np.diag(10 + np.random.rand(n)))
+    for i in range(6):
+        A[i, (i + 1) % 6] = -1
+        A[(i + 1) % 6, i] = -1
+    for m, s in [(0, 6), (1, 6), (2, 7), (3, 8), (4, 7)]:
+        A[m, s] = A[s, m] = -2
+    A[7, 8] = A[8, 7] = 1
+    eliminated = np.zeros(n, dtype=bool)
+    eliminated[6:] = True
+    return A.tocsr(), np.random.rand(n), eliminated
+
+
+class TestStaticCondensation(unittest.TestCase):
+
+    def test_block_elimination(self):
+        A, rhs, eliminated = _system()
+        blocks = [np.array([6]), np.array([7, 8])]
+        ref = condensation.eliminate_dofs(A, rhs, eliminated)
+        blk = condensation.eliminate_dofs(A, rhs, eliminated, blocks=blocks)
+        assert np.allclose(ref[0].A, blk[0].A)
+        assert np.allclose(ref[1], blk[1])
+        assert np.allclose(ref[2].A, blk[2].A)
+        assert np.allclose(ref[4].A, blk[4].A)
+
+    def test_not_block_diagonal(self):
+        # The blocks do not match the slave system; fall back to the general
+        # inverter
+        A, rhs, eliminated = _system()
+        blocks = [np.array([6, 7]), np.array([8])]
+        ref = condensation.eliminate_dofs(A, rhs, eliminated)
+        blk = condensation.eliminate_dofs(A, rhs, eliminated, blocks=blocks)
+        assert np.allclose(ref[0].A, blk[0].A)
+
+    def test_repeated_solves(self):
+        A, rhs, eliminated = _system()
+        cond = condensation.StaticCondensation(
+            A, eliminated, [np.array([6]), np.array([7, 8])])
+        for _ in range(2):
+            x = cond.solve(rhs)
+            assert np.allclose(A * x, rhs)
+            rhs = np.random.rand(rhs.size)
+
+    if __name__ == '__main__':
+        unittest.main()